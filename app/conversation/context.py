@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytz
+
+from app.core.db import SessionLocal
+from app.core.redis import get_session, set_session, clear_session
+from app.core.settings import settings
+from app.services.flight_search import search_flights
+from app.services.identity import Identity, resolve_identity, update_email
+
+# Resources a step handler can declare in Step.needs
+DB = "db"
+USER = "user"
+SESSION = "session"
+SEARCH = "search"
+
+
+class Context:
+    """
+    Per-message state handed to step handlers. Resources are opened lazily on
+    first use and only if the running handler declared them in Step.needs, so a
+    step that never touches the database never opens a DB session. USER allows
+    the DB too, but a cached identity usually means it is never opened.
+    """
+
+    def __init__(self, from_number: str, body: str):
+        self.from_number = from_number
+        self.body = body
+        self.needs: frozenset[str] = frozenset()
+        self.step: str | None = None
+        self._db = None
+        self._identity: Identity | None = None
+        self._session: dict | None = None
+
+    def _require(self, resource: str):
+        if resource not in self.needs:
+            raise RuntimeError(f"step '{self.step}' used '{resource}' without declaring it in needs")
+
+    @property
+    def db(self):
+        if USER not in self.needs:
+            self._require(DB)
+        if self._db is None:
+            self._db = SessionLocal()
+        return self._db
+
+    @property
+    def identity(self) -> Identity:
+        """The sender's user id/email, from the identity cache; the DB is only opened on a miss."""
+        self._require(USER)
+        if self._identity is None:
+            self._identity = resolve_identity(self.from_number, lambda: self.db)
+        return self._identity
+
+    def update_email(self, email: str):
+        self._identity = update_email(lambda: self.db, self.from_number, self.identity, email)
+
+    @property
+    def session(self) -> dict:
+        if self._session is None:
+            self.load_session()
+        return self._session
+
+    def load_session(self) -> dict:
+        # If the store is unavailable, fall back to an ephemeral session for this message
+        try:
+            self._session = get_session(self.from_number) or {"step": "source", "timezone": settings.DEFAULT_TIMEZONE}
+        except Exception:
+            self._session = {"step": "source", "timezone": settings.DEFAULT_TIMEZONE}
+        return self._session
+
+    def save_session(self):
+        self._require(SESSION)
+        try:
+            set_session(self.from_number, self._session)
+        except Exception:
+            pass
+
+    def clear_session(self):
+        try:
+            clear_session(self.from_number)
+        except Exception:
+            pass
+        self._session = None
+
+    def search(self, source_iata: str, dest_iata: str, depart_at: datetime) -> list[dict]:
+        self._require(SEARCH)
+        return search_flights(source_iata, dest_iata, depart_at)
+
+    @property
+    def tz(self):
+        tz_name = (self._session or {}).get("timezone", settings.DEFAULT_TIMEZONE)
+        return pytz.timezone(tz_name)
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
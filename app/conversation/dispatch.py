@@ -0,0 +1,58 @@
+from app.conversation.context import Context
+from app.conversation.steps import (
+    Step,
+    PnrCommand, TicketCommand, RestartCommand,
+    SourceStep, DestinationStep, DateStep, TimeStep, FlightsStep,
+    PassengersCountStep, DetailsStep, SeatsStep, ConfirmStep,
+)
+from app.core.metrics import STEP_SECONDS
+
+FALLBACK_REPLY = "I didn't get that. Reply 'Restart' to start over."
+
+# session['step'] -> handler; dispatch is a dict lookup
+STEP_HANDLERS: dict[str, Step] = {
+    h.name: h
+    for h in (
+        SourceStep(), DestinationStep(), DateStep(), TimeStep(), FlightsStep(),
+        PassengersCountStep(), DetailsStep(), SeatsStep(), ConfirmStep(),
+    )
+}
+# Legacy sessions parked at 'payment' are confirmed like 'confirm'
+STEP_HANDLERS["payment"] = STEP_HANDLERS["confirm"]
+
+_PNR, _TICKET, _RESTART = PnrCommand(), TicketCommand(), RestartCommand()
+
+
+def _command_for(low: str) -> Step | None:
+    # Quick commands work from any step and never load the session
+    if low.startswith("pnr "):
+        return _PNR
+    if low.strip() == "ticket":
+        return _TICKET
+    if low in ("restart", "start"):
+        return _RESTART
+    return None
+
+
+def _run(handler: Step, ctx: Context) -> str:
+    ctx.needs = handler.needs
+    ctx.step = handler.name
+    with STEP_SECONDS.time(handler.name):
+        return handler.handle(ctx)
+
+
+def dispatch(from_number: str, body: str) -> str:
+    """Route one inbound message to its command or step handler; returns the reply text."""
+    ctx = Context(from_number, body)
+    try:
+        low = body.lower()
+        handler = _command_for(low)
+        if handler is None:
+            step = ctx.load_session().get("step", "source")
+            # 'confirm' is accepted from any step
+            handler = STEP_HANDLERS["confirm"] if low.strip() == "confirm" else STEP_HANDLERS.get(step)
+        if handler is None:
+            return FALLBACK_REPLY
+        return _run(handler, ctx)
+    finally:
+        ctx.close()
@@ -0,0 +1,73 @@
+import calendar
+from functools import lru_cache
+
+# Reply text for the conversation steps. Everything that only depends on the
+# month or on a flight list is rendered once and served from a cache after that.
+
+SOURCE_PROMPT = "Where are you flying from?\n1) Mumbai  2) Delhi  3) Bengaluru  4) Other"
+DEST_PROMPT = "Where are you flying to?\n1) Delhi  2) Hyderabad  3) Goa  4) Other"
+RESTART_PROMPT = "Restarted. " + SOURCE_PROMPT
+CONFIRM_PROMPT = "Please reply 'confirm' to generate your ticket PDF, or 'Restart' to start over."
+PASSENGERS_PROMPT = "How many passengers? Reply with a number 1-4"
+SEATS_PROMPT = "Seat selection: reply 'auto' or provide seats separated by space (e.g., 12A 12B). Rows 5-30, seats A-F."
+NO_FLIGHTS_PROMPT = "No flights found around that time. Please try another date or time."
+_DATE_INSTRUCTIONS = (
+    "Please enter your travel date (YYYY-MM-DD or DD/MM/YYYY), optionally time (HH:MM or 9am).\n"
+    "Example: 2025-09-03 09:30\n"
+    "It must be a future date.\n\n"
+)
+_INVALID_DATE = "Invalid date. Please enter YYYY-MM-DD (optional time HH:MM).\n\n"
+
+_calendar = calendar.TextCalendar()
+
+
+@lru_cache(maxsize=64)
+def month_calendar(year: int, month: int) -> str:
+    return _calendar.formatmonth(year, month)
+
+
+@lru_cache(maxsize=16)
+def three_month_calendar(year: int, month: int) -> str:
+    """Calendars for (year, month) and the two months after it."""
+    months = []
+    for _ in range(3):
+        months.append(month_calendar(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return "\n".join(months)
+
+
+@lru_cache(maxsize=16)
+def date_prompt(year: int, month: int) -> str:
+    return _DATE_INSTRUCTIONS + three_month_calendar(year, month)
+
+
+@lru_cache(maxsize=16)
+def invalid_date_prompt(year: int, month: int) -> str:
+    return _INVALID_DATE + three_month_calendar(year, month)
+
+
+def _choices(n: int) -> str:
+    numbers = [str(i) for i in range(1, n + 1)]
+    if n <= 2:
+        return " or ".join(numbers)
+    return ", ".join(numbers[:-1]) + ", or " + numbers[-1]
+
+
+@lru_cache(maxsize=8)
+def flight_choice_errors(n: int) -> tuple[str, str]:
+    """(not a number, out of range) replies for a list of n flights; same wording as flight_list's footer."""
+    return (f"Please reply with {_choices(n)} to pick a flight.", f"Invalid option. Reply with {_choices(n)}.")
+
+
+@lru_cache(maxsize=4096)
+def _flight_list(rows: tuple[tuple, ...]) -> str:
+    lines = [f"{idx}) {no} {dep}-{arr}, {dur}m, INR {price}" for idx, (no, dep, arr, dur, price) in enumerate(rows, start=1)]
+    lines.append(f"Reply with {_choices(len(rows))} to select a flight.")
+    return "\n".join(lines)
+
+
+def flight_list(flights: list[dict]) -> str:
+    """Numbered flight options; identical lists (e.g. from the search cache) render once."""
+    return _flight_list(tuple(
+        (f["flight_no"], f["depart"][11:16], f["arrive"][11:16], f["duration_min"], f["price"]) for f in flights
+    ))
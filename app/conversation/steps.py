@@ -0,0 +1,447 @@
+import re
+from datetime import datetime, timedelta
+
+from app.conversation.context import Context, DB, USER, SESSION, SEARCH
+from app.conversation.prompts import (
+    CONFIRM_PROMPT, DEST_PROMPT, NO_FLIGHTS_PROMPT, PASSENGERS_PROMPT, RESTART_PROMPT, SEATS_PROMPT, SOURCE_PROMPT,
+    date_prompt, flight_choice_errors, flight_list, invalid_date_prompt,
+)
+from app.core.db import Booking, User
+from app.core.settings import settings
+from app.services.bookings import find_booking_by_pnr
+from app.services.iata import suggest_airports, to_iata
+from app.services.identity import invalidate_identity
+from app.services.issuance import create_pending_booking
+from app.services.seat_inventory import (
+    SeatUnavailable, confirm_seats, forget_flight, hold_seats, release_seats, seat_index,
+)
+
+EMAIL_PATTERN = r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$"
+
+# Allowed step changes; Step.goto() refuses anything else
+TRANSITIONS: dict[str, frozenset[str]] = {
+    "source": frozenset({"destination"}),
+    "destination": frozenset({"date"}),
+    "date": frozenset({"time", "flights"}),
+    "time": frozenset({"flights"}),
+    "flights": frozenset({"passengers_count"}),
+    "passengers_count": frozenset({"details"}),
+    "details": frozenset({"details", "seats"}),
+    "seats": frozenset({"confirm"}),
+    "confirm": frozenset({"flights", "seats"}),  # flight vanished / seats sold; success clears the session instead
+}
+
+
+def _did_you_mean(text: str) -> str:
+    names = [f"{s.airport.city} ({s.airport.iata})" for s in suggest_airports(text, 3)]
+    return f"\nDid you mean: {', '.join(names)}?" if names else ""
+
+
+def _blackout_dates() -> set[str]:
+    try:
+        blackout_raw = settings.BLACKOUT_DATES or ""
+        return {s.strip() for s in blackout_raw.split(',') if s.strip()}
+    except Exception:
+        return set()
+
+
+def _min_advance() -> timedelta:
+    return timedelta(hours=getattr(settings, 'MIN_ADVANCE_HOURS', 12))
+
+
+def _departure_error(depart_dt: datetime, now: datetime) -> str | None:
+    """Blackout and minimum-advance checks shared by the date and time steps."""
+    if depart_dt.strftime("%Y-%m-%d") in _blackout_dates():
+        return "Selected date is unavailable. Please choose another date."
+    min_delta = _min_advance()
+    if depart_dt < now + min_delta:
+        return f"Please choose a time at least {int(min_delta.total_seconds()//3600)} hours from now."
+    return None
+
+
+def _parse_date(text: str, tz) -> tuple[datetime | None, tuple[int, int] | None]:
+    """Parse 'YYYY-MM-DD [time]' or 'DD/MM/YYYY [time]'; returns (local date, (hh, mm) or None)."""
+    m = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{1,2})(?::(\d{2}))?\s*(am|pm)?)?", text, re.IGNORECASE)
+    if m:
+        y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    else:
+        m = re.fullmatch(r"(\d{2})[/-](\d{2})[/-](\d{4})(?:\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?)?", text, re.IGNORECASE)
+        if not m:
+            return None, None
+        d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    hh = int(m.group(4)) if m.group(4) else None
+    mm = int(m.group(5)) if m.group(5) else 0
+    ap = (m.group(6) or "").lower()
+    hhmm = None
+    if hh is not None:
+        if ap in ("am", "pm"):
+            if hh == 12:
+                hh = 0
+            if ap == "pm":
+                hh += 12
+        hhmm = (hh, mm)
+    try:
+        return tz.localize(datetime(y, mo, d)), hhmm
+    except Exception:
+        return None, None
+
+
+class Step:
+    """
+    One conversation step. name is the session['step'] value it handles; needs
+    lists the Context resources it may touch (DB, USER, SESSION, SEARCH).
+    handle() returns the reply text.
+    """
+    name: str = ""
+    needs: frozenset[str] = frozenset({SESSION})
+
+    def handle(self, ctx: Context) -> str:
+        raise NotImplementedError
+
+    def goto(self, ctx: Context, step: str):
+        if step not in TRANSITIONS.get(self.name, ()):
+            raise ValueError(f"illegal transition {self.name} -> {step}")
+        ctx.session["step"] = step
+
+
+# Quick commands (matched on the message before any step)
+
+class PnrCommand(Step):
+    name = "pnr"
+    needs = frozenset({DB})
+
+    def handle(self, ctx):
+        pnr_code = ctx.body.split(None, 1)[1].strip()
+        b = find_booking_by_pnr(ctx.db, pnr_code)
+        found = (b.flight_meta or {}) if b else None
+        if found and found.get("ticket_url"):
+            return f"PNR {pnr_code}: {found['ticket_url']}"
+        return "PNR not found."
+
+
+class TicketCommand(Step):
+    name = "ticket"
+    needs = frozenset({DB})
+
+    def handle(self, ctx):
+        try:
+            # Latest booking for this user
+            user = ctx.db.query(User).filter(User.whatsapp_number == ctx.from_number).first()
+            latest = ctx.db.query(Booking).filter(Booking.user_id == user.id).order_by(Booking.created_at.desc()).first()
+            meta = latest.flight_meta if latest else None
+            if meta and meta.get("ticket_url"):
+                return f"Your latest ticket: {meta['ticket_url']}"
+        except Exception:
+            pass
+        return "No ticket found yet. Reply 'Restart' to book."
+
+
+class RestartCommand(Step):
+    name = "restart"
+    needs = frozenset()
+
+    def handle(self, ctx):
+        release_seats(ctx.from_number)
+        ctx.clear_session()
+        return RESTART_PROMPT
+
+
+# Conversation steps
+
+class SourceStep(Step):
+    name = "source"
+
+    def handle(self, ctx):
+        body, session = ctx.body, ctx.session
+        # Only prompt if no input provided; otherwise process the input directly
+        if not body:
+            if not session.get("source_prompted"):
+                session["source_prompted"] = True
+                ctx.save_session()
+            return SOURCE_PROMPT
+        choice = {"1": "Mumbai", "2": "Delhi", "3": "Bengaluru", "4": "Other"}.get(body)
+        city = choice or body
+        if choice == "Other":
+            return "Please enter your source city (e.g., Mumbai)"
+        iata = to_iata(city)
+        if not iata:
+            return "I couldn't recognize that city. Try again (e.g., Mumbai)" + _did_you_mean(city)
+        session.update({"source_city": city, "source_iata": iata})
+        self.goto(ctx, "destination")
+        ctx.save_session()
+        return DEST_PROMPT
+
+
+class DestinationStep(Step):
+    name = "destination"
+
+    def handle(self, ctx):
+        body, session = ctx.body, ctx.session
+        choice = {"1": "Delhi", "2": "Hyderabad", "3": "Goa", "4": "Other"}.get(body)
+        city = choice or body
+        if choice == "Other":
+            return "Please enter your destination city (e.g., Delhi)"
+        iata = to_iata(city)
+        if not iata:
+            return "I couldn't recognize that city. Try again (e.g., Delhi)" + _did_you_mean(city)
+        if iata == session.get("source_iata"):
+            return "Destination must be different from source. Please enter another destination."
+        session.update({"dest_city": city, "dest_iata": iata})
+        self.goto(ctx, "date")
+        ctx.save_session()
+        now = ctx.now()
+        return date_prompt(now.year, now.month)
+
+
+class _SearchingStep(Step):
+    needs = frozenset({SESSION, SEARCH})
+
+    def present_flights(self, ctx: Context, depart_dt: datetime) -> str:
+        session = ctx.session
+        flights = ctx.search(session["source_iata"], session["dest_iata"], depart_dt)
+        if not flights:
+            return NO_FLIGHTS_PROMPT
+        session["travel_dt_iso"] = depart_dt.isoformat()
+        session["presented_flights"] = flights
+        self.goto(ctx, "flights")
+        ctx.save_session()
+        return flight_list(session["presented_flights"])
+
+
+class DateStep(_SearchingStep):
+    name = "date"
+
+    def handle(self, ctx):
+        session, now = ctx.session, ctx.now()
+        # Accept date with optional time; enforce minimum advance window and blackout dates
+        dt_date, hhmm = _parse_date(ctx.body.strip(), ctx.tz)
+        if not dt_date:
+            return invalid_date_prompt(now.year, now.month)
+
+        # If time not provided, offer preset times that satisfy the advance window
+        if hhmm is None:
+            session["travel_date_iso"] = dt_date.strftime("%Y-%m-%d")
+            min_delta = _min_advance()
+            options = [
+                f"{hh:02d}:{mm:02d}"
+                for hh, mm in [(6, 0), (9, 0), (12, 0), (15, 0), (18, 0), (21, 0)]
+                if dt_date.replace(hour=hh, minute=mm) >= now + min_delta
+            ]
+            session["time_choices"] = options
+            self.goto(ctx, "time")
+            ctx.save_session()
+            if not options:
+                return "All preset times have passed for that date. Reply with a custom time in HH:MM (24h) or 9am/9pm."
+            labels = [f"{i+1}) {t}" for i, t in enumerate(options[:6])]
+            return "Select a time or reply a custom time (HH:MM):\n" + "  ".join(labels)
+
+        depart_dt = dt_date.replace(hour=hhmm[0], minute=hhmm[1], second=0, microsecond=0)
+        error = _departure_error(depart_dt, now)
+        if error:
+            return error
+        return self.present_flights(ctx, depart_dt)
+
+
+class TimeStep(_SearchingStep):
+    name = "time"
+
+    def handle(self, ctx):
+        session = ctx.session
+        text = ctx.body.strip().lower()
+        choices = session.get("time_choices", [])
+        parsed_hhmm = None
+        if text.isdigit() and choices:
+            i = int(text) - 1
+            if 0 <= i < len(choices):
+                parsed_hhmm = choices[i]
+        if not parsed_hhmm:
+            # Accept HH:MM or hham/pm
+            m = re.fullmatch(r"(\d{1,2}):(\d{2})", text)
+            if m:
+                hh, mm = int(m.group(1)), int(m.group(2))
+                if 0 <= hh <= 23 and 0 <= mm <= 59:
+                    parsed_hhmm = f"{hh:02d}:{mm:02d}"
+            else:
+                m2 = re.fullmatch(r"(\d{1,2})\s*(am|pm)", text)
+                if m2:
+                    hh = int(m2.group(1))
+                    if 1 <= hh <= 12:
+                        if hh == 12:
+                            hh = 0
+                        if m2.group(2) == 'pm':
+                            hh += 12
+                        parsed_hhmm = f"{hh:02d}:00"
+        if not parsed_hhmm:
+            return "Invalid time. Reply with a number from the list or HH:MM (24h) or 9am/9pm."
+        y, mo, d = map(int, session.get("travel_date_iso").split("-"))
+        hh, mm = map(int, parsed_hhmm.split(":"))
+        depart_dt = ctx.tz.localize(datetime(y, mo, d, hh, mm))
+        error = _departure_error(depart_dt, ctx.now())
+        if error:
+            return error
+        return self.present_flights(ctx, depart_dt)
+
+
+class FlightsStep(Step):
+    name = "flights"
+
+    def handle(self, ctx):
+        flights = ctx.session.get("presented_flights", [])
+        if not flights:
+            return "Session expired. Please reply 'Restart' to start over."
+        not_a_number, out_of_range = flight_choice_errors(len(flights))
+        try:
+            idx = int(ctx.body)
+        except Exception:
+            return not_a_number
+        if not (1 <= idx <= len(flights)):
+            return out_of_range
+        ctx.session["selected_flight_id"] = flights[idx - 1]["id"]
+        self.goto(ctx, "passengers_count")
+        ctx.save_session()
+        return PASSENGERS_PROMPT
+
+
+class PassengersCountStep(Step):
+    name = "passengers_count"
+
+    def handle(self, ctx):
+        try:
+            n = int(ctx.body)
+        except Exception:
+            return "Please reply with a number 1-4 for passengers."
+        if not (1 <= n <= 4):
+            return "Please reply with a number between 1 and 4."
+        ctx.session.update({"passengers_total": n, "passenger_index": 1, "passengers": []})
+        self.goto(ctx, "details")
+        ctx.save_session()
+        return "Passenger 1 - enter full name and email (e.g., John Doe, john@example.com)"
+
+
+class DetailsStep(Step):
+    name = "details"
+    needs = frozenset({SESSION, USER})
+
+    def handle(self, ctx):
+        session = ctx.session
+        # Expect name and email, e.g., "John Doe, john@example.com"
+        text = ctx.body.strip()
+        name = text
+        email = None
+        if "," in text:
+            parts = [p.strip() for p in text.split(",", 1)]
+            name = parts[0] or name
+            email = parts[1] if len(parts) > 1 else None
+        # If email present without comma
+        if not email:
+            m = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", text)
+            if m:
+                email = m.group(0)
+                name = text.replace(email, "").replace(",", " ").strip()
+        if not name:
+            return "Please provide passenger name, e.g., John Doe, john@example.com"
+        if not email or not re.fullmatch(EMAIL_PATTERN, email):
+            return "Please include a valid email as well (e.g., John Doe, john@example.com)"
+        pax_list = session.get("passengers", [])
+        pax_list.append({"name": name, "email": email})
+        session["passengers"] = pax_list
+        # Also set a primary passenger name for compatibility
+        session["passenger_name"] = session.get("passenger_name") or name
+        total = int(session.get("passengers_total", 1))
+        idx = int(session.get("passenger_index", 1))
+        if idx < total:
+            session["passenger_index"] = idx + 1
+            self.goto(ctx, "details")
+            reply = f"Passenger {idx+1} - enter full name and email (e.g., John Doe, john@example.com)"
+        else:
+            self.goto(ctx, "seats")
+            reply = SEATS_PROMPT
+        try:
+            ctx.update_email(email)
+        except Exception:
+            pass
+        ctx.save_session()
+        return reply
+
+
+def _selected_flight(session: dict) -> dict | None:
+    selected_id = session.get("selected_flight_id")
+    return next((f for f in session.get("presented_flights", []) if f.get("id") == selected_id), None)
+
+
+class SeatsStep(Step):
+    name = "seats"
+
+    def handle(self, ctx):
+        body, session = ctx.body, ctx.session
+        total = int(session.get("passengers_total", 1))
+        requested = []
+        if body.strip().lower() != "auto":
+            for t in body.replace(",", " ").replace(";", " ").split():
+                t = t.upper()
+                if seat_index(t) is not None:
+                    requested.append(t)
+            requested = list(dict.fromkeys(requested))
+        selected = _selected_flight(session)
+        if not selected:
+            return "Session expired. Please reply 'Restart' to start over."
+        # Hold the requested seats and auto-assign the rest next to each other
+        try:
+            seats = hold_seats(selected, ctx.from_number, total, requested)
+        except SeatUnavailable as e:
+            if e.seats:
+                return f"Seat(s) {' '.join(e.seats)} already taken. Reply 'auto' or choose other seats."
+            return "Not enough seats left on this flight. Reply 'Restart' to pick another flight."
+        session["assigned_seats"] = seats
+        self.goto(ctx, "confirm")
+        ctx.save_session()
+        return f"Seats set: {' '.join(session['assigned_seats'])}. Reply 'confirm' to generate your ticket PDF, or 'Restart' to start over."
+
+
+class ConfirmStep(Step):
+    name = "confirm"
+    needs = frozenset({SESSION, USER})
+
+    def _seats_lost(self, ctx) -> str:
+        release_seats(ctx.from_number)
+        ctx.session.pop("assigned_seats", None)
+        self.goto(ctx, "seats")
+        ctx.save_session()
+        return "Sorry, some of your seats were just taken. Reply 'auto' or choose other seats (e.g., 12A 12B)."
+
+    def handle(self, ctx):
+        # Wait for explicit confirmation to issue the ticket
+        if ctx.body.strip().lower() != "confirm":
+            return CONFIRM_PROMPT
+        session = ctx.session
+        selected = _selected_flight(session)
+        if not selected:
+            # Safety: go back to flight selection
+            self.goto(ctx, "flights")
+            ctx.save_session()
+            return "Session expired. Please pick a flight again: reply 'Restart' to start over."
+        # Re-take the hold (it may have expired, or been made on another worker) so the
+        # seats cannot be handed out here while the booking is written.
+        total = int(session.get("passengers_total", 1))
+        try:
+            session["assigned_seats"] = hold_seats(selected, ctx.from_number, total, session.get("assigned_seats"))
+        except SeatUnavailable:
+            return self._seats_lost(ctx)
+        # Persist the booking + issuance job and reply right away; the PDF is rendered
+        # and delivered over WhatsApp by the background issue worker.
+        try:
+            booking = create_pending_booking(ctx.db, ctx.identity.user_id, ctx.from_number, session, selected, ctx.tz)
+        except SeatUnavailable:
+            # Sold by another worker; reload this flight's seat map from the database
+            forget_flight(selected)
+            return self._seats_lost(ctx)
+        except Exception:
+            ctx.db.rollback()
+            # A cached user id may point at a row that no longer exists
+            invalidate_identity(ctx.from_number)
+            return "Could not generate ticket right now. Please try again in a moment or reply 'Restart'."
+        confirm_seats(selected, ctx.from_number, booking.flight_meta["seats"])
+        ctx.clear_session()
+        meta = booking.flight_meta
+        seats_str = ", ".join(meta["seats"])
+        return f"Booking confirmed ✅ (PNR: {booking.pnr}, Seats: {seats_str}, Gate: {meta['gate']})\nYour ticket PDF will arrive here shortly.\nDownload: {meta['ticket_url']}"
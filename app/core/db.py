@@ -1,10 +1,39 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, JSON, Numeric
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+import time
+
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Date, DateTime, ForeignKey, JSON, Numeric, Index, UniqueConstraint
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship, validates
 from datetime import datetime
+import pytz
+from app.core.metrics import DB_QUERY_SECONDS
 from app.core.settings import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+_pool_kwargs = {}
+if not settings.DATABASE_URL.startswith("sqlite"):
+    _pool_kwargs = {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, **_pool_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_STATEMENTS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    verb = statement[:16].lstrip().split(" ", 1)[0].upper()
+    DB_QUERY_SECONDS.observe(elapsed, verb if verb in _STATEMENTS else "OTHER")
+
+
+@event.listens_for(engine, "handle_error")
+def _query_failed(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
 Base = declarative_base()
 
 class User(Base):
@@ -16,6 +45,25 @@ class User(Base):
 
     bookings = relationship("Booking", back_populates="user")
 
+
+def to_utc_naive(value: datetime, tz_name: str | None = None) -> datetime:
+    """
+    Booking.depart_at convention: naive UTC, the same on every backend (SQLite
+    would keep an aware value's wall time, Postgres would convert it to UTC).
+    A naive value is read as local time in tz_name, or as UTC already without one.
+    """
+    if value.tzinfo is None:
+        if tz_name is None:
+            return value
+        value = pytz.timezone(tz_name).localize(value)
+    return value.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def from_utc_naive(value: datetime, tz_name: str) -> datetime:
+    """A stored depart_at as an aware datetime in tz_name."""
+    return pytz.utc.localize(value).astimezone(pytz.timezone(tz_name))
+
+
 class Booking(Base):
     __tablename__ = 'bookings'
     id = Column(Integer, primary_key=True)
@@ -28,10 +76,119 @@ class Booking(Base):
     currency = Column(String, default='INR')
     payment_status = Column(String, default='pending')
     stripe_session_id = Column(String)
+    # Promoted out of flight_meta so lookups are a single index probe
+    pnr = Column(String(6), unique=True, index=True, nullable=True)
+    ticket_id = Column(String, unique=True, index=True, nullable=True)
+    # Selected flight id (e.g. "AI101"); with depart_at, selects a flight's passengers
+    flight_id = Column(String(16), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="bookings")
 
+    __table_args__ = (Index('ix_bookings_flight_id_depart_at', 'flight_id', 'depart_at'),)
+
+    @validates("pnr")
+    def _normalize_pnr(self, _key, value):
+        return value.strip().upper() if value else None
+
+    @validates("ticket_id")
+    def _normalize_ticket_id(self, _key, value):
+        return value.strip().lower() if value else None
+
+    @validates("depart_at")
+    def _normalize_depart_at(self, _key, value):
+        return to_utc_naive(value) if isinstance(value, datetime) else value
+
+class IssueJob(Base):
+    """Persistent ticket-issuance work item; one per booking so retries are idempotent."""
+    __tablename__ = 'issue_jobs'
+    id = Column(Integer, primary_key=True)
+    booking_id = Column(Integer, ForeignKey('bookings.id'), unique=True, nullable=False)
+    status = Column(String, default='queued', nullable=False)  # queued/running/done/failed
+    attempts = Column(Integer, default=0, nullable=False)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (Index('ix_issue_jobs_status_run_after', 'status', 'run_after'),)
+
+class PnrCounter(Base):
+    """Shared counter PNR blocks are reserved from (see app/services/pnr.py)."""
+    __tablename__ = 'pnr_counters'
+    name = Column(String(32), primary_key=True)
+    next_value = Column(Integer, nullable=False, default=0)
+
+class SeatAssignment(Base):
+    """Confirmed seat on a flight departure; the unique key is the last word on double booking across workers."""
+    __tablename__ = 'seat_assignments'
+    id = Column(Integer, primary_key=True)
+    flight_key = Column(String(64), nullable=False)  # see seat_inventory.flight_key()
+    seat = Column(String(4), nullable=False)
+    booking_id = Column(Integer, ForeignKey('bookings.id'), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('flight_key', 'seat', name='uq_seat_assignments_flight_seat'),)
+
+class OutboundDeadLetter(Base):
+    """Outbound WhatsApp message Twilio rejected or that ran out of retries (see app/services/outbound.py)."""
+    __tablename__ = 'outbound_dead_letters'
+    id = Column(Integer, primary_key=True)
+    to_number = Column(String, nullable=False)
+    from_number = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    media_url = Column(String, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_status = Column(Integer, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Campaign(Base):
+    """Bulk WhatsApp notice to every booking on one flight departure (see app/services/campaigns.py)."""
+    __tablename__ = 'campaigns'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    flight_id = Column(String(16), nullable=False)
+    depart_date = Column(Date, nullable=False)
+    template = Column(String, nullable=False)
+    variables = Column(JSON)
+    # Timezone depart_date is a calendar day in; None means settings.DEFAULT_TIMEZONE
+    timezone = Column(String(64), nullable=True)
+    status = Column(String, default='queued', nullable=False)  # queued/running/done/failed
+    # Set when a runner claims the campaign and after every page; a 'running'
+    # campaign not touched for a while is taken to have crashed
+    claimed_at = Column(DateTime, nullable=True)
+    # Keyset cursor: every booking with id <= last_booking_id has been processed
+    last_booking_id = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class CampaignRecipient(Base):
+    """Delivery status of one campaign message; unique per booking so a resumed campaign never re-sends (see _send_batch)."""
+    __tablename__ = 'campaign_recipients'
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
+    booking_id = Column(Integer, ForeignKey('bookings.id'), nullable=False)
+    phone = Column(String, nullable=False)
+    status = Column(String, default='queued', nullable=False)  # queued/sent/failed/unknown
+    message_sid = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('campaign_id', 'booking_id', name='uq_campaign_recipients_campaign_booking'),
+        Index('ix_campaign_recipients_campaign_status', 'campaign_id', 'status'),
+    )
+
+class DataMigration(Base):
+    """One row per one-off data migration (e.g. a backfill) that has finished, so startup runs it only once."""
+    __tablename__ = 'data_migrations'
+    name = Column(String(64), primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
 class MessageLog(Base):
     __tablename__ = 'message_logs'
     id = Column(Integer, primary_key=True)
@@ -42,5 +199,25 @@ class MessageLog(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+def _add_missing_columns():
+    # create_all() never alters existing tables; add new nullable columns
+    # (and their indexes) so older databases pick up the schema in place.
+    insp = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in existing]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for col in missing:
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+        for idx in table.indexes:
+            idx.create(bind=engine, checkfirst=True)
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
@@ -0,0 +1,37 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.settings import settings
+
+# Bounded pool for blocking work (sync SQLAlchemy, Twilio REST, ReportLab, ngrok probe)
+# so async handlers never stall the event loop. Keep DB_POOL_SIZE + DB_MAX_OVERFLOW
+# at least this large or threads will queue on the connection pool instead.
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+        return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking callable on the shared pool, preserving contextvars."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        pool, _executor = _executor, None
+    if pool is not None:
+        pool.shutdown(wait=True)
@@ -0,0 +1,212 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+
+import redis
+from fastapi import Response
+
+from app.core.redis import r, session_backend
+from app.core.settings import settings
+
+# Webhook deliveries are processed at most once per delivery id (Twilio
+# MessageSid, Stripe event id). The first request claims the id with a short
+# lease, runs the handler and stores the response for IDEMPOTENCY_TTL_SECONDS;
+# a replay waits for that response (up to IDEMPOTENCY_WAIT_SECONDS if the
+# original is still running) and gets the same bytes back. If the handler
+# raises, the claim is released so the provider's next retry runs it again.
+# Records live in Redis alongside sessions (shared by all workers) and in a
+# bounded in-process store whenever sessions are served locally.
+
+_PENDING = b"P:"
+_DONE = b"D:"
+_POLL_MAX = 0.2
+
+
+class ReplayInProgress(Exception):
+    """The original delivery was still running when the wait ran out."""
+
+
+def _encode(resp: Response) -> bytes:
+    return _DONE + json.dumps({
+        "status": resp.status_code,
+        "media_type": resp.media_type,
+        "body": resp.body.decode(),
+    }).encode()
+
+
+def _decode(value: bytes) -> Response:
+    data = json.loads(value[len(_DONE):])
+    return Response(content=data["body"], status_code=data["status"], media_type=data["media_type"])
+
+
+class LocalIdempotencyStore:
+    """Bounded LRU of key -> (value, expires) with atomic claim; waiters are woken when a key completes."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _get(self, key: str) -> bytes | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[1] < time.time():
+            del self._items[key]
+            return None
+        return item[0]
+
+    def _put(self, key: str, value: bytes, ttl: float):
+        self._items[key] = (value, time.time() + ttl)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def claim(self, key: str, token: bytes, lease: float) -> bytes | None:
+        """Claim key for token; returns None if claimed, else the current value."""
+        with self._cond:
+            current = self._get(key)
+            if current is not None:
+                return current
+            self._put(key, token, lease)
+            return None
+
+    def complete(self, key: str, value: bytes, ttl: float):
+        with self._cond:
+            self._put(key, value, ttl)
+            self._cond.notify_all()
+
+    def release(self, key: str, token: bytes):
+        with self._cond:
+            if self._get(key) == token:
+                del self._items[key]
+            self._cond.notify_all()
+
+    def wait(self, key: str, timeout: float) -> bytes | None:
+        """Block until key is done or gone; returns its value (None if released/expired)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                current = self._get(key)
+                if current is None or current.startswith(_DONE):
+                    return current
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return current
+                self._cond.wait(remaining)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisIdempotencyStore:
+    def __init__(self, client: redis.Redis, prefix: str = "idem:"):
+        self.client = client
+        self.prefix = prefix
+
+    def claim(self, key: str, token: bytes, lease: float) -> bytes | None:
+        k = self.prefix + key
+        if self.client.set(k, token, nx=True, px=int(lease * 1000)):
+            return None
+        current = self.client.get(k)
+        if current is None:  # expired between SET and GET; try once more
+            return None if self.client.set(k, token, nx=True, px=int(lease * 1000)) else self.client.get(k)
+        return current
+
+    def complete(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def release(self, key: str, token: bytes):
+        k = self.prefix + key
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(k)
+                if pipe.get(k) == token:
+                    pipe.multi()
+                    pipe.delete(k)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+    def wait(self, key: str, timeout: float) -> bytes | None:
+        # Other workers hold the claim, so poll with backoff
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            current = self.client.get(self.prefix + key)
+            if current is None or current.startswith(_DONE) or time.monotonic() >= deadline:
+                return current
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, _POLL_MAX)
+
+
+class Idempotency:
+    def __init__(self, redis_store: RedisIdempotencyStore, local_store: LocalIdempotencyStore,
+                 ttl: float, lease: float, wait: float):
+        self.redis = redis_store
+        self.local = local_store
+        self.ttl = ttl
+        self.lease = lease
+        self.wait = wait
+        self.stats = {"executed": 0, "replayed": 0}
+
+    def _store(self):
+        # Follow the session store: Redis while it is serving sessions, local otherwise
+        return self.redis if session_backend() == "redis" else self.local
+
+    def run_once(self, key: str, handler: Callable[[], Response]) -> Response:
+        """Run handler once per key; replays get the first run's response."""
+        store = self._store()
+        token = _PENDING + uuid.uuid4().hex.encode()
+        try:
+            current = store.claim(key, token, self.lease)
+        except redis.RedisError:
+            store = self.local
+            current = store.claim(key, token, self.lease)
+        while current is not None:
+            if current.startswith(_PENDING):
+                current = store.wait(key, self.wait)
+                if current is not None and current.startswith(_PENDING):
+                    raise ReplayInProgress(key)
+            if current is not None:
+                self.stats["replayed"] += 1
+                return _decode(current)
+            # Original run failed and released the claim: take it over
+            current = store.claim(key, token, self.lease)
+        try:
+            resp = handler()
+        except BaseException:
+            try:
+                store.release(key, token)
+            except redis.RedisError:
+                pass  # the lease expires on its own
+            raise
+        try:
+            store.complete(key, _encode(resp), self.ttl)
+        except redis.RedisError:
+            pass  # replays after the lease runs out will re-run; nothing else to do
+        self.stats["executed"] += 1
+        return resp
+
+
+_idempotency = Idempotency(
+    RedisIdempotencyStore(r),
+    LocalIdempotencyStore(settings.IDEMPOTENCY_LOCAL_MAX_ENTRIES),
+    ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+    lease=settings.IDEMPOTENCY_LEASE_SECONDS,
+    wait=settings.IDEMPOTENCY_WAIT_SECONDS,
+)
+
+
+def run_once(key: str | None, handler: Callable[[], Response]) -> Response:
+    """Deduplicate a webhook delivery by key (blocking; call from a worker thread). No key: just run handler."""
+    if not key:
+        return handler()
+    return _idempotency.run_once(key, handler)
+
+
+def idempotency_stats() -> dict:
+    return {**_idempotency.stats, "local_entries": len(_idempotency.local)}
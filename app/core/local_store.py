@@ -0,0 +1,143 @@
+import heapq
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+class _Shard:
+    __slots__ = ("lock", "items", "expiry", "dirty", "hits", "misses", "evictions", "expirations")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items: OrderedDict[str, tuple[dict, float]] = OrderedDict()  # LRU order, oldest first
+        self.expiry: list[tuple[float, str]] = []  # min-heap; stale entries skipped lazily
+        self.dirty: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+class LocalSessionStore:
+    """
+    In-process session store built for many concurrent chats.
+
+    Keys hash onto independent shards so threads only contend per shard. Reads
+    expire their own key lazily (O(1)); a background sweeper pops expired keys
+    off each shard's expiry heap, so no read ever scans the store. Each shard
+    is an LRU bounded to max_entries / shards.
+    """
+
+    def __init__(self, ttl: int, max_entries: int = 100_000, shards: int = 16, sweep_seconds: float = 30.0):
+        self.ttl = ttl
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._per_shard = max(1, max_entries // len(self._shards))
+        self._sweep_seconds = sweep_seconds
+        if sweep_seconds > 0:
+            threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True).start()
+
+    def _shard(self, phone: str) -> _Shard:
+        return self._shards[zlib.crc32(phone.encode()) % len(self._shards)]
+
+    def get(self, phone: str) -> dict:
+        sh = self._shard(phone)
+        with sh.lock:
+            item = sh.items.get(phone)
+            if item is None:
+                sh.misses += 1
+                return {}
+            if item[1] < time.time():
+                del sh.items[phone]
+                sh.expirations += 1
+                sh.misses += 1
+                return {}
+            sh.items.move_to_end(phone)
+            sh.hits += 1
+            return item[0]
+
+    def set(self, phone: str, data: dict, dirty: bool = False):
+        sh = self._shard(phone)
+        expires = time.time() + self.ttl
+        with sh.lock:
+            sh.items[phone] = (data, expires)
+            sh.items.move_to_end(phone)
+            heapq.heappush(sh.expiry, (expires, phone))
+            if dirty:
+                sh.dirty.add(phone)
+            while len(sh.items) > self._per_shard:
+                sh.items.popitem(last=False)
+                sh.evictions += 1
+            # Overwrites leave stale heap entries behind; rebuild before they pile up
+            if len(sh.expiry) > 2 * len(sh.items) + 1024:
+                sh.expiry = [(exp, k) for k, (_, exp) in sh.items.items()]
+                heapq.heapify(sh.expiry)
+
+    def delete(self, phone: str, dirty: bool = False):
+        sh = self._shard(phone)
+        with sh.lock:
+            sh.items.pop(phone, None)
+            if dirty:
+                sh.dirty.add(phone)
+
+    def pop_dirty(self) -> dict[str, dict | None]:
+        """Sessions written while Redis was down (None = deleted), removed from the local store."""
+        out: dict[str, dict | None] = {}
+        now = time.time()
+        for sh in self._shards:
+            with sh.lock:
+                for phone in sh.dirty:
+                    item = sh.items.pop(phone, None)
+                    out[phone] = item[0] if item and item[1] >= now else None
+                sh.dirty.clear()
+        return out
+
+    def restore_dirty(self, sessions: dict[str, dict | None]):
+        """Put back what pop_dirty() returned after a failed replay, skipping sessions written again since."""
+        expires = time.time() + self.ttl
+        for phone, data in sessions.items():
+            sh = self._shard(phone)
+            with sh.lock:
+                if phone in sh.dirty:
+                    continue
+                sh.dirty.add(phone)
+                if data is None:
+                    sh.items.pop(phone, None)
+                else:
+                    sh.items[phone] = (data, expires)
+                    heapq.heappush(sh.expiry, (expires, phone))
+
+    def sweep(self) -> int:
+        """Drop every expired key; returns how many were removed."""
+        removed = 0
+        now = time.time()
+        for sh in self._shards:
+            with sh.lock:
+                while sh.expiry and sh.expiry[0][0] < now:
+                    exp, phone = heapq.heappop(sh.expiry)
+                    item = sh.items.get(phone)
+                    # Only expire if the heap entry still matches the key's current expiry
+                    if item is not None and item[1] == exp:
+                        del sh.items[phone]
+                        sh.expirations += 1
+                        removed += 1
+        return removed
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self._sweep_seconds)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        out = {"size": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        for sh in self._shards:
+            with sh.lock:
+                out["size"] += len(sh.items)
+                out["hits"] += sh.hits
+                out["misses"] += sh.misses
+                out["evictions"] += sh.evictions
+                out["expirations"] += sh.expirations
+        return out
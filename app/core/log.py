@@ -0,0 +1,49 @@
+import json
+import logging
+import sys
+
+from app.core.settings import settings
+
+# Everything under the "app" logger goes to stderr, one line per record:
+# LOG_FORMAT=text gives "time level logger message key=value ...", json gives
+# one object per line. Fields passed with extra={...} become the key/values.
+# Below LOG_LEVEL a call costs a level check and nothing else.
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, as_json: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not self.as_json:
+            line = super().format(record)
+            extra = " ".join(f"{k}={v!r}" for k, v in _fields(record).items())
+            return f"{line} {extra}" if extra else line
+        out = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+def setup_logging():
+    logger = logging.getLogger("app")
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter(as_json=settings.LOG_FORMAT == "json"))
+    logger.addHandler(handler)
+    logger.setLevel(settings.LOG_LEVEL.upper())
+    logger.propagate = False
@@ -0,0 +1,150 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Prometheus-format metrics, served at /metrics. They are always on, so
+# recording must be cheap. Every metric keeps one shard of counters per
+# thread. observe()/inc() only touch the calling thread's shard: a dict
+# lookup and a couple of list increments, with no lock and no contention
+# between pool threads. A scrape sums the shards. Shards outlive their
+# threads, so totals never go backwards.
+
+# Seconds; covers a cached session read (~µs) up to a slow Twilio/Stripe call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._shards_lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Once per thread; the only time recording takes a lock
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self) -> dict[tuple, list]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged: dict[tuple, list] = {}
+        for shard in shards:
+            for labels, row in shard.copy().items():
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(row)
+                else:
+                    for i, v in enumerate(row):
+                        total[i] += v
+        return merged
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            row = shard[labels] = [0]
+        row[0] += amount
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {row[0]}"
+                for labels, row in sorted(self._merged().items())]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds: float, *labels):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # one slot per bucket plus +Inf (not cumulative), then the sum
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, seconds)] += 1
+        row[-1] += seconds
+
+    def time(self, *labels) -> _Timer:
+        """with HISTOGRAM.time("label"): ... observes the block's wall time, exceptions included."""
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = []
+        bounds = [f'le="{b}"' for b in self.buckets] + ['le="+Inf"']
+        for labels, row in sorted(self._merged().items()):
+            cumulative = 0
+            for le, n in zip(bounds, row):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {row[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format (0.0.4)."""
+    out = []
+    for metric in _registry:
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        out.extend(metric.render())
+    return "\n".join(out) + "\n"
+
+
+WEBHOOK_SECONDS = Histogram("webhook_request_seconds", "Inbound webhook handling time", ("provider",))
+STEP_SECONDS = Histogram("fsm_step_seconds", "Conversation step handler time", ("step",))
+TICKET_RENDER_SECONDS = Histogram("ticket_pdf_render_seconds", "Ticket PDF render time (excluding storage)")
+EXTERNAL_CALL_SECONDS = Histogram("external_call_seconds", "Calls to Twilio, Stripe and SendGrid",
+                                  ("service", "operation"))
+EXTERNAL_CALL_ERRORS = Counter("external_call_errors_total", "Failed calls to Twilio, Stripe and SendGrid",
+                               ("service", "operation"))
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Database statement execution time", ("statement",))
+SESSION_SECONDS = Histogram("session_store_seconds", "Session store reads and writes", ("op", "backend"))
@@ -1,69 +1,330 @@
-import json
+import contextvars
 import threading
 import time
+from contextlib import contextmanager
+
 import redis
-from app.core.settings import settings
 
-r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+from app.core.local_store import LocalSessionStore
+from app.core.metrics import SESSION_SECONDS
+from app.core.session_codec import encode_session, decode_session
+from app.core.settings import settings
 
 SESSION_TTL_SECONDS = 60 * 60 * 6  # 6 hours
+_REPLAY_ROUNDS = 10  # unlocked drains before the final one under the breaker lock
 
-# In-process fallback store if Redis is down/unreachable
-_fallback_store: dict[str, tuple[dict, float]] = {}
-_fallback_lock = threading.RLock()
-_use_fallback = True
+# One pooled client per process; short socket timeouts so an unhealthy Redis
+# trips the breaker quickly instead of stalling webhook threads.
+_pool = redis.ConnectionPool.from_url(
+    settings.REDIS_URL,
+    decode_responses=False,  # session values are binary (msgpack)
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
+r = redis.Redis(connection_pool=_pool)
 
 
-def _enable_fallback(reason: str = ""):
-    global _use_fallback
-    _use_fallback = True
+def session_key(phone: str) -> str:
+    # Hash layout (see session_codec); distinct from the old JSON-string "wa:{phone}" keys
+    return f"wa:s:{phone}"
 
 
-def _fallback_cleanup():
-    now = time.time()
-    with _fallback_lock:
-        expired = [k for k, (_, exp) in _fallback_store.items() if exp < now]
-        for k in expired:
-            _fallback_store.pop(k, None)
+class RedisSessionStore:
+    """
+    Sessions as Redis hashes (one encoded value per field, see session_codec).
+    write() takes the raw fields the session was loaded with and only sends
+    fields whose encoding changed, so unchanged bulky fields such as
+    presented_flights are not re-sent on every step. The TTL is refreshed in
+    the same transaction as the fields.
+    """
 
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
 
-def session_key(phone: str) -> str:
-    return f"wa:{phone}"
+    def load(self, phone: str) -> tuple[dict, dict[str, bytes]]:
+        # HGETALL + sliding EXPIRE in one round trip; returns (session, raw snapshot)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(session_key(phone))
+        pipe.expire(session_key(phone), self.ttl)
+        raw, _ = pipe.execute()
+        snapshot = {(k.decode() if isinstance(k, bytes) else k): v for k, v in (raw or {}).items()}
+        return decode_session(snapshot), snapshot
 
+    def get(self, phone: str) -> dict:
+        return self.load(phone)[0]
 
-def get_session(phone: str) -> dict:
-    if _use_fallback:
-        _fallback_cleanup()
-        with _fallback_lock:
-            item = _fallback_store.get(phone)
-            return item[0] if item else {}
+    def write(self, phone: str, data: dict, snapshot: dict[str, bytes] | None = None, pipe=None):
+        """
+        Write data. With a snapshot only changed/removed fields are sent,
+        unless the hash expired or was deleted since it was loaded: then a
+        delta would leave a partial session, so it is rewritten in full.
+        Without one (or on a shared pipe) it is always a full rewrite.
+        """
+        key = session_key(phone)
+        fields = encode_session(data)
+        if snapshot and pipe is None and self._write_delta(key, fields, snapshot):
+            return
+        own_pipe = pipe is None
+        if own_pipe:
+            pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+        if own_pipe:
+            pipe.execute()
+
+    def _write_delta(self, key: str, fields: dict[str, bytes], snapshot: dict[str, bytes]) -> bool:
+        """HDEL/HSET/EXPIRE only what changed, in one MULTI guarded by WATCH+EXISTS; False if the key is gone."""
+        changed = {k: v for k, v in fields.items() if snapshot.get(k) != v}
+        removed = [k for k in snapshot if k not in fields]
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(key)
+                if not pipe.exists(key):
+                    return False
+                pipe.multi()
+                if removed:
+                    pipe.hdel(key, *removed)
+                if changed:
+                    pipe.hset(key, mapping=changed)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                # Touched (possibly expired or deleted) between EXISTS and EXEC
+                return False
+
+    def set(self, phone: str, data: dict):
+        self.write(phone, data)
+
+    def delete(self, phone: str):
+        self.client.delete(session_key(phone))
+
+    def sync(self, sessions: dict[str, dict | None]):
+        pipe = self.client.pipeline(transaction=False)
+        for phone, data in sessions.items():
+            if data is None:
+                pipe.delete(session_key(phone))
+            else:
+                self.write(phone, data, pipe=pipe)
+        pipe.execute()
+
+    def ping(self) -> bool:
+        return bool(self.client.ping())
+
+
+class CircuitBreaker:
+    """
+    Routes session traffic to Redis while it is healthy. After
+    REDIS_FAILURE_THRESHOLD consecutive errors it opens: traffic goes to the
+    local store and a background thread pings Redis every
+    REDIS_HEALTHCHECK_SECONDS. Once a ping succeeds, sessions written locally
+    during the outage are pushed back to Redis and the breaker closes.
+    """
+
+    def __init__(self, primary: RedisSessionStore, fallback: LocalSessionStore, threshold: int, interval: float):
+        self.primary = primary
+        self.fallback = fallback
+        self.threshold = threshold
+        self.interval = interval
+        self._failures = 0
+        self._open = False
+        self._lock = threading.Lock()
+        self._probe: threading.Thread | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._open or self._failures < self.threshold:
+                return
+            self._open = True
+            self._probe = threading.Thread(target=self._probe_loop, name="redis-health", daemon=True)
+            self._probe.start()
+
+    def write_local(self, write) -> bool:
+        """
+        Run write (a dirty-marking local store call) while the breaker is
+        still open; returns False, without writing, once it has closed. The
+        probe thread closes the breaker under the same lock, so no outage
+        write can land after its final replay.
+        """
+        with self._lock:
+            if not self._open:
+                return False
+            write()
+            return True
+
+    def _replay(self) -> bool:
+        dirty = self.fallback.pop_dirty()
+        if not dirty:
+            return False
+        try:
+            self.primary.sync(dirty)
+        except Exception:
+            self.fallback.restore_dirty(dirty)
+            raise
+        return True
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.primary.ping()
+                # Replay outage writes before routing reads back to Redis:
+                # drain while they keep coming, then once more under the lock
+                for _ in range(_REPLAY_ROUNDS):
+                    if not self._replay():
+                        break
+                with self._lock:
+                    self._replay()
+                    self._failures = 0
+                    self._open = False
+                return
+            except Exception:
+                continue
+
+
+_local = LocalSessionStore(
+    SESSION_TTL_SECONDS,
+    max_entries=settings.SESSION_LOCAL_MAX_ENTRIES,
+    shards=settings.SESSION_LOCAL_SHARDS,
+    sweep_seconds=settings.SESSION_SWEEP_SECONDS,
+)
+_redis = RedisSessionStore(r, SESSION_TTL_SECONDS)
+_breaker = CircuitBreaker(_redis, _local, settings.REDIS_FAILURE_THRESHOLD, settings.REDIS_HEALTHCHECK_SECONDS)
+_use_redis = settings.SESSION_BACKEND == "redis"
+
+
+def session_backend() -> str:
+    """Which store is serving sessions right now: 'redis' or 'local'."""
+    return "redis" if _use_redis and not _breaker.is_open else "local"
+
+
+def local_session_stats() -> dict:
+    """Size and hit/miss/eviction/expiration counters of the in-process store."""
+    return _local.stats()
+
+
+def _load(phone: str) -> tuple[dict, dict[str, bytes] | None]:
+    backend = session_backend()
+    with SESSION_SECONDS.time("get", backend):
+        if backend == "local":
+            return _local.get(phone), None
+        try:
+            data, snapshot = _redis.load(phone)
+            _breaker.record_success()
+            return data, snapshot
+        except Exception:
+            _breaker.record_failure()
+            return _local.get(phone), None
+
+
+def _write(phone: str, data: dict, snapshot: dict[str, bytes] | None = None):
+    backend = session_backend()
+    with SESSION_SECONDS.time("set", backend):
+        if backend == "local":
+            if not _use_redis:
+                _local.set(phone, data)
+                return
+            if _breaker.write_local(lambda: _local.set(phone, data, dirty=True)):
+                return
+            snapshot = None  # the breaker closed meanwhile; write the whole session to Redis
+        try:
+            _redis.write(phone, data, snapshot)
+            _breaker.record_success()
+        except Exception:
+            _breaker.record_failure()
+            _local.set(phone, data, dirty=True)
+
+
+def _clear(phone: str):
+    backend = session_backend()
+    with SESSION_SECONDS.time("clear", backend):
+        if backend == "local":
+            if not _use_redis:
+                _local.delete(phone)
+                return
+            if _breaker.write_local(lambda: _local.delete(phone, dirty=True)):
+                return
+        try:
+            _redis.delete(phone)
+            _breaker.record_success()
+        except Exception:
+            _breaker.record_failure()
+            _local.delete(phone, dirty=True)
+
+
+class _SessionScope:
+    def __init__(self, phone: str):
+        self.phone = phone
+        self.loaded = False
+        self.data: dict = {}
+        self.snapshot: dict[str, bytes] | None = None
+        self.dirty = False
+        self.cleared = False
+
+    def flush(self):
+        if self.cleared:
+            _clear(self.phone)
+        elif self.dirty:
+            _write(self.phone, self.data, self.snapshot)
+
+
+_scope: contextvars.ContextVar[_SessionScope | None] = contextvars.ContextVar("session_scope", default=None)
+
+
+def _active_scope(phone: str) -> _SessionScope | None:
+    scope = _scope.get()
+    return scope if scope is not None and scope.phone == phone else None
+
+
+@contextmanager
+def session_scope(phone: str):
+    """
+    Coalesce all session I/O for one inbound message: the session is loaded at
+    most once, set/clear calls are staged, and a single delta write (or delete)
+    is sent when the block exits.
+    """
+    scope = _SessionScope(phone)
+    token = _scope.set(scope)
     try:
-        data = r.get(session_key(phone))
-        return json.loads(data) if data else {}
-    except Exception:
-        _enable_fallback("get_failed")
-        return get_session(phone)
+        yield scope
+    finally:
+        _scope.reset(token)
+        scope.flush()
+
+
+def get_session(phone: str) -> dict:
+    scope = _active_scope(phone)
+    if scope is None:
+        return _load(phone)[0]
+    if not scope.loaded:
+        scope.data, scope.snapshot = _load(phone)
+        scope.loaded = True
+    return scope.data
 
 
 def set_session(phone: str, data: dict):
-    if _use_fallback:
-        with _fallback_lock:
-            _fallback_store[phone] = (data, time.time() + SESSION_TTL_SECONDS)
+    scope = _active_scope(phone)
+    if scope is None:
+        _write(phone, data)
         return
-    try:
-        r.setex(session_key(phone), SESSION_TTL_SECONDS, json.dumps(data))
-    except Exception:
-        _enable_fallback("set_failed")
-        set_session(phone, data)
+    scope.data, scope.dirty, scope.cleared = data, True, False
 
 
 def clear_session(phone: str):
-    if _use_fallback:
-        with _fallback_lock:
-            _fallback_store.pop(phone, None)
+    scope = _active_scope(phone)
+    if scope is None:
+        _clear(phone)
         return
-    try:
-        r.delete(session_key(phone))
-    except Exception:
-        _enable_fallback("del_failed")
-        clear_session(phone)
+    # Nothing left to diff against once cleared; a later set rewrites in full
+    scope.data, scope.snapshot, scope.dirty, scope.cleared = {}, None, False, True
@@ -0,0 +1,57 @@
+import json
+from typing import Any
+
+from app.core.settings import settings
+
+try:
+    import msgpack
+except ImportError:  # optional; falls back to compact JSON
+    msgpack = None
+
+# Sessions are stored as a Redis hash: one encoded value per session field plus
+# a "_v" schema version field. Every value carries a one-byte format tag, so
+# msgpack and JSON values can be read side by side (e.g. during a rollout).
+SCHEMA_VERSION = 1
+VERSION_FIELD = "_v"
+
+_MSGPACK = b"m"
+_JSON = b"j"
+
+_use_msgpack = msgpack is not None and settings.SESSION_CODEC == "msgpack"
+
+
+def encode_value(value: Any) -> bytes:
+    if _use_msgpack:
+        return _MSGPACK + msgpack.packb(value, use_bin_type=True)
+    return _JSON + json.dumps(value, separators=(",", ":")).encode()
+
+
+def decode_value(raw: bytes) -> Any:
+    tag, payload = raw[:1], raw[1:]
+    if tag == _MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack-encoded session value but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if tag == _JSON:
+        return json.loads(payload)
+    raise ValueError(f"unknown session value tag {tag!r}")
+
+
+def encode_session(data: dict) -> dict[str, bytes]:
+    fields = {k: encode_value(v) for k, v in data.items()}
+    fields[VERSION_FIELD] = str(SCHEMA_VERSION).encode()
+    return fields
+
+
+def decode_session(fields: dict) -> dict:
+    """Decode a HGETALL result (bytes or str keys); unreadable fields are dropped."""
+    out = {}
+    for k, raw in fields.items():
+        key = k.decode() if isinstance(k, bytes) else k
+        if key == VERSION_FIELD:
+            continue
+        try:
+            out[key] = decode_value(raw)
+        except Exception:
+            continue
+    return out
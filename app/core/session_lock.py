@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+import redis
+
+from app.core.redis import r, session_backend
+from app.core.settings import settings
+
+# Messages from one phone number must be applied to its session one at a time,
+# or two quick messages both load the same session and the last write wins.
+#   - conversation_turn(): per-phone FIFO asyncio lock in the webhook, so a
+#     user's messages reach the thread pool in arrival order and queued ones
+#     wait on the event loop rather than holding a pool thread
+#   - session_lock(): held around the load/modify/write itself; a Redis lease
+#     (SET NX PX, owner-checked release) while Redis serves sessions, so
+#     workers serialize too, and an in-process keyed lock otherwise
+# Different phone numbers never contend.
+
+_POLL_MAX = 0.05
+
+
+class SessionBusy(Exception):
+    """Another request held the conversation for longer than SESSION_LOCK_WAIT_SECONDS."""
+
+
+class KeyedAsyncLock:
+    """One asyncio.Lock per key, dropped when nobody holds or waits on it. Event-loop use only."""
+
+    def __init__(self):
+        self._locks: dict[str, tuple[asyncio.Lock, list[int]]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = (asyncio.Lock(), [0])
+        lock, users = entry
+        users[0] += 1
+        try:
+            async with lock:  # asyncio.Lock wakes waiters in FIFO order
+                yield
+        finally:
+            users[0] -= 1
+            if users[0] == 0:
+                del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class KeyedThreadLock:
+    """Same as KeyedAsyncLock for threads."""
+
+    def __init__(self):
+        self._locks: dict[str, tuple[threading.Lock, list[int]]] = {}
+        self._mutex = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: str, timeout: float):
+        with self._mutex:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = (threading.Lock(), [0])
+            entry[1][0] += 1
+        lock, users = entry
+        try:
+            if not lock.acquire(timeout=timeout):
+                raise SessionBusy(key)
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            with self._mutex:
+                users[0] -= 1
+                if users[0] == 0:
+                    del self._locks[key]
+
+
+class RedisLease:
+    def __init__(self, client: redis.Redis, ttl: float, prefix: str = "wa:lock:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def acquire(self, key: str, timeout: float) -> bytes:
+        token = uuid.uuid4().hex.encode()
+        deadline = time.monotonic() + timeout
+        delay = 0.002
+        while not self.client.set(self.prefix + key, token, nx=True, px=int(self.ttl * 1000)):
+            if time.monotonic() >= deadline:
+                raise SessionBusy(key)
+            time.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+        return token
+
+    def release(self, key: str, token: bytes):
+        k = self.prefix + key
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(k)
+                # Only our own lease: if it expired and another worker took it, leave it alone
+                if pipe.get(k) == token:
+                    pipe.multi()
+                    pipe.delete(k)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+
+_turns = KeyedAsyncLock()
+_threads = KeyedThreadLock()
+_lease = RedisLease(r, settings.SESSION_LOCK_TTL_SECONDS)
+
+
+def conversation_turn(phone: str):
+    """async with conversation_turn(phone): run one inbound message for phone, in arrival order."""
+    return _turns.hold(phone)
+
+
+@contextmanager
+def session_lock(phone: str):
+    """Hold phone's session exclusively (across workers while Redis serves sessions). Blocking."""
+    wait = settings.SESSION_LOCK_WAIT_SECONDS
+    if session_backend() == "redis":
+        try:
+            token = _lease.acquire(phone, wait)
+        except redis.RedisError:
+            token = None  # sessions are about to fall back to this process anyway
+        if token is not None:
+            try:
+                yield
+            finally:
+                try:
+                    _lease.release(phone, token)
+                except redis.RedisError:
+                    pass  # the lease expires on its own
+            return
+    with _threads.hold(phone, wait):
+        yield
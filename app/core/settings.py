@@ -14,15 +14,124 @@ class Settings(BaseSettings):
     TWILIO_ACCOUNT_SID: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_WHATSAPP_NUMBER: str
+    TWILIO_API_BASE: str = "https://api.twilio.com"
+
+    # Outbound WhatsApp queue: per-sender token bucket (messages/second > 0,
+    # burst >= 1), concurrent requests, attempts before dead-lettering, and queue bound
+    # (enqueueing blocks when full)
+    OUTBOUND_RATE_PER_SECOND: float = 20.0
+    OUTBOUND_BURST: float = 20.0
+    OUTBOUND_CONCURRENCY: int = 16
+    OUTBOUND_MAX_ATTEMPTS: int = 6
+    OUTBOUND_QUEUE_SIZE: int = 10_000
+    OUTBOUND_TIMEOUT: float = 10.0
 
     STRIPE_SECRET_KEY: str
     STRIPE_WEBHOOK_SECRET: str
+    STRIPE_API_BASE: str = "https://api.stripe.com"
 
     SENDGRID_API_KEY: str
+    SENDGRID_API_BASE: str = "https://api.sendgrid.com"
     FROM_EMAIL: str
     FROM_NAME: str = "Flight Booking"
 
     DATABASE_URL: str
     REDIS_URL: str
 
+    # Sessions: "redis" (shared across workers, local fallback via circuit breaker) or "local"
+    SESSION_BACKEND: str = "redis"
+    # Per-field value encoding in Redis: "msgpack" (if installed) or "json"
+    SESSION_CODEC: str = "msgpack"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    # Consecutive failures before falling back; values > 1 can let a write that
+    # failed locally be shadowed by an older Redis copy on the next read
+    REDIS_FAILURE_THRESHOLD: int = 1
+    REDIS_HEALTHCHECK_SECONDS: float = 5.0
+    # In-process session store (primary for SESSION_BACKEND=local, fallback otherwise)
+    SESSION_LOCAL_MAX_ENTRIES: int = 100_000
+    SESSION_LOCAL_SHARDS: int = 16
+    SESSION_SWEEP_SECONDS: float = 30.0
+
+    # Per-phone session lock: lease on the Redis lock (outlives any one message)
+    # and how long a message waits for the previous one before giving up (503)
+    SESSION_LOCK_TTL_SECONDS: float = 30
+    SESSION_LOCK_WAIT_SECONDS: float = 10
+
+    # Webhook deduplication by Twilio MessageSid / Stripe event id: responses are
+    # kept for TTL (Stripe redelivers for up to 3 days), a delivery being
+    # processed holds its id for LEASE, and a replay waits up to WAIT for it
+    IDEMPOTENCY_TTL_SECONDS: float = 3 * 24 * 3600
+    IDEMPOTENCY_LEASE_SECONDS: float = 60
+    IDEMPOTENCY_WAIT_SECONDS: float = 15
+    IDEMPOTENCY_LOCAL_MAX_ENTRIES: int = 100_000
+
+    # Message log: inbound/outbound WhatsApp messages are buffered in memory and
+    # bulk-inserted into message_logs every BATCH_SIZE rows or FLUSH_SECONDS;
+    # past MAX_BUFFER rows are dropped (drop_oldest or drop_newest)
+    MESSAGE_LOG_ENABLED: bool = True
+    MESSAGE_LOG_BATCH_SIZE: int = 500
+    MESSAGE_LOG_FLUSH_SECONDS: float = 1.0
+    MESSAGE_LOG_MAX_BUFFER: int = 50_000
+    MESSAGE_LOG_ON_FULL: str = "drop_oldest"
+
+    # Application logging: DEBUG, INFO, WARNING, ...; text or json lines on stderr
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+
+    # Concurrency: threads for blocking work in async handlers, and DB connections
+    BLOCKING_POOL_SIZE: int = 32
+    DB_POOL_SIZE: int = 16
+    DB_MAX_OVERFLOW: int = 16
+
+    # phone -> user id/email cache so most inbound messages skip the users table
+    IDENTITY_CACHE_TTL_SECONDS: float = 600
+    IDENTITY_CACHE_MAX_ENTRIES: int = 50_000
+
+    # Background ticket issuance (render PDF + WhatsApp delivery)
+    ISSUE_WORKERS: int = 2
+    ISSUE_MAX_ATTEMPTS: int = 5
+    ISSUE_POLL_SECONDS: float = 2.0
+
+    # Ticket PDF storage: "local" (TICKETS_DIR, sharded into TICKET_SHARD_DEPTH
+    # levels of 2-character id-prefix directories) or "s3" (needs boto3;
+    # credentials come from the usual AWS_* environment variables)
+    TICKET_STORAGE: str = "local"
+    TICKETS_DIR: str = "tickets"
+    TICKET_SHARD_DEPTH: int = 2
+    S3_BUCKET: str | None = None
+    S3_PREFIX: str = "tickets/"
+    S3_ENDPOINT_URL: str | None = None  # MinIO / local stand-in; empty for AWS
+    S3_REGION: str | None = None
+
+    # In-memory LRU of ticket PDFs served by /tickets (freshly issued tickets are fetched repeatedly)
+    TICKET_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Flight search: comma-separated providers queried concurrently ("timetable", "fake";
+    # "mock" is the fixed three-flight stub the tests and benches use)
+    FLIGHT_PROVIDERS: str = "timetable"
+    # Schedule CSV for the timetable provider (defaults to app/data/timetable.csv, see app/services/timetable.py)
+    TIMETABLE_PATH: str | None = None
+    FLIGHT_PROVIDER_TIMEOUT: float = 2.0
+    # Results per (route, departure hour) are fresh for TTL, then served stale
+    # for up to STALE more seconds while one background refresh runs
+    FLIGHT_CACHE_TTL_SECONDS: float = 300
+    FLIGHT_CACHE_STALE_SECONDS: float = 900
+    FAKE_PROVIDER_LATENCY: float = 0.0
+
+    # Airport dataset for city -> IATA resolution (defaults to app/data/airports.csv)
+    AIRPORTS_PATH: str | None = None
+
+    # PNR allocation: counter values are reserved per process in blocks of this
+    # size and scrambled with PNR_KEY. Keep PNR_KEY fixed once bookings exist;
+    # changing it can re-issue codes (the unique Booking.pnr index then forces a retry).
+    PNR_BLOCK_SIZE: int = 1000
+    PNR_KEY: str = "flight-booking-pnr"
+
+    # Shared secret for admin endpoints (X-Admin-Token header); unset disables them
+    ADMIN_API_TOKEN: str | None = None
+
+    # Seats picked in the seats step are held for this long before confirm
+    SEAT_HOLD_SECONDS: float = 900
+
 settings = Settings()
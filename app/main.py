@@ -1,14 +1,26 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os
 
 from app.core.settings import settings
-from app.core.db import init_db
+from app.core.db import init_db, SessionLocal
+from app.core.executor import shutdown_executor
+from app.core.log import setup_logging
+from app.core.metrics import render_metrics
+from app.core.idempotency import idempotency_stats
+from app.core.redis import session_backend, local_session_stats
+from app.services.bookings import run_pending_backfills
+from app.services.issuance import start_issue_worker, stop_issue_worker
+from app.services.message_log import message_log_stats, stop_message_log
+from app.services.outbound import stop_outbound
+from app.services.ticket_store import ticket_cache_stats
 from app.routers.whatsapp import router as whatsapp_router
 from app.routers.stripe_webhook import router as stripe_router
 from app.routers.booking import router as booking_router
+from app.routers.campaigns import router as campaigns_router
+from app.routers.tickets import router as tickets_router
 
+setup_logging()
 app = FastAPI(title="WhatsApp Flight Booking")
 
 app.add_middleware(
@@ -22,28 +34,51 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     init_db()
-    # Ensure tickets directory exists for serving generated PDFs
-    os.makedirs("tickets", exist_ok=True)
+    # Promote legacy flight_meta PNR/ticket/flight ids into the indexed columns (once per database)
+    db = SessionLocal()
+    try:
+        run_pending_backfills(db)
+    finally:
+        db.close()
+    # Drain queued ticket issuance (including jobs left over from a restart)
+    start_issue_worker()
 
-# Ensure the tickets directory exists at import time to satisfy StaticFiles
-os.makedirs("tickets", exist_ok=True)
-# Serve generated ticket PDFs
-app.mount("/tickets", StaticFiles(directory="tickets", check_dir=False), name="tickets")
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_issue_worker()
+    stop_outbound()
+    stop_message_log()
+    shutdown_executor()
 
 app.include_router(whatsapp_router, prefix="/whatsapp", tags=["whatsapp"]) 
 app.include_router(stripe_router, prefix="/stripe", tags=["stripe"]) 
 app.include_router(booking_router, tags=["booking"]) 
+app.include_router(campaigns_router, tags=["campaigns"])
+app.include_router(tickets_router, tags=["tickets"])
 
 @app.get("/")
 @app.post("/")
 def root():
-    print("Hello World")
     return {
         "status": "ok",
         "message": "WhatsApp Flight Booking API",
-        "endpoints": ["/health", "/whatsapp/webhook", "/docs"],
+        "endpoints": ["/health", "/metrics", "/whatsapp/webhook", "/docs"],
     }
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "env": settings.ENV}
+    return {
+        "status": "ok",
+        "env": settings.ENV,
+        "sessions": session_backend(),
+        "local_sessions": local_session_stats(),
+        "ticket_cache": ticket_cache_stats(),
+        "idempotency": idempotency_stats(),
+        "message_log": message_log_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus scrape target; see app/core/metrics.py for what is recorded
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,88 @@
+import hmac
+from datetime import date
+
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func
+
+from app.core.db import SessionLocal, Campaign, CampaignRecipient
+from app.core.executor import run_blocking
+from app.core.settings import settings
+from app.services.campaigns import CampaignError, campaign_summary, claim_campaign, create_campaign, start_campaign
+
+router = APIRouter()
+
+
+class CampaignIn(BaseModel):
+    name: str
+    flight_id: str
+    depart_date: date
+    template: str
+    variables: dict[str, str] = {}
+    timezone: str | None = None  # depart_date's timezone; default DEFAULT_TIMEZONE
+
+
+def _require_admin(token: str | None):
+    # Campaigns message every passenger on a flight; disabled unless ADMIN_API_TOKEN is set
+    if not settings.ADMIN_API_TOKEN or not token or not hmac.compare_digest(token, settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _create(body: CampaignIn) -> dict:
+    db = SessionLocal()
+    try:
+        campaign = create_campaign(db, body.name, body.flight_id, body.depart_date, body.template, body.variables,
+                                   body.timezone)
+        return campaign_summary(campaign)
+    finally:
+        db.close()
+
+
+def _summary(campaign_id: int) -> dict | None:
+    db = SessionLocal()
+    try:
+        campaign = db.get(Campaign, campaign_id)
+        if campaign is None:
+            return None
+        counts = dict(
+            db.query(CampaignRecipient.status, func.count())
+            .filter(CampaignRecipient.campaign_id == campaign_id)
+            .group_by(CampaignRecipient.status)
+            .all()
+        )
+        return {**campaign_summary(campaign), "recipients": counts}
+    finally:
+        db.close()
+
+
+@router.post("/campaigns", status_code=202)
+async def post_campaign(body: CampaignIn, x_admin_token: str | None = Header(default=None)):
+    _require_admin(x_admin_token)
+    try:
+        summary = await run_blocking(_create, body)
+    except CampaignError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    start_campaign(summary["id"])
+    return summary
+
+
+@router.post("/campaigns/{campaign_id}/resume", status_code=202)
+async def resume_campaign(campaign_id: int, x_admin_token: str | None = Header(default=None)):
+    _require_admin(x_admin_token)
+    summary = await run_blocking(_summary, campaign_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    # A 'running' campaign whose runner died (stale claim) is taken over here
+    if not await run_blocking(claim_campaign, campaign_id):
+        raise HTTPException(status_code=409, detail="Campaign is already running")
+    start_campaign(campaign_id, claimed=True)
+    return summary
+
+
+@router.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: int, x_admin_token: str | None = Header(default=None)):
+    _require_admin(x_admin_token)
+    summary = await run_blocking(_summary, campaign_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return summary
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import JSONResponse
 import stripe
+from datetime import datetime
 from app.core.settings import settings
+from app.core.executor import run_blocking
+from app.core.metrics import WEBHOOK_SECONDS
+from app.core.idempotency import ReplayInProgress, run_once
 from app.core.redis import get_session, clear_session
-from app.core.db import SessionLocal, User, Booking
+from app.core.session_lock import session_lock
+from app.core.db import SessionLocal, User, Booking, from_utc_naive
 from app.services.emailer import send_confirmation
 
 router = APIRouter()
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
 
 
 @router.post("/webhook")
@@ -21,23 +28,42 @@ async def stripe_webhook(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    if event['type'] == 'checkout.session.completed':
-        session_obj = event['data']['object']
-        meta = session_obj.get('metadata', {})
-        from_number = meta.get('from')
-        db = SessionLocal()
+    # Stripe retries an event until it gets a 2xx, so the same event id can arrive more than once
+    with WEBHOOK_SECONDS.time("stripe"):
         try:
-            if from_number:
+            return await run_blocking(run_once, f"stripe:{event['id']}", lambda: _handle_event(event))
+        except ReplayInProgress:
+            raise HTTPException(status_code=409, detail="Event is still being processed")
+
+
+def _handle_event(event) -> JSONResponse:
+    if event['type'] == 'checkout.session.completed':
+        _handle_checkout_completed(event['data']['object'])
+    return JSONResponse({"received": True})
+
+
+def _handle_checkout_completed(session_obj):
+    meta = session_obj.get('metadata', {})
+    from_number = meta.get('from')
+    db = SessionLocal()
+    try:
+        if from_number:
+            # Payment lands mid-conversation; don't interleave with the user's own messages
+            with session_lock(from_number):
                 session = get_session(from_number)
                 user = db.query(User).filter(User.whatsapp_number == from_number).first()
                 if user and session:
+                    dt_iso = session.get('travel_dt_iso')
+                    tz_name = session.get('timezone') or settings.DEFAULT_TIMEZONE
                     # Create booking record
                     booking = Booking(
                         user_id=user.id,
                         source_iata=session.get('source_iata'),
                         dest_iata=session.get('dest_iata'),
-                        depart_at=session.get('travel_dt_iso'),
-                        flight_meta={"selected": session.get('selected_flight_id')},
+                        depart_at=datetime.fromisoformat(dt_iso.replace('Z', '+00:00')) if dt_iso else None,
+                        flight_id=session.get('selected_flight_id'),
+                        flight_meta={"selected": session.get('selected_flight_id'), "depart_at_iso": dt_iso,
+                                     "timezone": tz_name},
                         price=session.get('presented_flights', [{}])[0].get('price', 0),
                         currency='INR',
                         payment_status='paid',
@@ -47,13 +73,13 @@ async def stripe_webhook(request: Request):
                     db.commit()
                     # Send email if available
                     if user.email:
-                        html = f"<p>Your flight {booking.source_iata} -> {booking.dest_iata} on {booking.depart_at} is confirmed.</p>"
+                        depart = from_utc_naive(booking.depart_at, tz_name).strftime("%Y-%m-%d %I:%M %p %Z") if booking.depart_at else "-"
+                        html = f"<p>Your flight {booking.source_iata} -> {booking.dest_iata} on {depart} is confirmed.</p>"
                         try:
                             send_confirmation(user.email, "Flight Booking Confirmed", html)
                         except Exception:
                             pass
                     clear_session(from_number)
-        finally:
-            db.close()
+    finally:
+        db.close()
 
-    return {"received": True}
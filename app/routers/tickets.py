@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.core.db import SessionLocal, Booking
+from app.core.executor import run_blocking
+from app.services.bookings import normalize_pnr
+from app.services.ticket_store import TicketBlob, load_ticket
+
+router = APIRouter()
+
+# Stable ticket URLs (/tickets/{id}.pdf) can be re-rendered in place, so clients
+# revalidate them (cheap: 304 on a matching ETag). Content-addressed URLs
+# (/tickets/{id}/{sha256}.pdf) never change and are cached forever.
+_REVALIDATE = "public, max-age=0, must-revalidate"
+_IMMUTABLE = "public, max-age=31536000, immutable"
+_PNR_CACHE_SIZE = 10_000
+
+# PNR -> ticket_id never changes once issued, so resolved PNRs skip the database
+_pnr_tickets: OrderedDict[str, str] = OrderedDict()
+_pnr_lock = threading.Lock()
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match specifies
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _byte_range(header: str, size: int) -> tuple[int, int] | None | bool:
+    """(start, end) inclusive for a single 'bytes=' range; None to ignore the header; False if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # multipart ranges aren't worth it for tickets; send the whole file
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            length = int(last)
+            if length == 0:
+                return False
+            start, end = max(size - length, 0), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start >= size or end < start:
+        return False
+    return start, end
+
+
+def ticket_response(request: Request, blob: TicketBlob, cache_control: str, filename: str | None = None) -> Response:
+    etag = f'"{blob.digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Last-Modified": formatdate(blob.mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    size = len(blob.data)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        rng = _byte_range(range_header, size)
+        if rng is False:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if rng is not None:
+            start, end = rng
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(blob.data[start:end + 1], status_code=206, media_type="application/pdf", headers=headers)
+    return Response(blob.data, media_type="application/pdf", headers=headers)
+
+
+async def _load(ticket_id: str) -> TicketBlob:
+    blob = await run_blocking(load_ticket, ticket_id.lower())
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return blob
+
+
+def _ticket_id_for_pnr(pnr: str) -> str | None:
+    code = normalize_pnr(pnr)
+    with _pnr_lock:
+        ticket_id = _pnr_tickets.get(code)
+        if ticket_id is not None:
+            _pnr_tickets.move_to_end(code)
+            return ticket_id
+    db = SessionLocal()
+    try:
+        row = db.query(Booking.ticket_id).filter(Booking.pnr == code).one_or_none()
+    finally:
+        db.close()
+    ticket_id = row.ticket_id if row else None
+    if ticket_id:
+        with _pnr_lock:
+            _pnr_tickets[code] = ticket_id
+            if len(_pnr_tickets) > _PNR_CACHE_SIZE:
+                _pnr_tickets.popitem(last=False)
+    return ticket_id
+
+
+@router.api_route("/tickets/by-pnr/{pnr}.pdf", methods=["GET", "HEAD"])
+async def get_ticket_pdf_by_pnr(pnr: str, request: Request):
+    ticket_id = await run_blocking(_ticket_id_for_pnr, pnr)
+    if not ticket_id:
+        raise HTTPException(status_code=404, detail="PNR not found")
+    blob = await _load(ticket_id)
+    return ticket_response(request, blob, _REVALIDATE, filename=f"{normalize_pnr(pnr)}.pdf")
+
+
+@router.api_route("/tickets/{ticket_id}.pdf", methods=["GET", "HEAD"])
+async def get_ticket_pdf(ticket_id: str, request: Request):
+    blob = await _load(ticket_id)
+    return ticket_response(request, blob, _REVALIDATE)
+
+
+@router.api_route("/tickets/{ticket_id}/{digest}.pdf", methods=["GET", "HEAD"])
+async def get_ticket_pdf_version(ticket_id: str, digest: str, request: Request):
+    blob = await _load(ticket_id)
+    if blob.digest != digest.lower():
+        # Superseded version: the ticket has been re-rendered since
+        raise HTTPException(status_code=404, detail="Ticket version not found")
+    return ticket_response(request, blob, _IMMUTABLE)
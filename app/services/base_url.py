@@ -1,16 +1,21 @@
 import os
-import json
+import threading
+import time
 
 # Tries to deduce a public base URL for media links.
 # 1) BASE_URL env if set (e.g., your ngrok URL)
 # 2) ngrok local API if available
 # 3) fallback to http://127.0.0.1:8000
+#
+# The ngrok probe is a blocking HTTP call, so its result is cached for
+# _PROBE_TTL_SECONDS instead of being repeated on every ticket.
 
-def get_public_base_url() -> str:
-    base = os.getenv("BASE_URL")
-    if base:
-        return base.rstrip("/")
-    # Try ngrok API
+_PROBE_TTL_SECONDS = 60
+_probe_cache: tuple[str, float] | None = None
+_probe_lock = threading.Lock()
+
+
+def _probe_ngrok() -> str:
     try:
         import requests
         resp = requests.get("http://127.0.0.1:4040/api/tunnels", timeout=1)
@@ -22,3 +27,16 @@ def get_public_base_url() -> str:
     except Exception:
         pass
     return "http://127.0.0.1:8000"
+
+
+def get_public_base_url() -> str:
+    global _probe_cache
+    base = os.getenv("BASE_URL")
+    if base:
+        return base.rstrip("/")
+    with _probe_lock:
+        if _probe_cache and _probe_cache[1] > time.monotonic():
+            return _probe_cache[0]
+        url = _probe_ngrok()
+        _probe_cache = (url, time.monotonic() + _PROBE_TTL_SECONDS)
+        return url
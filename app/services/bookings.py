@@ -0,0 +1,189 @@
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app.core.db import SessionLocal, Booking, DataMigration, to_utc_naive
+from app.core.settings import settings
+
+
+def normalize_pnr(pnr: str | None) -> str:
+    return (pnr or "").strip().upper()
+
+
+def normalize_ticket_id(ticket_id: str | None) -> str:
+    return (ticket_id or "").strip().lower()
+
+
+def find_booking_by_pnr(db, pnr: str) -> Optional[Booking]:
+    """Single index probe on the unique, upper-cased Booking.pnr column."""
+    code = normalize_pnr(pnr)
+    if not code:
+        return None
+    return db.query(Booking).filter(Booking.pnr == code).one_or_none()
+
+
+def find_booking_by_ticket_id(db, ticket_id: str) -> Optional[Booking]:
+    tid = normalize_ticket_id(ticket_id)
+    if not tid:
+        return None
+    return db.query(Booking).filter(Booking.ticket_id == tid).one_or_none()
+
+
+def backfill_booking_refs(db, batch_size: int = 500) -> int:
+    """
+    Copy pnr/ticket_id out of flight_meta into the indexed columns for rows
+    created before those columns existed. Walks the table by primary key in
+    batches so memory stays flat, with one query per batch to find which of
+    the batch's codes are already taken; those rows are left untouched.
+    Returns the number of rows updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Booking.id, Booking.ticket_id, Booking.flight_meta)
+            .filter(Booking.id > last_id, Booking.pnr.is_(None))
+            .order_by(Booking.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        wanted = {}
+        for r in rows:
+            meta = r.flight_meta or {}
+            ticket_id = "" if r.ticket_id else normalize_ticket_id(meta.get("ticket_id"))
+            wanted[r.id] = (normalize_pnr(meta.get("pnr")), ticket_id)
+        pnrs = {p for p, _ in wanted.values() if p}
+        ticket_ids = {t for _, t in wanted.values() if t}
+        taken_pnrs, taken_tickets = set(), set()
+        if pnrs or ticket_ids:
+            for pnr, ticket_id in db.query(Booking.pnr, Booking.ticket_id).filter(
+                    or_(Booking.pnr.in_(pnrs), Booking.ticket_id.in_(ticket_ids))):
+                taken_pnrs.add(pnr)
+                taken_tickets.add(ticket_id)
+        values = []
+        for booking_id, (pnr, ticket_id) in wanted.items():
+            # The sets also catch duplicates between rows of this batch
+            change = {}
+            if pnr and pnr not in taken_pnrs:
+                change["pnr"] = pnr
+                taken_pnrs.add(pnr)
+            if ticket_id and ticket_id not in taken_tickets:
+                change["ticket_id"] = ticket_id
+                taken_tickets.add(ticket_id)
+            if change:
+                values.append({"id": booking_id, **change})
+        if values:
+            db.bulk_update_mappings(Booking, values)
+            updated += sum(1 for v in values if "pnr" in v)
+        db.commit()
+    return updated
+
+
+def backfill_flight_ids(db, batch_size: int = 500) -> int:
+    """Copy the selected flight id out of flight_meta into Booking.flight_id, walking the table by primary key."""
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Booking.id, Booking.flight_meta)
+            .filter(Booking.id > last_id, Booking.flight_id.is_(None))
+            .order_by(Booking.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        values = [{"id": r.id, "flight_id": (r.flight_meta or {}).get("selected")} for r in rows]
+        values = [v for v in values if v["flight_id"]]
+        if values:
+            db.bulk_update_mappings(Booking, values)
+            updated += len(values)
+        db.commit()
+    return updated
+
+
+def backfill_depart_at_utc(db, batch_size: int = 500) -> int:
+    """
+    Rewrite Booking.depart_at as naive UTC from flight_meta's depart_at_iso
+    (older rows kept the local wall time on SQLite). Rows without it are left
+    as they are; walks the table by primary key.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Booking.id, Booking.depart_at, Booking.flight_meta)
+            .filter(Booking.id > last_id)
+            .order_by(Booking.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        values = []
+        for r in rows:
+            meta = r.flight_meta or {}
+            try:
+                depart = datetime.fromisoformat(meta["depart_at_iso"].replace("Z", "+00:00"))
+            except (KeyError, AttributeError, ValueError):
+                continue
+            depart = to_utc_naive(depart, meta.get("timezone") or settings.DEFAULT_TIMEZONE)
+            if depart != r.depart_at:
+                values.append({"id": r.id, "depart_at": depart})
+        if values:
+            db.bulk_update_mappings(Booking, values)
+            updated += len(values)
+        db.commit()
+    return updated
+
+
+# New bookings fill these columns when they are created, so each backfill only
+# has to run once per database. Rows it cannot fill (no PNR or flight id in
+# flight_meta) would otherwise be rescanned on every startup.
+_BACKFILLS = (
+    ("backfill_booking_refs", backfill_booking_refs),
+    ("backfill_flight_ids", backfill_flight_ids),
+    ("backfill_depart_at_utc", backfill_depart_at_utc),
+)
+
+
+def run_pending_backfills(db) -> dict[str, int]:
+    """Run the backfills not yet recorded in data_migrations; returns rows updated per backfill."""
+    done = {name for (name,) in db.query(DataMigration.name)}
+    results = {}
+    for name, backfill in _BACKFILLS:
+        if name in done:
+            continue
+        results[name] = backfill(db)
+        db.add(DataMigration(name=name))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker finished the same backfill first
+            db.rollback()
+    return results
+
+
+if __name__ == "__main__":
+    # python -m app.services.bookings backfill  (runs them all again, even if already recorded)
+    if sys.argv[1:] != ["backfill"]:
+        print("usage: python -m app.services.bookings backfill")
+        sys.exit(2)
+    from app.core.db import init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        print(f"backfilled {backfill_booking_refs(session)} bookings")
+        print(f"backfilled flight ids on {backfill_flight_ids(session)} bookings")
+        print(f"converted depart_at to UTC on {backfill_depart_at_utc(session)} bookings")
+    finally:
+        session.close()
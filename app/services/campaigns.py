@@ -0,0 +1,300 @@
+import argparse
+import string
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pytz
+from sqlalchemy import or_, update
+
+from app.core.db import SessionLocal, Booking, Campaign, CampaignRecipient, User, from_utc_naive, to_utc_naive
+from app.core.settings import settings
+from app.services.whatsapp_sender import queue_whatsapp_text
+
+_BATCH = 500
+_LEASE = timedelta(minutes=5)  # a 'running' campaign whose claim is older than this can be taken over
+
+# Per-booking fields a template can use, besides the campaign's own variables
+BOOKING_FIELDS = ("name", "pnr", "flight", "source", "dest", "depart", "gate", "seats")
+_formatter = string.Formatter()
+
+
+class CampaignError(ValueError):
+    pass
+
+
+def template_fields(template: str) -> set[str]:
+    fields = set()
+    try:
+        for _, field, _, _ in _formatter.parse(template):
+            if field is not None:
+                fields.add(field)
+    except ValueError as e:
+        raise CampaignError(f"invalid template: {e}")
+    return fields
+
+
+def validate_template(template: str, variables: dict) -> None:
+    """Only plain {field} names are allowed, each a booking field or a campaign variable."""
+    for field in template_fields(template):
+        if not field.isidentifier():
+            raise CampaignError(f"invalid template field {{{field}}}")
+        if field not in BOOKING_FIELDS and field not in variables:
+            raise CampaignError(f"unknown template field {{{field}}}")
+
+
+def render_message(template: str, variables: dict, booking: dict) -> str:
+    return template.format_map({**variables, **booking})
+
+
+def _booking_fields(row) -> dict:
+    meta = row.flight_meta or {}
+    passengers = meta.get("passengers") or []
+    depart = meta.get("depart_at_local")
+    if not depart and row.depart_at:
+        local = from_utc_naive(row.depart_at, meta.get("timezone") or settings.DEFAULT_TIMEZONE)
+        depart = local.strftime("%Y-%m-%d %I:%M %p %Z")
+    return {
+        "name": (passengers[0].get("name") if passengers else None) or "Traveller",
+        "pnr": row.pnr or meta.get("pnr") or "",
+        "flight": row.flight_id,
+        "source": row.source_iata,
+        "dest": row.dest_iata,
+        "depart": depart,
+        "gate": meta.get("gate") or "",
+        "seats": ", ".join(meta.get("seats") or []),
+    }
+
+
+def create_campaign(db, name: str, flight_id: str, depart_date: date, template: str,
+                    variables: dict | None = None, timezone: str | None = None) -> Campaign:
+    """depart_date is a calendar day in timezone (the departure airport's; default DEFAULT_TIMEZONE)."""
+    variables = {k: str(v) for k, v in (variables or {}).items()}
+    validate_template(template, variables)
+    if timezone and timezone not in pytz.all_timezones_set:
+        raise CampaignError(f"unknown timezone {timezone!r}")
+    campaign = Campaign(name=name, flight_id=flight_id.replace(" ", "").upper(), depart_date=depart_date,
+                        template=template, variables=variables, timezone=timezone)
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+
+def departure_window(campaign: Campaign) -> tuple[datetime, datetime]:
+    """The campaign's local departure day as a [start, end) range of stored (naive UTC) depart_at values."""
+    tz_name = campaign.timezone or settings.DEFAULT_TIMEZONE
+    start = datetime.combine(campaign.depart_date, time.min)
+    return to_utc_naive(start, tz_name), to_utc_naive(start + timedelta(days=1), tz_name)
+
+
+def recipients_page(db, campaign: Campaign, batch_size: int):
+    """Next keyset page of the campaign's bookings (over the flight_id/depart_at index), template columns only."""
+    start, end = departure_window(campaign)
+    return (
+        db.query(Booking.id, Booking.pnr, Booking.flight_id, Booking.source_iata, Booking.dest_iata,
+                 Booking.depart_at, Booking.flight_meta, User.whatsapp_number)
+        .join(User, User.id == Booking.user_id)
+        .filter(
+            Booking.flight_id == campaign.flight_id,
+            Booking.depart_at >= start,
+            Booking.depart_at < end,
+            Booking.id > campaign.last_booking_id,
+        )
+        .order_by(Booking.id)
+        .limit(batch_size)
+    )
+
+
+def _send_batch(db, campaign: Campaign, rows) -> tuple[int, int]:
+    """Record, queue and await one page of recipients; returns (sent, failed)."""
+    recorded = {bid: (rid, status) for bid, rid, status in db.query(
+        CampaignRecipient.booking_id, CampaignRecipient.id, CampaignRecipient.status,
+    ).filter(CampaignRecipient.campaign_id == campaign.id, CampaignRecipient.booking_id.in_([r.id for r in rows]))}
+    # Recipients go in as 'queued' before anything is sent, so a crash
+    # mid-batch leaves a record of who may already have been messaged.
+    # Only rows inserted by this pass are sent: one still 'queued' from an
+    # earlier run may have gone out just before it stopped, so it becomes
+    # 'unknown' instead of being sent twice.
+    stale = [rid for rid, status in recorded.values() if status == "queued"]
+    if stale:
+        db.query(CampaignRecipient).filter(CampaignRecipient.id.in_(stale)).update(
+            {"status": "unknown", "error": "interrupted before delivery was recorded",
+             "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    new = [r for r in rows if r.id not in recorded]
+    if new:
+        db.bulk_insert_mappings(CampaignRecipient, [
+            {"campaign_id": campaign.id, "booking_id": r.id, "phone": r.whatsapp_number, "status": "queued"}
+            for r in new
+        ])
+    db.commit()
+    ids = dict(db.query(CampaignRecipient.booking_id, CampaignRecipient.id).filter(
+        CampaignRecipient.campaign_id == campaign.id, CampaignRecipient.booking_id.in_([r.id for r in new])))
+
+    futures = []
+    for r in new:
+        body = render_message(campaign.template, campaign.variables or {}, _booking_fields(r))
+        futures.append((r, queue_whatsapp_text(r.whatsapp_number, body)))
+    updates = []
+    sent = failed = 0
+    for r, fut in futures:
+        try:
+            resp = fut.result()
+            updates.append({"id": ids[r.id], "status": "sent", "message_sid": (resp or {}).get("sid"),
+                            "error": None, "updated_at": datetime.utcnow()})
+            sent += 1
+        except Exception as e:
+            updates.append({"id": ids[r.id], "status": "failed", "error": str(e)[:500],
+                            "updated_at": datetime.utcnow()})
+            failed += 1
+    db.bulk_update_mappings(CampaignRecipient, updates)
+    return sent, failed
+
+
+def claim_campaign(campaign_id: int) -> bool:
+    """
+    Mark the campaign 'running' for this runner. The conditional UPDATE is the
+    claim, so of two concurrent resumes only one wins; a 'running' campaign
+    whose runner stopped renewing its claim (crashed) can be taken over.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        res = db.execute(
+            update(Campaign)
+            .where(Campaign.id == campaign_id,
+                   or_(Campaign.status != "running", Campaign.claimed_at.is_(None), Campaign.claimed_at < now - _LEASE))
+            .values(status="running", claimed_at=now, finished_at=None)
+        )
+        db.commit()
+        return res.rowcount == 1
+    finally:
+        db.close()
+
+
+def run_campaign(campaign_id: int, batch_size: int = _BATCH, progress=None, claimed: bool = False) -> Campaign:
+    """
+    Send a campaign to every booking on its flight and day. Bookings are read
+    in primary-key pages of batch_size, so memory stays flat however many
+    passengers there are. Each page is queued on the outbound sender at once
+    (rate limiting and retries happen there), and its statuses, the counters,
+    the cursor and a renewed claim are committed together. Running a campaign
+    again resumes after the last committed page; delivery is at most once, so
+    recipients of the interrupted page whose outcome was not recorded end up
+    'unknown'. Raises CampaignError if another runner holds the campaign
+    (see claim_campaign; pass claimed=True if the caller already claimed it).
+    """
+    db = SessionLocal()
+    try:
+        campaign = db.get(Campaign, campaign_id)
+        if campaign is None:
+            raise CampaignError(f"campaign {campaign_id} not found")
+        if not claimed and not claim_campaign(campaign_id):
+            raise CampaignError(f"campaign {campaign_id} is already running")
+        db.refresh(campaign)
+        try:
+            while True:
+                rows = recipients_page(db, campaign, batch_size).all()
+                if not rows:
+                    break
+                sent, failed = _send_batch(db, campaign, rows)
+                campaign.sent += sent
+                campaign.failed += failed
+                campaign.last_booking_id = rows[-1].id
+                campaign.claimed_at = datetime.utcnow()
+                db.commit()
+                if progress:
+                    progress(campaign)
+            campaign.status = "done"
+        except Exception as e:
+            db.rollback()
+            campaign.status = "failed"
+            campaign.last_error = repr(e)[:500]
+            raise
+        finally:
+            campaign.finished_at = datetime.utcnow()
+            db.commit()
+            db.refresh(campaign)
+            db.expunge(campaign)
+        return campaign
+    finally:
+        db.close()
+
+
+def start_campaign(campaign_id: int, claimed: bool = False) -> threading.Thread:
+    """Run a campaign on a background thread (the API returns before it finishes)."""
+    def _run():
+        try:
+            run_campaign(campaign_id, claimed=claimed)
+        except Exception:
+            pass  # recorded on the campaign row
+    thread = threading.Thread(target=_run, name=f"campaign-{campaign_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def campaign_summary(campaign: Campaign) -> dict:
+    return {
+        "id": campaign.id,
+        "name": campaign.name,
+        "flight_id": campaign.flight_id,
+        "depart_date": campaign.depart_date.isoformat(),
+        "timezone": campaign.timezone or settings.DEFAULT_TIMEZONE,
+        "status": campaign.status,
+        "sent": campaign.sent,
+        "failed": campaign.failed,
+        "last_error": campaign.last_error,
+        "created_at": campaign.created_at,
+        "finished_at": campaign.finished_at,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Notify every passenger on a flight departure over WhatsApp.")
+    ap.add_argument("--flight", help="flight id, e.g. AI101")
+    ap.add_argument("--date", help="departure date (YYYY-MM-DD)")
+    ap.add_argument("--timezone", help="timezone --date is in (default: DEFAULT_TIMEZONE)")
+    ap.add_argument("--template", help="message text with {name} {pnr} {flight} {source} {dest} {depart} {gate} {seats} "
+                                       "and any --var fields")
+    ap.add_argument("--var", action="append", default=[], metavar="KEY=VALUE", help="extra template field")
+    ap.add_argument("--name", help="campaign name (default: flight and date)")
+    ap.add_argument("--resume", type=int, metavar="CAMPAIGN_ID", help="continue an interrupted campaign")
+    ap.add_argument("--batch", type=int, default=_BATCH)
+    args = ap.parse_args()
+
+    from app.core.db import init_db
+    from app.services.message_log import stop_message_log
+    from app.services.outbound import stop_outbound
+
+    init_db()
+    if args.resume:
+        campaign_id = args.resume
+    else:
+        if not (args.flight and args.date and args.template):
+            ap.error("--flight, --date and --template are required (or --resume)")
+        variables = dict(v.split("=", 1) for v in args.var)
+        db = SessionLocal()
+        try:
+            campaign = create_campaign(db, args.name or f"{args.flight} {args.date}", args.flight,
+                                       date.fromisoformat(args.date), args.template, variables, args.timezone)
+            campaign_id = campaign.id
+        except CampaignError as e:
+            ap.error(str(e))
+        finally:
+            db.close()
+
+    def progress(c):
+        print(f"campaign {c.id}: sent={c.sent} failed={c.failed} through booking {c.last_booking_id}")
+
+    try:
+        campaign = run_campaign(campaign_id, args.batch, progress)
+    finally:
+        stop_outbound()
+        stop_message_log()
+    print(f"campaign {campaign.id} {campaign.status}: sent={campaign.sent} failed={campaign.failed}")
+
+
+if __name__ == "__main__":
+    # python -m app.services.campaigns --flight AI101 --date 2025-09-03 --var time=10:15 \
+    #   --template "Hi {name}, flight {flight} ({pnr}) now departs at {time}."
+    main()
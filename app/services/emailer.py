@@ -1,8 +1,9 @@
 import sendgrid
 from sendgrid.helpers.mail import Mail
+from app.core.metrics import EXTERNAL_CALL_ERRORS, EXTERNAL_CALL_SECONDS
 from app.core.settings import settings
 
-sg = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY)
+sg = sendgrid.SendGridAPIClient(api_key=settings.SENDGRID_API_KEY, host=settings.SENDGRID_API_BASE)
 
 def send_confirmation(to_email: str, subject: str, html_content: str):
     message = Mail(
@@ -11,5 +12,10 @@ def send_confirmation(to_email: str, subject: str, html_content: str):
         subject=subject,
         html_content=html_content,
     )
-    response = sg.send(message)
+    with EXTERNAL_CALL_SECONDS.time("sendgrid", "send"):
+        try:
+            response = sg.send(message)
+        except Exception:
+            EXTERNAL_CALL_ERRORS.inc("sendgrid", "send")
+            raise
     return response.status_code
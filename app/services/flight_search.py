@@ -1,5 +1,13 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from app.core.settings import settings
+from app.services.timetable import timetable_search
+
 
 def mock_search(source_iata: str, dest_iata: str, depart_at: datetime):
     base_time = depart_at.replace(minute=0, second=0, microsecond=0)
@@ -20,3 +28,239 @@ def mock_search(source_iata: str, dest_iata: str, depart_at: datetime):
             "currency": "INR",
         })
     return options
+
+
+class FlightProvider:
+    """An inventory source. search() may block; it runs on the fan-out pool with a per-provider timeout."""
+    name = "base"
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls) -> "FlightProvider":
+        return cls(settings.FLIGHT_PROVIDER_TIMEOUT)
+
+    def search(self, source_iata: str, dest_iata: str, depart_at: datetime) -> list[dict]:
+        raise NotImplementedError
+
+
+class MockProvider(FlightProvider):
+    name = "mock"
+
+    def search(self, source_iata, dest_iata, depart_at):
+        return mock_search(source_iata, dest_iata, depart_at)
+
+
+class FakeProvider(FlightProvider):
+    """
+    Deterministic synthetic inventory with configurable latency, for tests and
+    benchmarks. Options depend only on (route, departure hour), like a real feed.
+    """
+    name = "fake"
+
+    def __init__(self, timeout: float, latency: float = 0.0, options: int = 4):
+        super().__init__(timeout)
+        self.latency = latency
+        self.options = options
+
+    @classmethod
+    def from_settings(cls) -> "FakeProvider":
+        return cls(settings.FLIGHT_PROVIDER_TIMEOUT, latency=settings.FAKE_PROVIDER_LATENCY)
+
+    def search(self, source_iata, dest_iata, depart_at):
+        if self.latency:
+            time.sleep(self.latency)
+        base_time = depart_at.replace(minute=0, second=0, microsecond=0)
+        rnd = random.Random(f"{source_iata}{dest_iata}{base_time.isoformat()}")
+        airlines = [("AI", "Air India"), ("6E", "IndiGo"), ("UK", "Vistara"), ("QP", "Akasa Air"), ("SG", "SpiceJet")]
+        out = []
+        for i in range(self.options):
+            code, airline = airlines[rnd.randrange(len(airlines))]
+            number = rnd.randint(100, 999)
+            dep = base_time + timedelta(minutes=rnd.choice([0, 15, 30, 45]) + 60 * rnd.randint(0, 3))
+            duration = rnd.randint(70, 180)
+            out.append({
+                "id": f"{code}{number}",
+                "airline": airline,
+                "flight_no": f"{code} {number}",
+                "depart": dep.isoformat(),
+                "arrive": (dep + timedelta(minutes=duration)).isoformat(),
+                "duration_min": duration,
+                "price": rnd.randrange(3500, 9500, 50),
+                "currency": "INR",
+            })
+        return out
+
+
+class TimetableProvider(FlightProvider):
+    """Nearest scheduled departures from the in-process timetable (TIMETABLE_PATH)."""
+    name = "timetable"
+
+    def search(self, source_iata, dest_iata, depart_at):
+        return timetable_search(source_iata, dest_iata, depart_at)
+
+
+PROVIDERS: dict[str, type[FlightProvider]] = {
+    MockProvider.name: MockProvider,
+    FakeProvider.name: FakeProvider,
+    TimetableProvider.name: TimetableProvider,
+}
+
+
+def build_providers(names: str) -> list[FlightProvider]:
+    providers = []
+    for name in [n.strip() for n in names.split(",") if n.strip()]:
+        cls = PROVIDERS.get(name)
+        if cls is None:
+            raise ValueError(f"unknown flight provider '{name}'")
+        providers.append(cls.from_settings())
+    return providers
+
+
+def merge_results(result_sets: list[list[dict]], limit: int) -> list[dict]:
+    """Dedupe by (flight number, departure) keeping the cheapest fare, then rank by price and departure."""
+    best: dict[tuple[str, str], dict] = {}
+    for results in result_sets:
+        for f in results:
+            key = (f["flight_no"].replace(" ", "").upper(), f["depart"])
+            if key not in best or f["price"] < best[key]["price"]:
+                best[key] = f
+    ranked = sorted(best.values(), key=lambda f: (f["price"], f["depart"]))
+    return ranked[:limit]
+
+
+class SearchCache:
+    """
+    (source, dest, departure hour) -> results. Entries are fresh for ttl seconds,
+    then served stale for up to stale seconds more while one background refresh
+    runs (stale-while-revalidate). LRU-bounded. Entries past the stale window
+    are kept (only the LRU drops them) as a last resort for when every
+    provider fails.
+    """
+
+    def __init__(self, ttl: float, stale: float, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._items: OrderedDict[tuple, tuple[list[dict], float]] = OrderedDict()
+        self._refreshing: set[tuple] = set()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> tuple[list[dict] | None, bool]:
+        """Returns (results or None, needs_refresh)."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None, True
+            results, fetched = item
+            age = now - fetched
+            if age <= self.ttl:
+                self._items.move_to_end(key)
+                return results, False
+            if age <= self.ttl + self.stale:
+                self._items.move_to_end(key)
+                return results, True
+            return None, True
+
+    def last_known(self, key: tuple) -> list[dict] | None:
+        """Whatever is cached for key, however old."""
+        with self._lock:
+            item = self._items.get(key)
+            return item[0] if item is not None else None
+
+    def put(self, key: tuple, results: list[dict]):
+        with self._lock:
+            self._items[key] = (results, time.monotonic())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def claim_refresh(self, key: tuple) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def release_refresh(self, key: tuple):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class FlightSearch:
+    """Fans a query out to every provider concurrently, merges the answers and caches them."""
+
+    def __init__(self, providers: list[FlightProvider], cache: SearchCache, limit: int = 3, workers: int = 16,
+                 refresh_workers: int = 4):
+        self.providers = providers
+        self.cache = cache
+        self.limit = limit
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flight-search")
+        # Stale-while-revalidate refreshes get their own job and provider-call
+        # executors: they never queue provider calls ahead of a user's search,
+        # and a refresh job never waits on calls stuck behind other jobs.
+        self._refresh_jobs = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="flight-refresh")
+        self._refresh_calls = ThreadPoolExecutor(max_workers=refresh_workers * max(1, len(providers)),
+                                                 thread_name_prefix="flight-refresh-call")
+
+    def _fan_out(self, source_iata: str, dest_iata: str, depart_at: datetime, pool: ThreadPoolExecutor) -> list[dict]:
+        start = time.monotonic()
+        futures = [(p, pool.submit(p.search, source_iata, dest_iata, depart_at)) for p in self.providers]
+        result_sets = []
+        for provider, fut in futures:
+            # Every provider started at `start`; wait only until its own deadline
+            remaining = max(0.0, start + provider.timeout - time.monotonic())
+            try:
+                result_sets.append(fut.result(timeout=remaining))
+            except Exception:
+                fut.cancel()  # if it never started, don't let it hold a worker
+                continue  # timed out or failed; answer with the other providers
+        return merge_results(result_sets, self.limit)
+
+    def _refresh(self, key: tuple, source_iata: str, dest_iata: str, depart_at: datetime):
+        try:
+            results = self._fan_out(source_iata, dest_iata, depart_at, self._refresh_calls)
+            if results:  # on failure keep serving the stale entry
+                self.cache.put(key, results)
+        finally:
+            self.cache.release_refresh(key)
+
+    def search(self, source_iata: str, dest_iata: str, depart_at: datetime) -> list[dict]:
+        key = (source_iata, dest_iata, depart_at.replace(minute=0, second=0, microsecond=0).isoformat())
+        cached, needs_refresh = self.cache.get(key)
+        if cached is not None:
+            if needs_refresh and self.cache.claim_refresh(key):
+                self._refresh_jobs.submit(self._refresh, key, source_iata, dest_iata, depart_at)
+            return list(cached)
+        results = self._fan_out(source_iata, dest_iata, depart_at, self._pool)
+        if results:
+            self.cache.put(key, results)
+            return list(results)
+        # Never cache an all-providers-failed answer; fall back to an expired one if there is one
+        return list(self.cache.last_known(key) or [])
+
+
+_search: FlightSearch | None = None
+_search_lock = threading.Lock()
+
+
+def get_flight_search() -> FlightSearch:
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = FlightSearch(
+                build_providers(settings.FLIGHT_PROVIDERS),
+                SearchCache(settings.FLIGHT_CACHE_TTL_SECONDS, settings.FLIGHT_CACHE_STALE_SECONDS),
+            )
+        return _search
+
+
+def search_flights(source_iata: str, dest_iata: str, depart_at: datetime) -> list[dict]:
+    """Same call signature as mock_search, backed by the configured providers and cache."""
+    return get_flight_search().search(source_iata, dest_iata, depart_at)
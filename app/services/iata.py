@@ -1,22 +1,254 @@
-from rapidfuzz import process
+import csv
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple
 
-CITY_TO_IATA = {
-    "mumbai": "BOM",
-    "delhi": "DEL",
-    "bengaluru": "BLR",
-    "bangalore": "BLR",
-    "hyderabad": "HYD",
-    "goa": "GOI",
-}
+from rapidfuzz import fuzz, process
+
+from app.core.settings import settings
+
+BUNDLED_AIRPORTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "airports.csv")
+
+_TOP_K = 5
+_FUZZY_CUTOFF = 75
+_MIN_PREFIX = 3  # shortest prefix to_iata will resolve on its own
+# A misspelling (4+ characters) resolves when its best airport scores at least
+# _RESOLVE_CUTOFF and no other one does, or leads the runner-up by _RESOLVE_MARGIN
+_MIN_FUZZY = 4
+_RESOLVE_CUTOFF = 80
+_RESOLVE_MARGIN = 10
+# Words people put around a place name ("Delhi airport", "Goa, India",
+# "Mumbai city", "Delhi NCR") that would otherwise decide the match
+_FILLER = frozenset({"airport", "airports", "international", "intl", "city", "india", "ncr"})
+
+
+class Airport(NamedTuple):
+    iata: str
+    name: str
+    city: str
+    country: str
+    weight: int
+
+
+class Suggestion(NamedTuple):
+    airport: Airport
+    score: float  # 100 exact, 90 prefix, rapidfuzz ratio for fuzzy matches
+    match: str  # "exact" / "prefix" / "fuzzy"
+
+
+def normalize(text: str) -> str:
+    """Case-folded, punctuation-free, single-spaced form used as every index key."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"[\W_]+", " ", text).strip()
+    return text
+
+
+def strip_filler(key: str) -> str:
+    """A normalize()d query without filler words; unchanged if nothing else is left."""
+    words = [w for w in key.split() if w not in _FILLER]
+    return " ".join(words) if words else key
+
+
+def _ascii_fold(key: str) -> str | None:
+    # "são paulo" -> "sao paulo", "zürich" -> "zurich"; only for Latin text so
+    # Indic vowel signs (also combining marks) are never stripped
+    stripped = "".join(c for c in unicodedata.normalize("NFKD", key) if not unicodedata.combining(c))
+    return stripped if stripped != key and stripped.isascii() else None
+
+
+def index_keys(text: str) -> set[str]:
+    key = normalize(text)
+    if not key:
+        return set()
+    folded = _ascii_fold(key)
+    return {key, folded} if folded else {key}
+
+
+def _trigrams(key: str) -> set[str]:
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AirportIndex:
+    """
+    Built once from an airport CSV (iata,name,city,country,weight,aliases with
+    aliases '|'-separated). Every code, city, airport name and alias becomes a
+    normalized key in three structures:
+      - exact: key -> airport ids, best first
+      - trie: nested dicts per character; each node keeps its top-k airport ids,
+        so a prefix lookup is one walk down the query with no subtree scan
+      - fuzzy: the names (not 3-letter codes) plus a trigram -> names map; a
+        query is only scored against names sharing a trigram with it and of a
+        length that can still reach the cutoff
+    """
+
+    def __init__(self, airports: list[Airport], keys: list[tuple[str, int]]):
+        self.airports = airports
+        self.exact: dict[str, list[int]] = {}
+        for key, i in keys:
+            ids = self.exact.setdefault(key, [])
+            if i not in ids:
+                ids.append(i)
+        for ids in self.exact.values():
+            ids.sort(key=self._rank)
+        self.trie: dict = {}
+        for key, ids in self.exact.items():
+            node = self.trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+                node.setdefault("", set()).update(ids)
+        self._freeze(self.trie)
+        self.fuzzy_keys = [k for k in self.exact if len(k) > 3]
+        self._grams: dict[str, list[int]] = {}
+        for n, k in enumerate(self.fuzzy_keys):
+            for g in _trigrams(k):
+                self._grams.setdefault(g, []).append(n)
+
+    def _rank(self, i: int):
+        a = self.airports[i]
+        return (-a.weight, a.iata)
+
+    def _freeze(self, root: dict):
+        # Replace each node's candidate set with its top-k ids, best first
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for ch, child in node.items():
+                if ch == "":
+                    continue
+                child[""] = tuple(sorted(child[""], key=self._rank)[:_TOP_K])
+                stack.append(child)
+
+    @classmethod
+    def load(cls, path: str) -> "AirportIndex":
+        airports: list[Airport] = []
+        keys: list[tuple[str, int]] = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                iata = (row.get("iata") or "").strip().upper()
+                if len(iata) != 3:
+                    continue
+                i = len(airports)
+                airports.append(Airport(iata, row.get("name") or "", row.get("city") or "",
+                                        row.get("country") or "", int(row.get("weight") or 0)))
+                names = [iata, row.get("city") or "", row.get("name") or ""]
+                names += (row.get("aliases") or "").split("|")
+                for name in names:
+                    keys.extend((k, i) for k in index_keys(name))
+        return cls(airports, keys)
+
+    def suggest(self, query: str, limit: int = _TOP_K) -> list[Suggestion]:
+        """Ranked matches: exact keys, then prefix matches; fuzzy matches only when neither found anything."""
+        key = normalize(query)
+        if not key:
+            return []
+        out: list[Suggestion] = []
+        seen: set[int] = set()
+
+        def add(i: int, score: float, match: str):
+            if i not in seen and len(out) < limit:
+                seen.add(i)
+                out.append(Suggestion(self.airports[i], score, match))
+
+        for k in index_keys(query):
+            for i in self.exact.get(k, ()):
+                add(i, 100.0, "exact")
+        if len(out) < limit and len(key) >= 2:
+            for i in self._prefixed(key):
+                add(i, 90.0, "prefix")
+        if not out and len(key) >= 3:
+            for k, score, _ in process.extract(key, self._fuzzy_candidates(key), scorer=fuzz.ratio, processor=None,
+                                               limit=limit * 2, score_cutoff=_FUZZY_CUTOFF):
+                for i in self.exact[k]:
+                    add(i, score, "fuzzy")
+        return out
+
+    def resolve(self, query: str) -> Airport | None:
+        """
+        The airport a query names without doubt: an exact code, city, name or
+        alias (as typed or without filler words), else a prefix of at least
+        _MIN_PREFIX characters that only one airport has, else a misspelling
+        with one clear fuzzy winner ("Dehli", "Hydrabad"). None otherwise, so
+        the caller can offer suggest() results instead of guessing.
+        """
+        key = normalize(query)
+        if not key:
+            return None
+        stripped = strip_filler(key)
+        for k in (*index_keys(key), *index_keys(stripped)):
+            ids = self.exact.get(k)
+            if ids:
+                return self.airports[ids[0]]
+        if len(stripped) >= _MIN_PREFIX:
+            ids = self._prefixed(stripped)
+            if len(ids) == 1:
+                return self.airports[ids[0]]
+        if len(stripped) >= _MIN_FUZZY:
+            best: dict[int, float] = {}
+            for k, score, _ in process.extract(stripped, self._fuzzy_candidates(stripped), scorer=fuzz.ratio,
+                                               processor=None, limit=_TOP_K * 2, score_cutoff=_FUZZY_CUTOFF):
+                # A key resolves the way an exact hit on it would (e.g. "london" -> LHR)
+                i = self.exact[k][0]
+                best[i] = max(best.get(i, 0.0), score)
+            ranked = sorted(best.items(), key=lambda item: -item[1])
+            if ranked and ranked[0][1] >= _RESOLVE_CUTOFF:
+                if len(ranked) == 1 or ranked[1][1] < _RESOLVE_CUTOFF or ranked[0][1] - ranked[1][1] >= _RESOLVE_MARGIN:
+                    return self.airports[ranked[0][0]]
+        return None
+
+    def _prefixed(self, key: str) -> tuple[int, ...]:
+        """Top-k airport ids with a key starting with key (one trie walk)."""
+        node = self.trie
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                return ()
+        return node[""]
+
+    def _fuzzy_candidates(self, key: str) -> list[str]:
+        grams = _trigrams(key)
+        shared: set[int] = set()
+        for g in grams:
+            shared.update(self._grams.get(g, ()))
+        # ratio = 2*matches/(len_a+len_b) caps how different the lengths can be
+        lo = len(key) * _FUZZY_CUTOFF / (200 - _FUZZY_CUTOFF)
+        hi = len(key) * (200 - _FUZZY_CUTOFF) / _FUZZY_CUTOFF
+        return [self.fuzzy_keys[n] for n in shared if lo <= len(self.fuzzy_keys[n]) <= hi]
+
+
+_index: AirportIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_airport_index() -> AirportIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AirportIndex.load(settings.AIRPORTS_PATH or BUNDLED_AIRPORTS)
+        return _index
+
+
+@lru_cache(maxsize=8192)
+def _suggest_cached(key: str, limit: int) -> tuple[Suggestion, ...]:
+    return tuple(get_airport_index().suggest(key, limit))
+
+
+def suggest_airports(query: str, limit: int = _TOP_K) -> list[Suggestion]:
+    """Ranked airport suggestions for free text; recent queries are served from an LRU."""
+    return list(_suggest_cached(strip_filler(normalize(query)), limit))
+
+
+@lru_cache(maxsize=8192)
+def _resolve_cached(key: str) -> str | None:
+    airport = get_airport_index().resolve(key)
+    return airport.iata if airport else None
 
 
 def to_iata(city_name: str) -> str | None:
+    """IATA code for an exact city/airport name, code or alias, a unique 3+ letter prefix or a clear misspelling; None otherwise."""
     if not city_name:
         return None
-    name = city_name.strip().lower()
-    if name in CITY_TO_IATA:
-        return CITY_TO_IATA[name]
-    match = process.extractOne(name, CITY_TO_IATA.keys(), score_cutoff=70)
-    if match:
-        return CITY_TO_IATA[match[0]]
-    return None
+    return _resolve_cached(normalize(city_name))
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.db import User
+from app.core.settings import settings
+
+
+class Identity(NamedTuple):
+    user_id: int
+    email: str | None
+
+
+class IdentityCache:
+    """
+    phone -> Identity with a TTL and an LRU bound. user_id never changes once
+    created, so the TTL only bounds how stale the cached email can get when
+    another worker process updates it.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, tuple[Identity, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, phone: str) -> Identity | None:
+        with self._lock:
+            item = self._items.get(phone)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                del self._items[phone]
+                return None
+            self._items.move_to_end(phone)
+            return item[0]
+
+    def put(self, phone: str, identity: Identity):
+        with self._lock:
+            self._items[phone] = (identity, time.monotonic() + self.ttl)
+            self._items.move_to_end(phone)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, phone: str):
+        with self._lock:
+            self._items.pop(phone, None)
+
+
+_cache = IdentityCache(settings.IDENTITY_CACHE_TTL_SECONDS, settings.IDENTITY_CACHE_MAX_ENTRIES)
+
+
+def resolve_identity(phone: str, get_db: Callable) -> Identity:
+    """
+    Cached identity for a WhatsApp number; get_db() is only called on a miss
+    (and creates the user if new). If a concurrent first message created the
+    user in the meantime, the unique phone makes this INSERT fail and that
+    row is used instead.
+    """
+    identity = _cache.get(phone)
+    if identity is not None:
+        return identity
+    db = get_db()
+    row = db.query(User.id, User.email).filter(User.whatsapp_number == phone).first()
+    if row is None:
+        user = User(whatsapp_number=phone)
+        db.add(user)
+        try:
+            db.commit()
+            row = (user.id, user.email)
+        except IntegrityError:
+            db.rollback()
+            row = db.query(User.id, User.email).filter(User.whatsapp_number == phone).one()
+    identity = Identity(row[0], row[1])
+    _cache.put(phone, identity)
+    return identity
+
+
+def update_email(get_db: Callable, phone: str, identity: Identity, email: str) -> Identity:
+    """Persist a new email for the user; no-op (and no DB round trip) when unchanged."""
+    if not email or email == identity.email:
+        return identity
+    db = get_db()
+    db.query(User).filter(User.id == identity.user_id).update({"email": email})
+    db.commit()
+    identity = identity._replace(email=email)
+    _cache.put(phone, identity)
+    return identity
+
+
+def invalidate_identity(phone: str):
+    _cache.invalidate(phone)
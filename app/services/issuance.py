@@ -0,0 +1,267 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.db import SessionLocal, Booking, IssueJob, SeatAssignment
+from app.core.settings import settings
+from app.services.base_url import get_public_base_url
+from app.services.pnr import next_pnr
+from app.services.seat_inventory import SeatUnavailable, flight_key, hold_seats
+from app.services.ticket_pdf import assign_ticket_refs, generate_ticket_pdf
+from app.services.ticket_storage import get_ticket_storage
+from app.services.ticket_store import load_ticket, ticket_version_path
+from app.services.whatsapp_sender import send_whatsapp_text
+
+# Jobs stuck in 'running' longer than this (worker crashed mid-job) are requeued
+_LEASE = timedelta(minutes=5)
+_MAX_BACKOFF_SECONDS = 300
+_PNR_ATTEMPTS = 3
+
+_wake = threading.Event()
+
+
+def create_pending_booking(db, user_id: int, phone: str, session: dict, selected: dict, tz) -> Booking:
+    """
+    Persist a 'pending' Booking with its PNR, seats and gate already allocated,
+    plus its seat_assignments rows and the IssueJob that will render and deliver
+    the ticket. All are written in one transaction, so a confirmed booking is
+    never left without its job. Raises SeatUnavailable if another worker sold
+    one of the seats first.
+    """
+    base_url = get_public_base_url()
+    pax_list = session.get("passengers") or [{"name": session.get("passenger_name") or "WhatsApp User", "email": session.get("passenger_email")}]
+    chosen = session.get("assigned_seats")
+    if chosen and isinstance(chosen, list):
+        pax_list = [{**p, "seat": chosen[i]} if i < len(chosen) else p for i, p in enumerate(pax_list)]
+    if not all(p.get("seat") for p in pax_list):
+        # Seats only ever come from the seat inventory, so they can't collide with another hold
+        have = [p["seat"] for p in pax_list if p.get("seat")]
+        held = hold_seats(selected, phone, len(pax_list), have)
+        spare = iter(s for s in held if s not in {h.upper() for h in have})
+        pax_list = [p if p.get("seat") else {**p, "seat": next(spare)} for p in pax_list]
+    info = assign_ticket_refs({
+        "pnr": next_pnr(),
+        "name": session.get("passenger_name") or "WhatsApp User",
+        "phone": phone,
+        "source": session.get("source_iata"),
+        "dest": session.get("dest_iata"),
+        "depart_at": session.get("travel_dt_iso"),
+        "flight": selected,
+        "passengers": pax_list,
+    })
+
+    price_val = None
+    try:
+        price_val = Decimal(str(selected.get("price")))
+    except Exception:
+        pass
+    dt_obj = None
+    friendly = None
+    try:
+        dt_iso = session.get("travel_dt_iso")
+        dt_obj = datetime.fromisoformat(dt_iso.replace("Z", "+00:00")) if dt_iso else None
+        friendly = dt_obj.astimezone(tz).strftime("%Y-%m-%d %I:%M %p %Z") if dt_obj else None
+    except Exception:
+        pass
+
+    key = flight_key(selected)
+    seats = [p["seat"] for p in info["passengers"]]
+    for attempt in range(_PNR_ATTEMPTS):
+        booking = Booking(
+            user_id=user_id,
+            source_iata=session.get("source_iata"),
+            dest_iata=session.get("dest_iata"),
+            depart_at=dt_obj or session.get("travel_dt_iso"),
+            pnr=info["pnr"],
+            ticket_id=info["ticket_id"],
+            flight_id=selected.get("id"),
+            flight_meta={
+                "selected": selected.get("id"),
+                "pnr": info["pnr"],
+                "seats": seats,
+                "gate": info["gate"],
+                "ticket_id": info["ticket_id"],
+                "ticket_url": f"{base_url}/tickets/{info['ticket_id']}.pdf",
+                "passengers": info["passengers"],
+                "depart_at_iso": session.get("travel_dt_iso"),
+                "depart_at_local": friendly,
+                "timezone": tz.zone,
+                "base_url": base_url,
+                "ticket_info": info,
+            },
+            price=price_val,
+            currency="INR",
+            payment_status="pending",
+        )
+        try:
+            db.add(booking)
+            db.flush()
+            db.add_all([SeatAssignment(flight_key=key, seat=seat, booking_id=booking.id) for seat in seats])
+            db.add(IssueJob(booking_id=booking.id))
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            sold = {seat for (seat,) in db.query(SeatAssignment.seat).filter(
+                SeatAssignment.flight_key == key, SeatAssignment.seat.in_(seats))}
+            if sold:
+                raise SeatUnavailable(sorted(sold))
+            # PNR already taken (e.g. by an older randomly generated code): draw the next one
+            taken = db.query(Booking.id).filter(Booking.pnr == info["pnr"]).first()
+            if taken is None or attempt + 1 == _PNR_ATTEMPTS:
+                raise
+            info["pnr"] = next_pnr()
+    _wake.set()
+    return booking
+
+
+def issue_booking(db, booking: Booking) -> None:
+    """
+    Render the PDF, send it over WhatsApp and mark the booking issued. Each stage
+    is skipped when already done, so re-running a job after a crash or a failed
+    attempt never renders twice or re-sends a delivered ticket.
+    """
+    if booking.payment_status == "issued":
+        return
+    # JSON columns aren't mutation-tracked; always assign a fresh dict
+    meta = dict(booking.flight_meta or {})
+    info = meta.get("ticket_info") or {}
+    if not get_ticket_storage().exists(booking.ticket_id):
+        generate_ticket_pdf(info, base_url=meta.get("base_url"))
+    if not meta.get("delivered_at"):
+        seats_str = ", ".join(meta.get("seats") or [])
+        # Twilio fetches the media right away: give it the immutable, content-addressed
+        # URL (this also warms the download cache). The text keeps the stable link.
+        media_url = meta.get("ticket_url")
+        blob = load_ticket(booking.ticket_id)
+        if blob is not None and meta.get("base_url"):
+            media_url = meta["base_url"].rstrip("/") + ticket_version_path(booking.ticket_id, blob.digest)
+        send_whatsapp_text(
+            info.get("phone"),
+            f"Your flight ticket is ready. PNR: {booking.pnr} • Seats: {seats_str} • Gate: {meta.get('gate')}\nDownload: {meta.get('ticket_url')}",
+            media_url=media_url,
+            # The job is retried on failure; a dead letter as well would deliver the ticket twice
+            dead_letter=False,
+        )
+        meta["delivered_at"] = datetime.utcnow().isoformat()
+        booking.flight_meta = meta
+        db.commit()
+    booking.payment_status = "issued"
+    db.commit()
+
+
+class IssueWorker:
+    """In-process worker threads draining the persistent issue_jobs table."""
+
+    def __init__(self, workers: int, poll_seconds: float):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        self._requeue_stale()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"issue-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        _wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _requeue_stale(self):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(IssueJob)
+                .where(IssueJob.status == "running", IssueJob.updated_at < datetime.utcnow() - _LEASE)
+                .values(status="queued")
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self._claim()
+            except Exception:
+                job_id = None
+            if job_id is None:
+                _wake.wait(self.poll_seconds)
+                _wake.clear()
+                continue
+            self._process(job_id)
+
+    def _claim(self) -> int | None:
+        # Conditional UPDATE is the claim, so several workers/processes can share the table
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            candidates = (
+                db.query(IssueJob.id)
+                .filter(IssueJob.status == "queued", IssueJob.run_after <= now)
+                .order_by(IssueJob.run_after)
+                .limit(5)
+                .all()
+            )
+            for (job_id,) in candidates:
+                res = db.execute(
+                    update(IssueJob)
+                    .where(IssueJob.id == job_id, IssueJob.status == "queued")
+                    .values(status="running", attempts=IssueJob.attempts + 1, updated_at=now)
+                )
+                db.commit()
+                if res.rowcount == 1:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _process(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = db.get(IssueJob, job_id)
+            try:
+                booking = db.get(Booking, job.booking_id)
+                if booking is not None:
+                    issue_booking(db, booking)
+                job.status = "done"
+                job.last_error = None
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                job = db.get(IssueJob, job_id)
+                job.last_error = repr(e)[:500]
+                if job.attempts >= settings.ISSUE_MAX_ATTEMPTS:
+                    job.status = "failed"
+                else:
+                    job.status = "queued"
+                    job.run_after = datetime.utcnow() + timedelta(seconds=min(_MAX_BACKOFF_SECONDS, 2 ** job.attempts))
+                db.commit()
+        finally:
+            db.close()
+
+
+_worker: IssueWorker | None = None
+
+
+def start_issue_worker():
+    global _worker
+    if _worker is None and settings.ISSUE_WORKERS > 0:
+        _worker = IssueWorker(settings.ISSUE_WORKERS, settings.ISSUE_POLL_SECONDS)
+        _worker.start()
+
+
+def stop_issue_worker():
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
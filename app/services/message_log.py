@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app.core.db import SessionLocal, MessageLog, User
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+# Every inbound and outbound WhatsApp message goes to message_logs, but never
+# on the request path: record_message() only appends to an in-memory buffer,
+# and a writer thread bulk-inserts it when MESSAGE_LOG_BATCH_SIZE rows are
+# waiting or MESSAGE_LOG_FLUSH_SECONDS have passed. If the database falls
+# behind and the buffer reaches MESSAGE_LOG_MAX_BUFFER, rows are dropped
+# (oldest or newest, per MESSAGE_LOG_ON_FULL) and counted rather than making
+# webhooks wait.
+
+
+def _phone(address: str) -> str:
+    return address.split(":", 1)[1] if address.startswith("whatsapp:") else address
+
+
+class MessageLogWriter:
+    def __init__(self, batch_size: int, flush_seconds: float, max_buffer: int, on_full: str = "drop_oldest"):
+        if on_full not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"unknown MESSAGE_LOG_ON_FULL {on_full!r}")
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.on_full = on_full
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+        self._buffer: deque[dict] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stop: threading.Event | None = None
+        self._last_drop_warning = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name="message-log", daemon=True)
+            self._thread.start()
+
+    def record(self, direction: str, phone: str, body: str | None, meta: dict | None = None):
+        row = {"direction": direction, "phone": _phone(phone), "body": body, "meta": meta or {},
+               "created_at": datetime.utcnow()}
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer:
+                self.stats["dropped"] += 1
+                self._warn_dropped()
+                if self.on_full == "drop_newest":
+                    return
+                self._buffer.popleft()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def _warn_dropped(self):
+        now = time.monotonic()
+        if now - self._last_drop_warning >= 10:
+            self._last_drop_warning = now
+            log.warning("message log buffer full, dropping rows", extra={"dropped": self.stats["dropped"]})
+
+    def _run(self, stop: threading.Event):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_seconds
+                while len(self._buffer) < self.batch_size and not stop.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = stop.is_set()
+            while self._buffer:
+                self._flush()
+                if not stopping and len(self._buffer) < self.batch_size:
+                    break
+            if stopping:
+                return
+
+    def _take(self) -> list[dict]:
+        with self._cond:
+            n = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(n)]
+
+    def _flush(self):
+        rows = self._take()
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            # One lookup for the whole batch instead of one per message
+            phones = {row["phone"] for row in rows}
+            user_ids = dict(db.query(User.whatsapp_number, User.id).filter(User.whatsapp_number.in_(phones)))
+            db.bulk_insert_mappings(MessageLog, [
+                {"user_id": user_ids.get(row["phone"]), "direction": row["direction"], "body": row["body"],
+                 "meta": {"phone": row["phone"], **row["meta"]}, "created_at": row["created_at"]}
+                for row in rows
+            ])
+            db.commit()
+            self.stats["written"] += len(rows)
+        except Exception:
+            db.rollback()
+            self.stats["failed"] += len(rows)
+            log.exception("message log flush failed", extra={"rows": len(rows)})
+        finally:
+            db.close()
+            self.stats["flushes"] += 1
+
+    def stop(self, timeout: float = 10.0):
+        """Write out whatever is buffered, then stop the thread."""
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+            self._stop.set()
+            self._cond.notify_all()
+        thread.join(timeout)
+
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+
+_writer = MessageLogWriter(
+    batch_size=settings.MESSAGE_LOG_BATCH_SIZE,
+    flush_seconds=settings.MESSAGE_LOG_FLUSH_SECONDS,
+    max_buffer=settings.MESSAGE_LOG_MAX_BUFFER,
+    on_full=settings.MESSAGE_LOG_ON_FULL,
+)
+
+
+def record_message(direction: str, phone: str, body: str | None, **meta):
+    """Log one WhatsApp message ('in' or 'out'); never blocks on the database."""
+    if settings.MESSAGE_LOG_ENABLED:
+        _writer.record(direction, phone, body, {k: v for k, v in meta.items() if v is not None})
+
+
+def message_log_stats() -> dict:
+    return {**_writer.stats, "buffered": _writer.buffered()}
+
+
+def stop_message_log():
+    _writer.stop()
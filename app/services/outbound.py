@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import httpx
+
+from app.core.db import SessionLocal, OutboundDeadLetter
+from app.core.metrics import EXTERNAL_CALL_ERRORS, EXTERNAL_CALL_SECONDS
+from app.core.settings import settings
+from app.services.message_log import record_message, stop_message_log
+
+log = logging.getLogger(__name__)
+
+_MAX_BACKOFF_SECONDS = 60
+
+
+class OutboundError(Exception):
+    """A message could not be delivered (and was written to outbound_dead_letters, if it was queued with dead_letter)."""
+
+    def __init__(self, status: int | None, error: str):
+        self.status = status
+        super().__init__(f"twilio send failed ({status or 'no response'}): {error}")
+
+
+class OutboundMessage:
+    __slots__ = ("to", "from_", "body", "media_url", "future", "dead_letter", "dead_letter_id")
+
+    def __init__(self, to: str, from_: str, body: str, media_url: str | None, dead_letter: bool = True,
+                 dead_letter_id: int | None = None):
+        self.to = to
+        self.from_ = from_
+        self.body = body
+        self.media_url = media_url
+        self.future: Future = Future()
+        self.dead_letter = dead_letter
+        self.dead_letter_id = dead_letter_id
+
+
+class TokenBucket:
+    """rate tokens/second up to burst. Only touched from the sender's event loop, so no lock."""
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"outbound rate must be > 0 and burst >= 1 (got rate={rate}, burst={burst})")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        # Twilio said slow down: pause this sender for `seconds` by going into
+        # token debt. Not cumulative, so a burst of 429s pauses it only once.
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _backoff(attempt: int) -> float:
+    return min(_MAX_BACKOFF_SECONDS, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _dead_letter(msg: OutboundMessage, attempts: int, status: int | None, error: str):
+    db = SessionLocal()
+    try:
+        if msg.dead_letter_id is not None:
+            row = db.get(OutboundDeadLetter, msg.dead_letter_id)
+            if row is not None:
+                row.attempts += attempts
+                row.last_status = status
+                row.last_error = error
+                db.commit()
+                return
+        db.add(OutboundDeadLetter(
+            to_number=msg.to, from_number=msg.from_, body=msg.body, media_url=msg.media_url,
+            attempts=attempts, last_status=status, last_error=error,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+class OutboundSender:
+    """
+    Outbound WhatsApp queue. An asyncio loop on a background thread runs
+    `concurrency` workers that pull from a bounded queue and POST to the Twilio
+    Messages API over one keep-alive httpx.AsyncClient. Each From number has its
+    own token bucket. 429s and 5xx responses are retried with exponential
+    backoff, honouring Retry-After; a 429 also pauses that sender's bucket.
+    Messages that fail permanently or run out of attempts go to
+    outbound_dead_letters, unless enqueued with dead_letter=False by a caller
+    that retries on its own. enqueue() blocks while the queue is full
+    (backpressure) and returns a Future with Twilio's response.
+    """
+
+    def __init__(self, api_base: str, account_sid: str, auth_token: str, rate: float, burst: float,
+                 concurrency: int, max_attempts: int, queue_size: int, timeout: float,
+                 transport: httpx.AsyncBaseTransport | None = None):
+        TokenBucket(rate, burst)  # validate now rather than on the first send
+        self.api_base = api_base.rstrip("/")
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.transport = transport  # tests pass an httpx.MockTransport
+        self.stats = {"sent": 0, "retried": 0, "dead_lettered": 0}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._thread: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name="outbound-sender", daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            auth=(self.account_sid, self.auth_token),
+            timeout=self.timeout,
+            transport=self.transport,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._ready.set()
+        loop.run_forever()
+        loop.close()
+
+    def enqueue(self, to: str, body: str, media_url: str | None = None, from_: str | None = None,
+                dead_letter: bool = True, dead_letter_id: int | None = None) -> Future:
+        self.start()
+        msg = OutboundMessage(to, from_ or settings.TWILIO_WHATSAPP_NUMBER, body, media_url, dead_letter,
+                              dead_letter_id)
+        asyncio.run_coroutine_threadsafe(self._queue.put(msg), self._loop).result()
+        return msg.future
+
+    def stop(self, timeout: float = 10.0):
+        """Let queued messages drain (up to timeout), then stop the loop."""
+        with self._lock:
+            thread, loop = self._thread, self._loop
+            if thread is None:
+                return
+            self._thread = None
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(timeout), loop).result(timeout + 5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+
+    async def _shutdown(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._client.aclose()
+
+    def _bucket(self, from_: str) -> TokenBucket:
+        bucket = self._buckets.get(from_)
+        if bucket is None:
+            bucket = self._buckets[from_] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            msg = await self._queue.get()
+            try:
+                await self._deliver(msg)
+            except Exception as e:  # never let a worker die
+                if not msg.future.done():
+                    msg.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, msg: OutboundMessage):
+        url = f"{self.api_base}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        form = {"From": msg.from_, "To": msg.to, "Body": msg.body}
+        if msg.media_url:
+            form["MediaUrl"] = msg.media_url
+        bucket = self._bucket(msg.from_)
+        status, error = None, ""
+        attempt = 0
+        while attempt < self.max_attempts:
+            if msg.future.cancelled():
+                # The caller stopped waiting (send_whatsapp_text timed out) and counts it as failed
+                error = "withdrawn by the caller"
+                break
+            attempt += 1
+            await bucket.acquire()
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                resp = await self._client.post(url, data=form)
+            except httpx.HTTPError as e:
+                status, error = None, repr(e)
+                EXTERNAL_CALL_ERRORS.inc("twilio", "messages")
+            else:
+                if resp.status_code < 300:
+                    # Twilio accepted it; an unexpected body must not turn that into a failure
+                    self.stats["sent"] += 1
+                    try:
+                        result = resp.json()
+                    except ValueError:
+                        result = {}
+                    if not isinstance(result, dict):
+                        result = {}
+                    record_message("out", msg.to, msg.body, sid=result.get("sid"), media_url=msg.media_url)
+                    if not msg.future.cancelled():
+                        msg.future.set_result(result)
+                    return
+                status, error = resp.status_code, resp.text[:500]
+                EXTERNAL_CALL_ERRORS.inc("twilio", "messages")
+                if status != 429 and status < 500:
+                    break  # rejected (bad number, auth, ...); retrying will not help
+                retry_after = _retry_after(resp)
+                if status == 429:
+                    bucket.penalize(retry_after or 1.0)
+            finally:
+                EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - started, "twilio", "messages")
+            if attempt < self.max_attempts:
+                self.stats["retried"] += 1
+                await asyncio.sleep(retry_after if retry_after is not None else _backoff(attempt))
+        record_message("out", msg.to, msg.body, media_url=msg.media_url, failed=True, status=status)
+        if msg.dead_letter:
+            self.stats["dead_lettered"] += 1
+            log.warning("outbound message dead-lettered", extra={"to": msg.to, "status": status, "attempts": attempt})
+            await asyncio.to_thread(_dead_letter, msg, attempt, status, error)
+        else:
+            log.warning("outbound message failed", extra={"to": msg.to, "status": status, "attempts": attempt})
+        if not msg.future.cancelled():
+            msg.future.set_exception(OutboundError(status, error))
+
+
+_sender = OutboundSender(
+    settings.TWILIO_API_BASE,
+    settings.TWILIO_ACCOUNT_SID,
+    settings.TWILIO_AUTH_TOKEN,
+    rate=settings.OUTBOUND_RATE_PER_SECOND,
+    burst=settings.OUTBOUND_BURST,
+    concurrency=settings.OUTBOUND_CONCURRENCY,
+    max_attempts=settings.OUTBOUND_MAX_ATTEMPTS,
+    queue_size=settings.OUTBOUND_QUEUE_SIZE,
+    timeout=settings.OUTBOUND_TIMEOUT,
+)
+
+
+def queue_message(to: str, body: str, media_url: str | None = None, from_: str | None = None,
+                  dead_letter: bool = True) -> Future:
+    """
+    Queue a WhatsApp message (addresses with the 'whatsapp:' prefix); returns a
+    Future with Twilio's response. Pass dead_letter=False when the caller
+    retries the send itself, so a failure isn't also replayed from
+    outbound_dead_letters (which would deliver it twice).
+    """
+    return _sender.enqueue(to, body, media_url, from_, dead_letter=dead_letter)
+
+
+def outbound_stats() -> dict:
+    return {**_sender.stats, "queued": _sender._queue.qsize() if _sender._queue else 0}
+
+
+def stop_outbound():
+    _sender.stop()
+
+
+def replay_dead_letters(limit: int = 1000) -> tuple[int, int]:
+    """Re-send dead-lettered messages; rows are deleted once delivered. Returns (delivered, failed)."""
+    db = SessionLocal()
+    try:
+        rows = db.query(OutboundDeadLetter).order_by(OutboundDeadLetter.id).limit(limit).all()
+        db.expunge_all()
+    finally:
+        db.close()
+    futures = [(row.id, _sender.enqueue(row.to_number, row.body, row.media_url, row.from_number,
+                                          dead_letter_id=row.id))
+               for row in rows]
+    delivered = []
+    for row_id, fut in futures:
+        try:
+            fut.result()
+            delivered.append(row_id)
+        except Exception:
+            pass
+    if delivered:
+        db = SessionLocal()
+        try:
+            db.query(OutboundDeadLetter).filter(OutboundDeadLetter.id.in_(delivered)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+    return len(delivered), len(rows) - len(delivered)
+
+
+if __name__ == "__main__":
+    # python -m app.services.outbound replay
+    if sys.argv[1:] != ["replay"]:
+        print("usage: python -m app.services.outbound replay")
+        sys.exit(2)
+    from app.core.db import init_db
+
+    init_db()
+    ok, failed = replay_dead_letters()
+    stop_outbound()
+    stop_message_log()
+    print(f"replayed {ok} dead letters, {failed} still failing")
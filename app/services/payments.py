@@ -1,10 +1,21 @@
 import stripe
+from app.core.metrics import EXTERNAL_CALL_ERRORS, EXTERNAL_CALL_SECONDS
 from app.core.settings import settings
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
 
 
 def create_checkout_session(amount_inr: int, description: str, metadata: dict):
+    with EXTERNAL_CALL_SECONDS.time("stripe", "checkout_session"):
+        try:
+            return _create_checkout_session(amount_inr, description, metadata)
+        except Exception:
+            EXTERNAL_CALL_ERRORS.inc("stripe", "checkout_session")
+            raise
+
+
+def _create_checkout_session(amount_inr: int, description: str, metadata: dict):
     session = stripe.checkout.Session.create(
         payment_method_types=["card"],
         mode="payment",
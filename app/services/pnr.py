@@ -0,0 +1,125 @@
+import hashlib
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.db import SessionLocal, PnrCounter
+from app.core.settings import settings
+
+# PNRs are a counter pushed through a keyed permutation of [0, 31**6) and
+# written in the 31-letter alphabet below. The permutation is a bijection, so
+# distinct counter values always give distinct codes; consecutive bookings
+# still get unrelated-looking codes. Each process reserves a block of counter
+# values from the pnr_counters row at a time, so the database is hit once per
+# PNR_BLOCK_SIZE bookings. Booking.pnr stays unique in the database as the
+# backstop (e.g. against older random codes).
+ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"  # avoid 0/O/1/I
+LENGTH = 6
+SPACE = len(ALPHABET) ** LENGTH
+_HALF = len(ALPHABET) ** (LENGTH // 2)
+_ROUNDS = 4
+_COUNTER = "pnr"
+
+
+def _round_keys(secret: str) -> tuple[int, ...]:
+    digest = hashlib.blake2b(secret.encode(), digest_size=4 * _ROUNDS, person=b"pnr-perm").digest()
+    return tuple(int.from_bytes(digest[i:i + 4], "big") for i in range(0, len(digest), 4))
+
+
+def _mix(value: int, key: int) -> int:
+    x = (value * 0x9E3779B1 + key) & 0xFFFFFFFF
+    x ^= x >> 15
+    x = (x * 0x85EBCA6B) & 0xFFFFFFFF
+    x ^= x >> 13
+    return x % _HALF
+
+
+def permute(n: int, keys: tuple[int, ...]) -> int:
+    """Balanced Feistel network over base-31 halves: a bijection on [0, SPACE)."""
+    left, right = divmod(n, _HALF)
+    for k in keys:
+        left, right = right, (left + _mix(right, k)) % _HALF
+    return left * _HALF + right
+
+
+def unpermute(n: int, keys: tuple[int, ...]) -> int:
+    left, right = divmod(n, _HALF)
+    for k in reversed(keys):
+        left, right = (right - _mix(left, k)) % _HALF, left
+    return left * _HALF + right
+
+
+def encode(n: int) -> str:
+    chars = []
+    for _ in range(LENGTH):
+        n, d = divmod(n, len(ALPHABET))
+        chars.append(ALPHABET[d])
+    return "".join(reversed(chars))
+
+
+def decode(code: str) -> int:
+    n = 0
+    for ch in code.strip().upper():
+        n = n * len(ALPHABET) + ALPHABET.index(ch)
+    return n
+
+
+def reserve_block(size: int) -> int:
+    """Reserve [start, start + size) from the shared counter; returns start. Safe across processes."""
+    db = SessionLocal()
+    try:
+        while True:
+            current = db.query(PnrCounter.next_value).filter(PnrCounter.name == _COUNTER).scalar()
+            if current is None:
+                try:
+                    db.add(PnrCounter(name=_COUNTER, next_value=0))
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # another process created it first
+                continue
+            if current + size > SPACE:
+                raise RuntimeError("PNR space exhausted")
+            # Compare-and-set so concurrent reservations never overlap
+            res = db.execute(
+                update(PnrCounter)
+                .where(PnrCounter.name == _COUNTER, PnrCounter.next_value == current)
+                .values(next_value=current + size)
+            )
+            db.commit()
+            if res.rowcount == 1:
+                return current
+    finally:
+        db.close()
+
+
+class PnrAllocator:
+    """Hands out PNRs from a locally reserved block of counter values, reserving a new block when it runs out."""
+
+    def __init__(self, secret: str, block_size: int, reserve=reserve_block):
+        self.keys = _round_keys(secret)
+        self.block_size = block_size
+        self._reserve = reserve
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self._reserve(self.block_size)
+                self._end = self._next + self.block_size
+            n = self._next
+            self._next += 1
+        return encode(permute(n, self.keys))
+
+    def counter_of(self, code: str) -> int:
+        """Inverse of next(): the counter value a PNR was issued from."""
+        return unpermute(decode(code), self.keys)
+
+
+_allocator = PnrAllocator(settings.PNR_KEY, settings.PNR_BLOCK_SIZE)
+
+
+def next_pnr() -> str:
+    return _allocator.next()
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable
+
+from app.core.db import SessionLocal, SeatAssignment
+from app.core.settings import settings
+
+# Cabin layout offered in the seats step: rows 5-30, seats A-F, aisle between C and D.
+FIRST_ROW = 5
+LAST_ROW = 30
+COLUMNS = "ABCDEF"
+_AISLE_AFTER = 3
+CAPACITY = (LAST_ROW - FIRST_ROW + 1) * len(COLUMNS)
+
+
+class SeatUnavailable(Exception):
+    """Requested seats are held or confirmed by someone else (seats is empty when the flight is full)."""
+
+    def __init__(self, seats: list[str]):
+        self.seats = seats
+        super().__init__(f"seats unavailable: {' '.join(seats) or 'flight full'}")
+
+
+def flight_key(flight: dict) -> str:
+    """Identifies one departure of one flight, e.g. 'AI100@2030-01-15T09:30:00+05:30'."""
+    return f"{flight.get('id')}@{flight.get('depart')}"
+
+
+def seat_index(seat: str) -> int | None:
+    """Bit position of a seat label like '12C', or None if it is not on the seat map."""
+    seat = seat.strip().upper()
+    if len(seat) < 2 or seat[-1] not in COLUMNS or not seat[:-1].isdigit():
+        return None
+    row = int(seat[:-1])
+    if not FIRST_ROW <= row <= LAST_ROW:
+        return None
+    return (row - FIRST_ROW) * len(COLUMNS) + COLUMNS.index(seat[-1])
+
+
+def seat_label(index: int) -> str:
+    row, col = divmod(index, len(COLUMNS))
+    return f"{row + FIRST_ROW}{COLUMNS[col]}"
+
+
+def _bits(mask: int) -> list[int]:
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+@lru_cache(maxsize=None)
+def _windows(count: int) -> tuple[int, ...]:
+    """Masks of `count` side-by-side seats in preference order: same side of the aisle first, front rows first."""
+    width = len(COLUMNS)
+    same_side, across = [], []
+    for row in range(LAST_ROW - FIRST_ROW + 1):
+        for start in range(width - count + 1):
+            mask = ((1 << count) - 1) << (row * width + start)
+            if start + count <= _AISLE_AFTER or start >= _AISLE_AFTER:
+                same_side.append(mask)
+            else:
+                across.append(mask)
+    return tuple(same_side + across)
+
+
+class FlightSeatMap:
+    """Seat bitmaps for one departure: confirmed seats plus per-holder holds with an expiry."""
+
+    def __init__(self, confirmed: int = 0):
+        self.lock = threading.Lock()
+        self.confirmed = confirmed
+        self.holds: dict[str, tuple[int, float]] = {}
+
+    def taken_for(self, holder: str, now: float) -> int:
+        # Call with lock held; drops expired holds on the way
+        mask = self.confirmed
+        for h, (held, expires) in list(self.holds.items()):
+            if expires <= now:
+                del self.holds[h]
+            elif h != holder:
+                mask |= held
+        return mask
+
+
+def _auto_assign(taken: int, count: int, near: int = 0) -> int:
+    """Pick `count` free seats, side by side if possible; next to the `near` seats when given."""
+    if count <= 0:
+        return 0
+    if count <= len(COLUMNS):
+        width = len(COLUMNS)
+        row_mask = (1 << width) - 1
+        if near:
+            # Join a party member who picked their own seat: same row, touching their seat
+            for window in _windows(count):
+                if taken & window:
+                    continue
+                row = (window.bit_length() - 1) // width
+                if ((window << 1) | (window >> 1)) & near & (row_mask << (row * width)):
+                    return window
+        for window in _windows(count):
+            if not taken & window:
+                return window
+    # No block of adjacent seats left; take the first free ones front to back
+    free = ~taken & ((1 << CAPACITY) - 1)
+    picked = _bits(free)[:count]
+    if len(picked) < count:
+        raise SeatUnavailable([])
+    mask = 0
+    for i in picked:
+        mask |= 1 << i
+    return mask
+
+
+def _load_confirmed(key: str) -> list[str]:
+    db = SessionLocal()
+    try:
+        return [seat for (seat,) in db.query(SeatAssignment.seat).filter(SeatAssignment.flight_key == key).all()]
+    finally:
+        db.close()
+
+
+class SeatInventory:
+    """
+    In-process seat maps keyed by flight_key(). Each map is seeded once from the
+    seat_assignments table and then kept in memory. Holds are exclusive and
+    expire after hold_seconds; one holder (a WhatsApp session) holds seats on at
+    most one departure at a time. Every operation on a departure runs under that
+    map's lock, so holds never overlap within a process. Across processes the
+    unique (flight_key, seat) key in seat_assignments is the backstop.
+    """
+
+    def __init__(self, hold_seconds: float, max_flights: int = 10_000, loader: Callable[[str], list[str]] = _load_confirmed):
+        self.hold_seconds = hold_seconds
+        self.max_flights = max_flights
+        self._loader = loader
+        self._maps: OrderedDict[str, FlightSeatMap] = OrderedDict()
+        self._holders: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _map(self, key: str) -> FlightSeatMap:
+        with self._lock:
+            seat_map = self._maps.get(key)
+            if seat_map is not None:
+                self._maps.move_to_end(key)
+                return seat_map
+        # Seed outside the global lock; if two threads race, the first insert wins
+        confirmed = 0
+        for seat in self._loader(key):
+            i = seat_index(seat)
+            if i is not None:
+                confirmed |= 1 << i
+        with self._lock:
+            seat_map = self._maps.setdefault(key, FlightSeatMap(confirmed))
+            self._maps.move_to_end(key)
+            while len(self._maps) > self.max_flights:
+                self._maps.popitem(last=False)
+            return seat_map
+
+    def hold(self, key: str, holder: str, count: int, seats: list[str] | None = None) -> list[str]:
+        """
+        Hold `count` seats for holder: the requested seats first, the rest
+        auto-assigned side by side. Replaces any previous hold by the same holder.
+        Raises SeatUnavailable if a requested seat is taken or the flight is full.
+        """
+        previous = self._holders.get(holder)
+        if previous is not None and previous != key:
+            self.release(holder)
+        requested = list(dict.fromkeys(i for i in (seat_index(s) for s in seats or []) if i is not None))[:count]
+        wanted = 0
+        for i in requested:
+            wanted |= 1 << i
+        seat_map = self._map(key)
+        with seat_map.lock:
+            now = time.monotonic()
+            taken = seat_map.taken_for(holder, now)
+            conflict = wanted & taken
+            if conflict:
+                raise SeatUnavailable([seat_label(i) for i in _bits(conflict)])
+            auto = _auto_assign(taken | wanted, count - len(requested), near=wanted)
+            seat_map.holds[holder] = (wanted | auto, now + self.hold_seconds)
+        with self._lock:
+            self._holders[holder] = key
+        return [seat_label(i) for i in requested] + [seat_label(i) for i in _bits(auto)]
+
+    def release(self, holder: str):
+        with self._lock:
+            key = self._holders.pop(holder, None)
+            seat_map = self._maps.get(key) if key else None
+        if seat_map is not None:
+            with seat_map.lock:
+                seat_map.holds.pop(holder, None)
+
+    def confirm(self, key: str, holder: str, seats: list[str]):
+        """Mark seats as sold once the booking is committed, dropping holder's hold."""
+        mask = 0
+        for i in (seat_index(s) for s in seats):
+            if i is not None:
+                mask |= 1 << i
+        seat_map = self._map(key)
+        with seat_map.lock:
+            seat_map.confirmed |= mask
+            seat_map.holds.pop(holder, None)
+        with self._lock:
+            if self._holders.get(holder) == key:
+                del self._holders[holder]
+
+    def forget(self, key: str):
+        """Drop a cached map so it is re-seeded from the database (e.g. another worker sold a seat)."""
+        with self._lock:
+            self._maps.pop(key, None)
+
+    def available(self, key: str) -> int:
+        seat_map = self._map(key)
+        with seat_map.lock:
+            return CAPACITY - seat_map.taken_for("", time.monotonic()).bit_count()
+
+
+_inventory = SeatInventory(settings.SEAT_HOLD_SECONDS)
+
+
+def hold_seats(flight: dict, holder: str, count: int, seats: list[str] | None = None) -> list[str]:
+    return _inventory.hold(flight_key(flight), holder, count, seats)
+
+
+def release_seats(holder: str):
+    _inventory.release(holder)
+
+
+def confirm_seats(flight: dict, holder: str, seats: list[str]):
+    _inventory.confirm(flight_key(flight), holder, seats)
+
+
+def forget_flight(flight: dict):
+    _inventory.forget(flight_key(flight))
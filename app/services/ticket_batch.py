@@ -0,0 +1,165 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from app.core.db import SessionLocal, Booking, from_utc_naive, to_utc_naive
+from app.core.settings import settings
+from app.services.bookings import normalize_pnr
+from app.services.ticket_pdf import generate_ticket_pdf
+
+_LOAD_CHUNK = 500
+
+
+def _ticket_info(b: Booking, changes: dict) -> dict:
+    """Rebuild the generate_ticket_pdf input for a booking, keeping its PNR/ticket_id."""
+    meta = b.flight_meta or {}
+    info = dict(meta.get("ticket_info") or {})
+    if not info:
+        # Bookings issued before ticket_info was stored in flight_meta
+        passengers = [dict(p) for p in meta.get("passengers") or []]
+        for p, seat in zip(passengers, meta.get("seats") or []):
+            p.setdefault("seat", seat)
+        info = {
+            "name": passengers[0].get("name") if passengers else None,
+            "source": b.source_iata,
+            "dest": b.dest_iata,
+            "depart_at": meta.get("depart_at_iso") or (
+                from_utc_naive(b.depart_at, meta.get("timezone") or settings.DEFAULT_TIMEZONE).isoformat()
+                if b.depart_at else None),
+            "flight": {"id": meta.get("selected")},
+            "passengers": passengers,
+            "gate": meta.get("gate"),
+        }
+    info.update(changes)
+    info["pnr"] = b.pnr or meta.get("pnr")
+    info["ticket_id"] = b.ticket_id or meta.get("ticket_id")
+    return info
+
+
+def _render_one(booking_id: int, info: dict, base_url: str | None) -> tuple[int, str | None]:
+    # Runs in a worker process; the ticket storage write is atomic
+    try:
+        generate_ticket_pdf(info, base_url=base_url)
+        return booking_id, None
+    except Exception as e:
+        return booking_id, repr(e)
+
+
+def reissue_tickets(booking_ids: list[int], changes: dict | None = None, workers: int | None = None) -> dict:
+    """
+    Re-render ticket PDFs for many bookings across a process pool.
+
+    changes is merged into every ticket's info (e.g. {"gate": "B7", "depart_at": "..."}).
+    Tickets keep their ticket_id, so existing download links stay valid. Successful
+    rows get their flight_meta updated in one bulk write at the end.
+    Returns {"rendered", "failed": {booking_id: error}, "elapsed", "tickets_per_sec"}.
+    """
+    changes = changes or {}
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    failed: dict[int, str] = {}
+    infos: dict[int, dict] = {}
+    metas: dict[int, dict] = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = []
+            for i in range(0, len(booking_ids), _LOAD_CHUNK):
+                chunk = booking_ids[i:i + _LOAD_CHUNK]
+                found = {b.id: b for b in db.query(Booking).filter(Booking.id.in_(chunk)).all()}
+                for booking_id in chunk:
+                    b = found.get(booking_id)
+                    if b is None:
+                        failed[booking_id] = "booking not found"
+                        continue
+                    if not (b.ticket_id or (b.flight_meta or {}).get("ticket_id")):
+                        failed[booking_id] = "booking has no ticket"
+                        continue
+                    info = _ticket_info(b, changes)
+                    infos[b.id] = info
+                    metas[b.id] = dict(b.flight_meta or {})
+                    futures.append(pool.submit(_render_one, b.id, info, metas[b.id].get("base_url")))
+                db.expunge_all()
+            for fut in as_completed(futures):
+                booking_id, error = fut.result()
+                if error:
+                    failed[booking_id] = error
+
+        now = datetime.utcnow().isoformat()
+        updates = []
+        for booking_id, info in infos.items():
+            if booking_id in failed:
+                continue
+            meta = metas[booking_id]
+            meta.update({
+                "ticket_info": info,
+                "gate": info.get("gate", meta.get("gate")),
+                "seats": [p.get("seat") for p in info.get("passengers") or []] or meta.get("seats"),
+                "depart_at_iso": info.get("depart_at", meta.get("depart_at_iso")),
+                "reissued_at": now,
+            })
+            row = {"id": booking_id, "flight_meta": meta}
+            if "depart_at" in changes:
+                # bulk updates skip Booking's validators; a naive --depart-at is the booking's local time
+                row["depart_at"] = to_utc_naive(datetime.fromisoformat(changes["depart_at"].replace("Z", "+00:00")),
+                                                meta.get("timezone") or settings.DEFAULT_TIMEZONE)
+            updates.append(row)
+        if updates:
+            db.bulk_update_mappings(Booking, updates)
+            db.commit()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - t0
+    rendered = len(infos) - len([k for k in failed if k in infos])
+    return {
+        "rendered": rendered,
+        "failed": failed,
+        "elapsed": elapsed,
+        "tickets_per_sec": rendered / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-render ticket PDFs in bulk (e.g. after a schedule change).")
+    ap.add_argument("--ids", type=int, nargs="*", default=[], help="booking ids")
+    ap.add_argument("--pnrs", nargs="*", default=[], help="PNR codes")
+    ap.add_argument("--gate", help="new gate for every ticket")
+    ap.add_argument("--depart-at", help="new departure time (ISO 8601) for every ticket")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = ap.parse_args()
+
+    booking_ids = list(args.ids)
+    missing_pnrs = []
+    if args.pnrs:
+        db = SessionLocal()
+        try:
+            codes = list(dict.fromkeys(normalize_pnr(p) for p in args.pnrs))
+            found = dict(db.query(Booking.pnr, Booking.id).filter(Booking.pnr.in_(codes)).all())
+        finally:
+            db.close()
+        booking_ids += [found[code] for code in codes if code in found]
+        missing_pnrs = [code for code in codes if code not in found]
+    changes = {}
+    if args.gate:
+        changes["gate"] = args.gate.upper()
+    if args.depart_at:
+        changes["depart_at"] = args.depart_at
+
+    result = reissue_tickets(booking_ids, changes, workers=args.workers)
+    failed = len(result["failed"]) + len(missing_pnrs)
+    print(f"rendered={result['rendered']} failed={failed} "
+          f"elapsed={result['elapsed']:.2f}s throughput={result['tickets_per_sec']:.1f} tickets/s")
+    for code in missing_pnrs:
+        print(f"  PNR {code}: booking not found")
+    for booking_id, error in sorted(result["failed"].items()):
+        print(f"  booking {booking_id}: {error}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # python -m app.services.ticket_batch --pnrs ABC123 XYZ789 --gate B7
+    main()
@@ -1,6 +1,10 @@
+import functools
+import io
+import itertools
 import os
 import uuid
 import random
+import time
 from datetime import datetime, timedelta
 from typing import Tuple, Optional
 
@@ -9,22 +13,16 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
-from reportlab.graphics.barcode import qr
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode import qrencoder
 
+from app.core.metrics import TICKET_RENDER_SECONDS
 from app.core.settings import settings
+from app.services.pnr import next_pnr
+from app.services.ticket_storage import get_ticket_storage
 
-
-def _generate_pnr() -> str:
-    alphabet = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"  # avoid 0/O/1/I
-    return "".join(random.choice(alphabet) for _ in range(6))
-
-
-def _assign_seat() -> str:
-    row = random.randint(5, 30)
-    seat = random.choice(list("ABCDEF"))
-    return f"{row}{seat}"
+# Rows of the fixed "label: value" block, in print order (values are per ticket)
+_DETAIL_LABELS = ["Passenger", "Phone", "PNR", "From", "To", "Flight", "Departure", "Boarding", "Gate"]
+_STATIC_FORM = "ticket_static"
 
 
 def _assign_gate() -> str:
@@ -33,82 +31,180 @@ def _assign_gate() -> str:
     return f"{letter}{num}"
 
 
-def generate_ticket_pdf(info: dict, base_url: Optional[str] = None) -> Tuple[str, str, str, list[str], str]:
+def assign_ticket_refs(info: dict) -> dict:
     """
-    Generate a branded flight ticket PDF under ./tickets/{ticket_id}.pdf
-
-    info expects keys: name, phone, source, dest, depart_at (ISO), flight (dict)
-    base_url: if provided, embed https URL to the PDF in QR code
-    Returns: (ticket_id, path, pnr, seat, gate)
+    Fill ticket_id, pnr and gate into info (in place) so they can be persisted
+    and promised to the user before the PDF is rendered. Values already present
+    are kept; a missing PNR comes from the PNR allocator. Every passenger must
+    already have a seat from the seat inventory (raises ValueError otherwise).
+    Returns info.
     """
-    ticket_id = uuid.uuid4().hex[:10]
-    pnr = _generate_pnr()
-
-    # Build passengers list
+    info["ticket_id"] = info.get("ticket_id") or uuid.uuid4().hex[:10]
+    info["pnr"] = info.get("pnr") or next_pnr()
+    info["gate"] = (info.get("gate") or _assign_gate()).upper()
     passengers = info.get("passengers")
     if not passengers or not isinstance(passengers, list):
         passengers = [{"name": info.get("name") or "WhatsApp User", "email": info.get("email")}]  # single pax fallback
+    if not all(p.get("seat") for p in passengers):
+        raise ValueError("every passenger needs a seat from the seat inventory before the ticket is issued")
+    info["passengers"] = [{**p, "seat": p["seat"].upper()} for p in passengers]
+    return info
 
-    # Assign seat/gate
-    seats: list[str] = []
-    gate = (info.get("gate") or _assign_gate()).upper()
-    for p in passengers:
-        seats.append(((p.get("seat") or _assign_seat()).upper()))
-
-    os.makedirs("tickets", exist_ok=True)
-    path = os.path.join("tickets", f"{ticket_id}.pdf")
 
-    c = canvas.Canvas(path, pagesize=A4)
-    width, height = A4
+class TicketTemplate:
+    """
+    Static layer of the ticket for one brand config: header bar, brand name, logo,
+    section titles, detail labels and footer disclaimer. Built once per config
+    (see get_ticket_template) so the colour is parsed and the logo decoded once;
+    each ticket then places it as a single Form XObject and only draws its own fields.
+    """
 
-    # Brand header bar
+    def __init__(self, brand: str, primary_hex: str, logo_path: str):
+        self.brand = brand
+        try:
+            self.primary_color = colors.HexColor(primary_hex)
+        except Exception:
+            self.primary_color = colors.HexColor("#0b5fff")
+        self.logo = None
+        try:
+            if os.path.exists(logo_path):
+                self.logo = ImageReader(logo_path)
+        except Exception:
+            self.logo = None
+
+    def draw_static(self, c: canvas.Canvas):
+        width, height = A4
+        c.beginForm(_STATIC_FORM)
+        # Brand header bar
+        c.setFillColor(self.primary_color)
+        c.rect(0, height - 40 * mm, width, 40 * mm, stroke=0, fill=1)
+        c.setFillColor(colors.white)
+        c.setFont("Helvetica-Bold", 22)
+        c.drawString(25 * mm, height - 22 * mm, self.brand)
+        c.setFont("Helvetica", 10)
+        c.drawString(25 * mm, height - 30 * mm, "E-Ticket Itinerary / Receipt")
+        # Optional logo at top-left
+        if self.logo is not None:
+            try:
+                c.drawImage(self.logo, 10 * mm, height - 35 * mm, width=12 * mm, height=12 * mm, mask='auto')
+            except Exception:
+                pass
+        # Body details panel
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(20 * mm, height - 55 * mm, "Passenger & Flight Details")
+        c.setFont("Helvetica", 11)
+        y = height - 70 * mm
+        for label in _DETAIL_LABELS:
+            c.drawString(20 * mm, y, f"{label}:")
+            y -= 8 * mm
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(20 * mm, y, "Passengers")
+        # Footer disclaimer
+        c.setFillColor(colors.grey)
+        c.setFont("Helvetica", 8)
+        c.drawString(20 * mm, 13 * mm, "Please carry a valid photo ID. This is a system-generated ticket.")
+        c.endForm()
+        c.doForm(_STATIC_FORM)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_template(brand: str, primary_hex: str, logo_path: str, _logo_mtime: float) -> TicketTemplate:
+    return TicketTemplate(brand, primary_hex, logo_path)
+
+
+def get_ticket_template() -> TicketTemplate:
+    """Cached template for the current brand config; a changed logo file (mtime) rebuilds it."""
     brand = getattr(settings, "FROM_NAME", None) or "Flight Booking"
     primary_hex = os.getenv("BRAND_PRIMARY", "#0b5fff")
+    logo_path = os.getenv("BRAND_LOGO_PATH") or os.path.join("assets", "logo.png")
     try:
-        primary_color = colors.HexColor(primary_hex)
-    except Exception:
-        primary_color = colors.HexColor("#0b5fff")
+        mtime = os.path.getmtime(logo_path)
+    except OSError:
+        mtime = 0.0
+    return _load_template(brand, primary_hex, logo_path, mtime)
+
+
+def _draw_qr(c: canvas.Canvas, data: str, x: float, y: float, size: float, border: int = 4):
+    # Same geometry as QrCodeWidget, but encoded once and emitted as one filled path
+    # instead of a Drawing of per-run Rect shapes (which dominated render time).
+    code = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.L)
+    code.addData(data)
+    code.make()
+    count = code.getModuleCount()
+    box = size / (count + border * 2.0)
+    path = c.beginPath()
+    for r, row in enumerate(code.modules):
+        col = 0
+        for dark, run in itertools.groupby(map(bool, row)):
+            n = len(list(run))
+            if dark:
+                path.rect(x + (col + border) * box, y + size - (r + border + 1) * box, n * box, box)
+            col += n
+    c.setFillColor(colors.black)
+    c.drawPath(path, stroke=0, fill=1)
 
-    c.setFillColor(primary_color)
-    c.rect(0, height - 40 * mm, width, 40 * mm, stroke=0, fill=1)
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 22)
-    c.drawString(25 * mm, height - 22 * mm, brand)
-    c.setFont("Helvetica", 10)
-    c.drawString(25 * mm, height - 30 * mm, "E-Ticket Itinerary / Receipt")
 
-    # Optional logo at top-left
-    logo_path = os.getenv("BRAND_LOGO_PATH") or os.path.join("assets", "logo.png")
-    try:
-        if os.path.exists(logo_path):
-            img = ImageReader(logo_path)
-            c.drawImage(img, 10 * mm, height - 35 * mm, width=12 * mm, height=12 * mm, mask='auto')
-    except Exception:
-        pass
+def generate_ticket_pdf(info: dict, base_url: Optional[str] = None) -> Tuple[str, str, str, list[str], str]:
+    """
+    Generate a branded flight ticket PDF and store it as {ticket_id} in the ticket storage
+
+    info expects keys: name, phone, source, dest, depart_at (ISO), flight (dict)
+    Optional ticket_id/pnr/gate and passengers[].seat are used as-is (see assign_ticket_refs).
+    base_url: if provided, embed https URL to the PDF in QR code
+    Returns: (ticket_id, location, pnr, seat, gate)
+    """
+    info = assign_ticket_refs(dict(info))
+    ticket_id = info["ticket_id"]
+    pnr = info["pnr"]
+    gate = info["gate"]
+    passengers = info["passengers"]
+    seats: list[str] = [p["seat"] for p in passengers]
+
+    # Render in memory; the storage backend makes the write atomic
+    started = time.perf_counter()
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    width, height = A4
+    get_ticket_template().draw_static(c)
 
     # QR code at top-right
     qr_data = f"Ticket:{ticket_id}|PNR:{pnr}|Name:{(info.get('name') or '').strip()}"
     if base_url:
         qr_data = f"{base_url.rstrip('/')}/tickets/{ticket_id}.pdf"
     try:
-        qr_code = qr.QrCodeWidget(qr_data)
-        b = qr_code.getBounds()
-        qr_w = 28 * mm
-        qr_h = 28 * mm
-        w = b[2] - b[0]
-        h = b[3] - b[1]
-        d = Drawing(qr_w, qr_h, transform=[qr_w / w, 0, 0, qr_h / h, 0, 0])
-        d.add(qr_code)
-        renderPDF.draw(d, c, width - 38 * mm, height - 36 * mm)
+        _draw_qr(c, qr_data, width - 38 * mm, height - 36 * mm, 28 * mm)
     except Exception:
         pass
 
-    # Body details panel
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(20 * mm, height - 55 * mm, "Passenger & Flight Details")
+    flight = info.get("flight", {})
+    depart_iso = info.get("depart_at") or ""
+    try:
+        depart_dt = datetime.fromisoformat(depart_iso.replace("Z", "+00:00")) if depart_iso else None
+    except Exception:
+        depart_dt = None
+    depart_txt = depart_dt.strftime("%d %b %Y, %I:%M %p") if depart_dt else (depart_iso or "-")
+    boarding_txt = (depart_dt - timedelta(minutes=45)).strftime("%I:%M %p") if depart_dt else "-"
 
+    # Values for the template's detail labels (bold for passenger and PNR)
+    primary_pax = passengers[0]
+    values = [
+        (primary_pax.get("name") or "WhatsApp User", True),
+        (info.get("phone") or "-", False),
+        (pnr, True),
+        (info.get("source") or "-", False),
+        (info.get("dest") or "-", False),
+        (f"{flight.get('flight_no','-')} ({flight.get('airline','-')})", False),
+        (depart_txt, False),
+        (boarding_txt, False),
+        (gate, False),
+    ]
+    c.setFillColor(colors.black)
     y = height - 70 * mm
+    for value, bold in values:
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", 11)
+        c.drawString(60 * mm, y, value or "-")
+        y -= 8 * mm
 
     def line(label: str, value: str, bold_value: bool = False):
         nonlocal y
@@ -118,29 +214,7 @@ def generate_ticket_pdf(info: dict, base_url: Optional[str] = None) -> Tuple[str
         c.drawString(60 * mm, y, value or "-")
         y -= 8 * mm
 
-    flight = info.get("flight", {})
-    depart_iso = info.get("depart_at") or ""
-    try:
-        depart_dt = datetime.fromisoformat(depart_iso.replace("Z", "+00:00")) if depart_iso else None
-    except Exception:
-        depart_dt = None
-    depart_txt = depart_dt.strftime("%d %b %Y, %I:%M %p") if depart_dt else (depart_iso or "-")
-    boarding_txt = (depart_dt - timedelta(minutes=45)).strftime("%I:%M %p") if depart_dt else "-"
-
-    # Passenger summary
-    primary_pax = passengers[0]
-    line("Passenger", primary_pax.get("name") or "WhatsApp User", True)
-    line("Phone", info.get("phone") or "-")
-    line("PNR", pnr, True)
-    line("From", info.get("source") or "-")
-    line("To", info.get("dest") or "-")
-    line("Flight", f"{flight.get('flight_no','-')} ({flight.get('airline','-')})")
-    line("Departure", depart_txt)
-    line("Boarding", boarding_txt)
-    line("Gate", gate)
-    # Passenger list
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(20 * mm, y, "Passengers")
+    # Passenger list (heading comes from the template)
     y -= 8 * mm
     c.setFont("Helvetica", 11)
     for i, p in enumerate(passengers, start=1):
@@ -156,11 +230,11 @@ def generate_ticket_pdf(info: dict, base_url: Optional[str] = None) -> Tuple[str
     c.setFont("Helvetica-Oblique", 9)
     c.setFillColor(colors.grey)
     c.drawString(20 * mm, 18 * mm, f"Ticket ID: {ticket_id}  •  PNR: {pnr}")
-    c.setFont("Helvetica", 8)
-    c.drawString(20 * mm, 13 * mm, "Please carry a valid photo ID. This is a system-generated ticket.")
 
     c.showPage()
     c.save()
+    TICKET_RENDER_SECONDS.observe(time.perf_counter() - started)
+    location = get_ticket_storage().put(ticket_id, buf.getvalue())
 
-    return ticket_id, path, pnr, seats, gate
+    return ticket_id, location, pnr, seats, gate
 
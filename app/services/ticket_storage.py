@@ -0,0 +1,242 @@
+import argparse
+import os
+import threading
+import uuid
+from typing import Iterator
+
+from app.core.settings import settings
+
+# Ticket PDFs live behind a small storage interface so the renderer, the issue
+# worker and the download routes don't care where the bytes are:
+#   - "local": files under TICKETS_DIR, sharded by ticket id prefix
+#     (tickets/ab/cd/abcd1234ef.pdf) so no directory grows past a few thousand
+#     entries; writes go to a temp file in the target directory and are renamed
+#     into place, so readers never see a partial PDF
+#   - "s3": objects in an S3-compatible bucket (needs boto3; S3_ENDPOINT_URL
+#     points it at MinIO or the local stand-in in bench/s3_stub.py)
+# Stamps identify one stored version of a ticket so caches can tell when it changed.
+
+_SHARD_WIDTH = 2
+
+
+class TicketStorage:
+    def put(self, ticket_id: str, data: bytes) -> str:
+        """Store a ticket PDF, replacing any previous version; returns its location."""
+        raise NotImplementedError
+
+    def read(self, ticket_id: str) -> tuple[bytes, tuple, float] | None:
+        """(data, stamp, modified timestamp), or None if missing."""
+        raise NotImplementedError
+
+    def stamp(self, ticket_id: str) -> tuple | None:
+        """Cheap version check (no body transfer); None if missing."""
+        raise NotImplementedError
+
+    def exists(self, ticket_id: str) -> bool:
+        return self.stamp(ticket_id) is not None
+
+    def delete(self, ticket_id: str) -> None:
+        raise NotImplementedError
+
+
+def shard_parts(ticket_id: str, depth: int) -> list[str]:
+    padded = ticket_id.ljust(depth * _SHARD_WIDTH, "_")
+    return [padded[i * _SHARD_WIDTH:(i + 1) * _SHARD_WIDTH] for i in range(depth)]
+
+
+class LocalTicketStorage(TicketStorage):
+    def __init__(self, root: str, depth: int = 2):
+        self.root = root
+        self.depth = depth
+
+    def path(self, ticket_id: str) -> str:
+        return os.path.join(self.root, *shard_parts(ticket_id, self.depth), f"{ticket_id}.pdf")
+
+    def _legacy_path(self, ticket_id: str) -> str:
+        # Flat layout from before sharding; read until `reshard` has moved the file
+        return os.path.join(self.root, f"{ticket_id}.pdf")
+
+    def put(self, ticket_id: str, data: bytes) -> str:
+        path = self.path(ticket_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:6]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def move_in(self, ticket_id: str, src: str) -> str:
+        """Rename an existing file on the same filesystem into place (used by reshard)."""
+        path = self.path(ticket_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src, path)
+        return path
+
+    def _open(self, ticket_id: str):
+        for path in (self.path(ticket_id), self._legacy_path(ticket_id)):
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                continue
+        return None
+
+    def read(self, ticket_id: str):
+        f = self._open(ticket_id)
+        if f is None:
+            return None
+        with f:
+            # fstat the open file so the stamp always describes the bytes we read
+            st = os.fstat(f.fileno())
+            return f.read(), (st.st_mtime_ns, st.st_size), st.st_mtime
+
+    def stamp(self, ticket_id: str):
+        for path in (self.path(ticket_id), self._legacy_path(ticket_id)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            return st.st_mtime_ns, st.st_size
+        return None
+
+    def delete(self, ticket_id: str) -> None:
+        for path in (self.path(ticket_id), self._legacy_path(ticket_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def iter_files(self) -> Iterator[tuple[str, str]]:
+        """(ticket_id, path) for every ticket file under root, in any layout."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".pdf"):
+                    yield name[:-4], os.path.join(dirpath, name)
+
+
+class S3TicketStorage(TicketStorage):
+    def __init__(self, bucket: str, prefix: str = "tickets/", depth: int = 2, endpoint_url: str | None = None,
+                 region: str | None = None):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("TICKET_STORAGE=s3 needs boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.depth = depth
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            config=Config(s3={"addressing_style": "path"} if endpoint_url else {},
+                          retries={"max_attempts": 3, "mode": "standard"}),
+        )
+        self._client_error = ClientError
+
+    def key(self, ticket_id: str) -> str:
+        return self.prefix + "/".join(shard_parts(ticket_id, self.depth)) + f"/{ticket_id}.pdf"
+
+    def _missing(self, e) -> bool:
+        return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, ticket_id: str, data: bytes) -> str:
+        key = self.key(ticket_id)
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType="application/pdf")
+        return f"s3://{self.bucket}/{key}"
+
+    def read(self, ticket_id: str):
+        try:
+            obj = self._client.get_object(Bucket=self.bucket, Key=self.key(ticket_id))
+        except self._client_error as e:
+            if self._missing(e):
+                return None
+            raise
+        data = obj["Body"].read()
+        return data, (obj["ETag"], obj["ContentLength"]), obj["LastModified"].timestamp()
+
+    def stamp(self, ticket_id: str):
+        try:
+            head = self._client.head_object(Bucket=self.bucket, Key=self.key(ticket_id))
+        except self._client_error as e:
+            if self._missing(e):
+                return None
+            raise
+        return head["ETag"], head["ContentLength"]
+
+    def delete(self, ticket_id: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=self.key(ticket_id))
+
+
+def build_storage(kind: str) -> TicketStorage:
+    if kind == "local":
+        return LocalTicketStorage(settings.TICKETS_DIR, settings.TICKET_SHARD_DEPTH)
+    if kind == "s3":
+        if not settings.S3_BUCKET:
+            raise RuntimeError("TICKET_STORAGE=s3 needs S3_BUCKET")
+        return S3TicketStorage(settings.S3_BUCKET, settings.S3_PREFIX, settings.TICKET_SHARD_DEPTH,
+                               settings.S3_ENDPOINT_URL, settings.S3_REGION)
+    raise ValueError(f"unknown TICKET_STORAGE {kind!r}")
+
+
+_storage: TicketStorage | None = None
+_storage_lock = threading.Lock()
+
+
+def get_ticket_storage() -> TicketStorage:
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = build_storage(settings.TICKET_STORAGE)
+        return _storage
+
+
+def reshard(source_dir: str, target: TicketStorage, delete_source: bool = False, dry_run: bool = False) -> tuple[int, int]:
+    """
+    Move every ticket file under source_dir (flat or any shard depth) to its
+    place in target. Local targets on the same filesystem get a rename; other
+    targets get a copy, and the source is removed only with delete_source.
+    The walk finishes before anything moves, so files moved into shard
+    directories under source_dir are not visited again; only the files that
+    still need moving are kept in memory. Returns (moved, skipped).
+    """
+    moved = skipped = 0
+    local_target = isinstance(target, LocalTicketStorage)
+    pending = []
+    for ticket_id, path in LocalTicketStorage(source_dir).iter_files():
+        if local_target and os.path.abspath(path) == os.path.abspath(target.path(ticket_id)):
+            skipped += 1
+        else:
+            pending.append((ticket_id, path))
+    for ticket_id, path in pending:
+        if not dry_run:
+            if local_target:
+                target.move_in(ticket_id, path)
+            else:
+                with open(path, "rb") as f:
+                    target.put(ticket_id, f.read())
+                if delete_source:
+                    os.remove(path)
+        moved += 1
+    return moved, skipped
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Move ticket PDFs into the configured storage layout.")
+    ap.add_argument("command", choices=["reshard"])
+    ap.add_argument("--from", dest="source", default=settings.TICKETS_DIR, help="local directory to read tickets from")
+    ap.add_argument("--delete-source", action="store_true", help="remove local files after copying to a remote store")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    moved, skipped = reshard(args.source, get_ticket_storage(), args.delete_source, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    print(f"{verb} {moved} tickets into {settings.TICKET_STORAGE} storage; {skipped} already in place")
+
+
+if __name__ == "__main__":
+    # python -m app.services.ticket_storage reshard [--from tickets] [--dry-run]
+    main()
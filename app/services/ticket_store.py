@@ -0,0 +1,96 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.core.settings import settings
+from app.services.ticket_storage import get_ticket_storage
+
+_TICKET_ID = re.compile(r"^[0-9a-z_-]{1,64}$")
+
+
+class TicketBlob(NamedTuple):
+    data: bytes
+    digest: str  # sha256 hex of data; the ETag and the content-addressed URL segment
+    mtime: float
+
+
+def valid_ticket_id(ticket_id: str) -> bool:
+    return bool(_TICKET_ID.match(ticket_id or ""))
+
+
+def ticket_version_path(ticket_id: str, digest: str) -> str:
+    """Content-addressed URL path for one version of a ticket PDF (served as immutable)."""
+    return f"/tickets/{ticket_id}/{digest}.pdf"
+
+
+class TicketCache:
+    """
+    LRU of ticket PDFs by ticket_id, bounded by total bytes. Entries remember
+    the storage stamp they were read at and are re-read when it changes, so a
+    ticket re-rendered by another process (e.g. ticket_batch) is never served stale.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[tuple, TicketBlob]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ticket_id: str, stamp: tuple) -> TicketBlob | None:
+        with self._lock:
+            entry = self._entries.get(ticket_id)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(ticket_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, ticket_id: str, stamp: tuple, blob: TicketBlob):
+        size = len(blob.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(ticket_id, None)
+            if old is not None:
+                self.bytes -= len(old[1].data)
+            self._entries[ticket_id] = (stamp, blob)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted.data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+_cache = TicketCache(settings.TICKET_CACHE_MAX_BYTES)
+
+
+def load_ticket(ticket_id: str) -> TicketBlob | None:
+    """The ticket PDF with its sha256, from the LRU when the stored copy hasn't changed since it was cached."""
+    if not valid_ticket_id(ticket_id):
+        return None
+    storage = get_ticket_storage()
+    stamp = storage.stamp(ticket_id)
+    if stamp is None:
+        return None
+    blob = _cache.get(ticket_id, stamp)
+    if blob is not None:
+        return blob
+    stored = storage.read(ticket_id)
+    if stored is None:
+        return None
+    data, stamp, mtime = stored
+    blob = TicketBlob(data, hashlib.sha256(data).hexdigest(), mtime)
+    _cache.put(ticket_id, stamp, blob)
+    return blob
+
+
+def ticket_cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,203 @@
+import argparse
+import csv
+import os
+import random
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+# Schedule file: one row per recurring service, times local to the origin.
+#   airline,flight_no,origin,dest,depart,duration_min,fare,currency,days
+#   IndiGo,6E 2131,BOM,DEL,06:15,130,5400,INR,1234567
+# `days` lists the ISO weekdays (1=Mon .. 7=Sun) the service operates.
+FIELDS = ["airline", "flight_no", "origin", "dest", "depart", "duration_min", "fare", "currency", "days"]
+
+# Synthetic schedule over the main domestic airports, used when TIMETABLE_PATH
+# is not set. Regenerate with:
+#   python -m app.services.timetable --out app/data/timetable.csv --routes 132 --per-day 6 \
+#     --airports BOM,DEL,BLR,HYD,MAA,CCU,GOI,AMD,PNQ,COK,JAI,LKO
+BUNDLED_TIMETABLE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "timetable.csv")
+
+
+class Timetable:
+    """
+    Read-only, columnar timetable. Each service is one slot in parallel arrays
+    (duration, fare, string-table ids); departures are expanded per operating
+    weekday into a dep_min/service array pair sorted by (origin, dest, weekday,
+    dep_min). index maps (origin, dest, weekday) to its [lo, hi) range, so a
+    search for a date is one dict lookup plus a bisect.
+    """
+
+    def __init__(self):
+        self._strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        self.flight_no = array("I")
+        self.airline = array("I")
+        self.currency = array("I")
+        self.duration = array("H")
+        self.fare = array("I")
+        self.dep_min = array("H")
+        self.service = array("I")
+        self.index: dict[tuple[str, str, int], tuple[int, int]] = {}
+
+    def _intern(self, s: str) -> int:
+        i = self._string_ids.get(s)
+        if i is None:
+            i = self._string_ids[s] = len(self._strings)
+            self._strings.append(s)
+        return i
+
+    @classmethod
+    def from_rows(cls, rows) -> "Timetable":
+        tt = cls()
+        slots: dict[tuple[str, str, int], list[tuple[int, int]]] = {}
+        for row in rows:
+            hh, mm = map(int, row["depart"].split(":"))
+            sid = len(tt.fare)
+            tt.flight_no.append(tt._intern(row["flight_no"]))
+            tt.airline.append(tt._intern(row["airline"]))
+            tt.currency.append(tt._intern(row.get("currency") or "INR"))
+            tt.duration.append(int(row["duration_min"]))
+            tt.fare.append(int(float(row["fare"])))
+            origin, dest = row["origin"].upper(), row["dest"].upper()
+            for d in row.get("days") or "1234567":
+                slots.setdefault((origin, dest, int(d)), []).append((hh * 60 + mm, sid))
+        for key in sorted(slots):
+            entries = sorted(slots[key])
+            lo = len(tt.dep_min)
+            tt.dep_min.extend(m for m, _ in entries)
+            tt.service.extend(s for _, s in entries)
+            tt.index[key] = (lo, len(tt.dep_min))
+        return tt
+
+    @classmethod
+    def load(cls, path: str) -> "Timetable":
+        with open(path, newline="") as f:
+            return cls.from_rows(csv.DictReader(f))
+
+    def __len__(self) -> int:
+        return len(self.fare)
+
+    def search(self, source_iata: str, dest_iata: str, depart_at: datetime, limit: int = 3) -> list[dict]:
+        """
+        The `limit` departures on depart_at's date nearest to its time, nearest
+        first (mock_search's shape). The bisect lands between the last earlier
+        and the first later departure; the two ends then walk outwards, taking
+        whichever is closer (the later one on a tie).
+        """
+        base_time = depart_at.replace(second=0, microsecond=0)
+        rng = self.index.get((source_iata.upper(), dest_iata.upper(), base_time.isoweekday()))
+        if rng is None:
+            return []
+        lo, hi = rng
+        wanted = base_time.hour * 60 + base_time.minute
+        after = bisect_left(self.dep_min, wanted, lo, hi)
+        before = after - 1
+        picked = []
+        while len(picked) < limit and (before >= lo or after < hi):
+            if after < hi and (before < lo or self.dep_min[after] - wanted <= wanted - self.dep_min[before]):
+                picked.append(after)
+                after += 1
+            else:
+                picked.append(before)
+                before -= 1
+        options = []
+        for i in picked:
+            sid = self.service[i]
+            minutes = self.dep_min[i]
+            dep = base_time.replace(hour=minutes // 60, minute=minutes % 60)
+            flight_no = self._strings[self.flight_no[sid]]
+            options.append({
+                "id": flight_no.replace(" ", ""),
+                "airline": self._strings[self.airline[sid]],
+                "flight_no": flight_no,
+                "depart": dep.isoformat(),
+                "arrive": (dep + timedelta(minutes=self.duration[sid])).isoformat(),
+                "duration_min": self.duration[sid],
+                "price": self.fare[sid],
+                "currency": self._strings[self.currency[sid]],
+            })
+        return options
+
+
+_timetable: Timetable | None = None
+_timetable_lock = threading.Lock()
+
+
+def get_timetable() -> Timetable:
+    # Imported here so the schedule generator CLI runs without app credentials
+    from app.core.settings import settings
+
+    global _timetable
+    with _timetable_lock:
+        if _timetable is None:
+            _timetable = Timetable.load(settings.TIMETABLE_PATH or BUNDLED_TIMETABLE)
+        return _timetable
+
+
+def timetable_search(source_iata: str, dest_iata: str, depart_at: datetime):
+    """Replacement for mock_search backed by the schedule at TIMETABLE_PATH (or the bundled one)."""
+    return get_timetable().search(source_iata, dest_iata, depart_at)
+
+
+AIRLINES = [("AI", "Air India"), ("6E", "IndiGo"), ("UK", "Vistara"), ("QP", "Akasa Air"), ("SG", "SpiceJet"), ("IX", "Air India Express")]
+
+
+def generate_schedule(path: str, routes: int, per_day: int, seed: int = 1, airports: list[str] | None = None) -> int:
+    """
+    Write a synthetic schedule of `routes` city pairs x `per_day` services;
+    returns the row count. Made-up airport codes are added when the given
+    airports have fewer than `routes` pairs.
+    """
+    rnd = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    airports = list(airports or ["BOM", "DEL", "BLR", "HYD", "GOI", "MAA", "CCU", "AMD", "PNQ", "COK"])
+    seen = set(airports)
+    while len(airports) * (len(airports) - 1) < routes:
+        code = "".join(rnd.choice(letters) for _ in range(3))
+        if code not in seen:
+            seen.add(code)
+            airports.append(code)
+    pairs = [(a, b) for a in airports for b in airports if a != b]
+    rnd.shuffle(pairs)
+    rows = 0
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(FIELDS)
+        for origin, dest in pairs[:routes]:
+            duration = rnd.randint(55, 210)
+            for _ in range(per_day):
+                code, airline = rnd.choice(AIRLINES)
+                days = "1234567" if rnd.random() < 0.7 else "".join(sorted(rnd.sample("1234567", rnd.randint(3, 6))))
+                w.writerow([
+                    airline,
+                    f"{code} {rnd.randint(100, 9999)}",
+                    origin,
+                    dest,
+                    f"{rnd.randint(0, 23):02d}:{rnd.choice([0, 5, 10, 15, 20, 30, 35, 40, 45, 50, 55]):02d}",
+                    duration,
+                    rnd.randrange(2500, 15000, 50),
+                    "INR",
+                    days,
+                ])
+                rows += 1
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic flight schedule CSV.")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--routes", type=int, default=5000)
+    ap.add_argument("--per-day", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--airports", help="comma-separated IATA codes to build routes between")
+    args = ap.parse_args()
+    airports = [a.strip().upper() for a in args.airports.split(",")] if args.airports else None
+    rows = generate_schedule(args.out, args.routes, args.per_day, args.seed, airports)
+    print(f"wrote {rows} services to {args.out}")
+
+
+if __name__ == "__main__":
+    # python -m app.services.timetable --out schedule.csv --routes 5000 --per-day 6
+    main()
@@ -1,34 +1,51 @@
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from typing import Optional
 
-from twilio.rest import Client
-
 from app.core.settings import settings
+from app.services.outbound import OutboundError, queue_message
 
-# Initialize Twilio Client once per process
-_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-
+# How much longer than one Twilio request send_whatsapp_text waits for the queue
+_WAIT_MARGIN_SECONDS = 5.0
 
-def send_whatsapp_text(to_e164: str, body: str, media_url: Optional[str] = None):
-    """
-    Send a WhatsApp message via Twilio.
 
-    Args:
-        to_e164: Receiver phone in E.164 format (e.g., +14155552671). The function will add the 'whatsapp:' prefix.
-        body: Text body to send.
-        media_url: Optional public URL to media to attach.
-    """
+def _whatsapp_address(to_e164: str) -> str:
     # Ensure 'whatsapp:' prefix for the recipient
     to = to_e164
     if to.startswith("whatsapp:"):
         to = to.split(":", 1)[1]
-    to = f"whatsapp:{to}"
+    return f"whatsapp:{to}"
 
-    # From number should already include 'whatsapp:' in env (per .env.example)
-    from_ = settings.TWILIO_WHATSAPP_NUMBER
 
-    kwargs = {"from_": from_, "to": to, "body": body}
-    if media_url:
-        kwargs["media_url"] = [media_url]
+def queue_whatsapp_text(to_e164: str, body: str, media_url: Optional[str] = None, dead_letter: bool = True) -> Future:
+    """
+    Queue a WhatsApp message without waiting for it (for bulk sends).
 
-    return _client.messages.create(**kwargs)
+    The returned Future resolves to Twilio's message resource, or raises
+    OutboundError once the message has been dead-lettered (or, with
+    dead_letter=False, once the sender gave up on it).
+    """
+    # From number comes from settings and already includes 'whatsapp:' (per .env.example)
+    return queue_message(_whatsapp_address(to_e164), body, media_url, dead_letter=dead_letter)
 
+
+def send_whatsapp_text(to_e164: str, body: str, media_url: Optional[str] = None, dead_letter: bool = True):
+    """
+    Send a WhatsApp message via Twilio and wait for the result.
+
+    Args:
+        to_e164: Receiver phone in E.164 format (e.g., +14155552671). The function will add the 'whatsapp:' prefix.
+        body: Text body to send.
+        media_url: Optional public URL to media to attach.
+        dead_letter: False when the caller retries on failure itself (e.g. the issue job).
+
+    Goes through the rate-limited outbound queue (retries included); raises
+    OutboundError if Twilio never accepted the message, or if no answer came
+    within OUTBOUND_TIMEOUT plus a margin. A timed-out message gets no
+    further attempts; with dead_letter it is parked for replay instead.
+    """
+    fut = queue_whatsapp_text(to_e164, body, media_url, dead_letter)
+    try:
+        return fut.result(timeout=settings.OUTBOUND_TIMEOUT + _WAIT_MARGIN_SECONDS)
+    except FutureTimeout:
+        fut.cancel()
+        raise OutboundError(None, "timed out waiting for the outbound queue")
@@ -0,0 +1,32 @@
+"""Shared benchmark setup: dummy credentials, a throwaway SQLite DB and working dir."""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_env() -> str:
+    """Fill required settings with placeholders and chdir into a temp dir. Call before importing app.*"""
+    workdir = tempfile.mkdtemp(prefix="flight-bench-")
+    defaults = {
+        "TWILIO_ACCOUNT_SID": "ACbench",
+        "TWILIO_AUTH_TOKEN": "bench",
+        "TWILIO_WHATSAPP_NUMBER": "whatsapp:+10000000000",
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_WEBHOOK_SECRET": "whsec_bench",
+        "SENDGRID_API_KEY": "SG.bench",
+        "FROM_EMAIL": "bench@example.com",
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+        "BASE_URL": "http://bench.local",
+        "MIN_ADVANCE_HOURS": "1",
+        # Fixed three flights on every route, so scripted conversations can pick one
+        "FLIGHT_PROVIDERS": "mock",
+    }
+    for k, v in defaults.items():
+        os.environ.setdefault(k, v)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    return workdir
@@ -0,0 +1,95 @@
+"""
+Airport resolver benchmark: index build time and lookups/second for exact,
+prefix, misspelt and repeated (LRU) queries, against the previous approach of
+rapidfuzz.process.extractOne over every name. The bundled dataset is padded
+with synthetic airports to --airports entries.
+
+    python -m bench.airports --airports 8000 --queries 20000
+"""
+import argparse
+import csv
+import os
+import random
+import time
+
+
+def _word(rnd: random.Random) -> str:
+    syll = ["ba", "ka", "ra", "na", "pur", "gar", "dha", "li", "ma", "sa", "ta", "vi", "lo", "ne", "shi", "bad", "ko", "ri"]
+    return "".join(rnd.choice(syll) for _ in range(rnd.randint(2, 4))).capitalize()
+
+
+def _typo(rnd: random.Random, s: str) -> str:
+    i = rnd.randrange(1, len(s) - 1)
+    return s[:i] + s[i + 1:] if rnd.random() < 0.5 else s[:i] + s[i + 1] + s[i] + s[i + 2:]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--airports", type=int, default=8000)
+    ap.add_argument("--queries", type=int, default=20000)
+    args = ap.parse_args()
+
+    from bench._env import setup_env
+    workdir = setup_env()
+    from rapidfuzz import process
+    from app.services import iata
+    from app.services.iata import BUNDLED_AIRPORTS, AirportIndex
+
+    path = os.path.join(workdir, "airports.csv")
+    rnd = random.Random(5)
+    with open(BUNDLED_AIRPORTS, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    codes = {r["iata"] for r in rows}
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    while len(rows) < args.airports:
+        code = "".join(rnd.choice(letters) for _ in range(3))
+        if code in codes:
+            continue
+        codes.add(code)
+        city = _word(rnd)
+        rows.append({"iata": code, "name": f"{city} Airport", "city": city, "country": "XX",
+                     "weight": rnd.randint(1, 5), "aliases": "|".join(_word(rnd) for _ in range(rnd.randint(0, 2)))})
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["iata", "name", "city", "country", "weight", "aliases"])
+        w.writeheader()
+        w.writerows(rows)
+
+    t0 = time.perf_counter()
+    index = AirportIndex.load(path)
+    print(f"airports={len(index.airports)} keys={len(index.exact)} build={time.perf_counter() - t0:.2f}s")
+
+    cities = [r["city"] for r in rows if len(r["city"]) > 4]
+    workloads = {
+        "exact": [rnd.choice(cities) for _ in range(args.queries)],
+        "prefix": [rnd.choice(cities)[:4] for _ in range(args.queries)],
+        "misspelt": [_typo(rnd, rnd.choice(cities)) for _ in range(args.queries // 20)],
+    }
+    print(f"{'workload':<16} {'lookups/s':>10} {'us/lookup':>10}")
+    for name, queries in workloads.items():
+        t0 = time.perf_counter()
+        for q in queries:
+            index.suggest(q)
+        elapsed = time.perf_counter() - t0
+        print(f"{name:<16} {len(queries) / elapsed:>10.0f} {elapsed / len(queries) * 1e6:>10.1f}")
+
+    # Popular-city traffic through the LRU front (to_iata / suggest_airports)
+    iata._index = index
+    iata._suggest_cached.cache_clear()
+    hot = [rnd.choice(cities[:200]) for _ in range(args.queries)]
+    t0 = time.perf_counter()
+    for q in hot:
+        iata.to_iata(q)
+    elapsed = time.perf_counter() - t0
+    print(f"{'cached (to_iata)':<16} {len(hot) / elapsed:>10.0f} {elapsed / len(hot) * 1e6:>10.1f}")
+
+    names = {r["city"].lower(): r["iata"] for r in rows}
+    sample = workloads["exact"][: max(1, args.queries // 100)]
+    t0 = time.perf_counter()
+    for q in sample:
+        process.extractOne(q.lower(), names.keys(), score_cutoff=70)
+    elapsed = time.perf_counter() - t0
+    print(f"{'old extractOne':<16} {len(sample) / elapsed:>10.0f} {elapsed / len(sample) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
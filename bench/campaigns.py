@@ -0,0 +1,86 @@
+"""
+Schedule-change campaign over a large flight, against the local Twilio stub.
+
+Seeds --bookings bookings on one flight departure (plus noise on other
+flights), runs a campaign through the outbound queue and reports messages/s,
+peak Python memory while streaming, and the query plan of the recipient page
+query (it should use ix_bookings_flight_id_depart_at):
+
+    python -m bench.campaigns --bookings 20000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bookings", type=int, default=20000)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--rate", type=float, default=2000.0, help="per-sender messages/second (queue and stub)")
+    args = ap.parse_args()
+
+    setup_env()
+    os.environ["TWILIO_API_BASE"] = f"http://127.0.0.1:{args.port}"
+    os.environ["OUTBOUND_RATE_PER_SECOND"] = os.environ["OUTBOUND_BURST"] = str(args.rate)
+    os.environ["OUTBOUND_CONCURRENCY"] = "64"
+    from sqlalchemy import text
+    from bench.twilio_stub import start_stub
+    from app.core.db import init_db, engine, SessionLocal, Booking, User
+    from app.services.campaigns import create_campaign, recipients_page, run_campaign
+    from app.services.outbound import stop_outbound
+
+    init_db()
+    stub, server = start_stub(args.port, rate=args.rate, burst=args.rate)
+    depart = (datetime.now() + timedelta(days=2)).replace(hour=9, minute=30, second=0, microsecond=0)
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(User, [{"id": i + 1, "whatsapp_number": f"+1555{i:07d}"} for i in range(args.bookings)])
+        rows = []
+        for i in range(args.bookings * 2):
+            on_flight = i % 2 == 0
+            rows.append({
+                "user_id": i // 2 + 1,
+                "source_iata": "BOM",
+                "dest_iata": "DEL",
+                "depart_at": depart if on_flight else depart + timedelta(days=i % 7 + 1),
+                "flight_id": "AI101" if on_flight else f"AI{100 + i % 50}",
+                "pnr": f"{i:06d}",
+                "flight_meta": {"passengers": [{"name": f"Passenger {i}"}], "seats": ["12A"], "gate": "A1"},
+            })
+        db.bulk_insert_mappings(Booking, rows)
+        db.commit()
+        del rows
+        campaign = create_campaign(db, "delay", "AI101", depart.date(),
+                                   "Hi {name}, flight {flight} ({pnr}) on {depart} is delayed to {time}. Gate {gate}.",
+                                   {"time": "11:45"})
+        campaign_id = campaign.id
+        if engine.dialect.name == "sqlite":
+            stmt = recipients_page(db, campaign, args.batch).statement
+            sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = db.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+            print("plan:", "; ".join(r[-1] for r in plan))
+    finally:
+        db.close()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    campaign = run_campaign(campaign_id, args.batch)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop_outbound()
+    server.should_exit = True
+    print(f"recipients={campaign.sent + campaign.failed} status={campaign.status} sent={campaign.sent} "
+          f"failed={campaign.failed} batch={args.batch}")
+    print(f"elapsed={elapsed:.2f}s throughput={campaign.sent / elapsed:.0f} msg/s peak_python_mem={peak / 1e6:.1f} MB "
+          f"stub_accepted={stub.state.stats['accepted']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Flight search benchmark: fan-out latency against slow fake providers, and
+searches/second with a cold vs warm result cache on a skewed route mix.
+
+    python -m bench.flight_search --providers 3 --latency 0.05 --searches 500
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--providers", type=int, default=3)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds per provider call")
+    ap.add_argument("--timeout", type=float, default=0.5)
+    ap.add_argument("--searches", type=int, default=500)
+    ap.add_argument("--routes", type=int, default=20)
+    args = ap.parse_args()
+
+    from bench._env import setup_env
+    setup_env()
+    from app.services.flight_search import FakeProvider, FlightSearch, SearchCache
+
+    airports = ["BOM", "DEL", "BLR", "MAA", "HYD", "CCU", "GOI", "PNQ", "AMD", "COK"]
+    rnd = random.Random(7)
+    routes = []
+    while len(routes) < args.routes:
+        a, b = rnd.sample(airports, 2)
+        if (a, b) not in routes:
+            routes.append((a, b))
+    base = datetime(2030, 1, 15, 6)
+    # Popular routes dominate, like real traffic
+    queries = [
+        (*routes[min(int(rnd.paretovariate(1.2)) - 1, len(routes) - 1)], base + timedelta(hours=rnd.randrange(0, 16)))
+        for _ in range(args.searches)
+    ]
+
+    providers = [FakeProvider(args.timeout, latency=args.latency) for _ in range(args.providers)]
+    slow = FakeProvider(args.timeout, latency=args.timeout * 1.5)
+
+    def run(search: FlightSearch, label: str):
+        t0 = time.perf_counter()
+        for src, dst, dep in queries:
+            search.search(src, dst, dep)
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<34} {len(queries) / elapsed:>10.1f} {elapsed / len(queries) * 1000:>10.2f}")
+
+    print(f"{'':<34} {'search/s':>10} {'ms/search':>10}")
+    run(FlightSearch(providers, SearchCache(ttl=0, stale=0)), "uncached fan-out")
+    run(FlightSearch(providers + [slow], SearchCache(ttl=0, stale=0)), "uncached, one provider timing out")
+    cached = FlightSearch(providers, SearchCache(ttl=300, stale=900))
+    run(cached, "cache (cold)")
+    run(cached, "cache (warm)")
+    serial = args.latency * args.providers * 1000
+    print(f"\nserial provider calls would cost ~{serial:.0f} ms/search uncached")
+
+
+if __name__ == "__main__":
+    main()
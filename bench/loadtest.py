@@ -0,0 +1,213 @@
+"""
+Load test: many concurrent WhatsApp conversations, each a full booking
+(restart -> source -> destination -> date -> time -> flights -> passengers ->
+details -> seats -> confirm), posted to /whatsapp/webhook as Twilio-formatted
+form bodies. Twilio, Stripe and SendGrid are local stubs, so nothing leaves
+the machine. Reports p50/p95/p99 latency per step and bookings/second, then
+waits for the issue worker to deliver the tickets.
+
+    python -m bench.loadtest --conversations 1000 --concurrency 200
+    python -m bench.loadtest --pay-with-stripe     # pay through Stripe checkout + webhook (and SendGrid email) instead of 'confirm'
+    python -m bench.loadtest --max-p95-ms 250      # exit non-zero if any step's p95 is slower (for CI)
+
+Exits non-zero if any conversation fails to book.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from bench._env import setup_env
+
+# Spread conversations over departures so no flight sells out
+_DAYS, _TIMES, _FLIGHTS = 60, 6, 3
+_SOURCES, _DESTS = ("1", "3"), ("1", "2", "3")  # never the same city twice
+
+
+def conversation_script(i: int, passengers: int, stripe: bool) -> list[tuple[str, str]]:
+    """(step, message body) for conversation i."""
+    depart = datetime.now() + timedelta(days=3 + i % _DAYS)
+    script = [
+        ("restart", "restart"),
+        ("source", _SOURCES[i % len(_SOURCES)]),
+        ("destination", _DESTS[(i // 2) % len(_DESTS)]),
+        ("date", depart.strftime("%Y-%m-%d")),
+        ("time", str(1 + (i // _DAYS) % _TIMES)),
+        ("flights", str(1 + (i // (_DAYS * _TIMES)) % _FLIGHTS)),
+        ("passengers_count", str(passengers)),
+    ]
+    script += [("details", f"Passenger {n} Load{i}, pax{n}.{i}@example.com") for n in range(1, passengers + 1)]
+    script.append(("seats", "auto"))
+    if not stripe:
+        script.append(("confirm", "confirm"))
+    return script
+
+
+def stripe_signature(payload: str, secret: str) -> str:
+    t = int(time.time())
+    v1 = hmac.new(secret.encode(), f"{t}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={t},v1={v1}"
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=200, help="conversations in flight at once")
+    ap.add_argument("--passengers", type=int, default=2, choices=range(1, 5))
+    ap.add_argument("--think-ms", type=float, default=0.0, help="pause between a reply and the user's next message")
+    ap.add_argument("--pay-with-stripe", action="store_true")
+    ap.add_argument("--stub-latency", type=float, default=0.05, help="seconds per Twilio/Stripe/SendGrid stub call")
+    ap.add_argument("--drain", type=float, default=60.0, help="seconds to wait for ticket delivery afterwards")
+    ap.add_argument("--max-p95-ms", type=float, help="fail if any step's p95 exceeds this")
+    ap.add_argument("--twilio-port", type=int, default=8095)
+    ap.add_argument("--provider-port", type=int, default=8096)
+    args = ap.parse_args()
+
+    setup_env()
+    os.environ["TWILIO_API_BASE"] = f"http://127.0.0.1:{args.twilio_port}"
+    os.environ["STRIPE_API_BASE"] = os.environ["SENDGRID_API_BASE"] = f"http://127.0.0.1:{args.provider_port}"
+    os.environ["OUTBOUND_RATE_PER_SECOND"] = os.environ["OUTBOUND_BURST"] = "1000000"
+    import httpx
+    from bench.provider_stubs import start_stub as start_provider_stub
+    from bench.twilio_stub import start_stub as start_twilio_stub
+    from app.core.db import SessionLocal, Booking
+    from app.core.executor import run_blocking
+    from app.core.settings import settings
+    from app.main import app, on_shutdown, on_startup
+    from app.services.payments import create_checkout_session
+
+    twilio, _ = start_twilio_stub(args.twilio_port, rate=1e6, burst=1e6, latency=args.stub_latency)
+    providers, _ = start_provider_stub(args.provider_port, latency=args.stub_latency)
+    on_startup()  # ASGITransport doesn't run lifespan events; starts the issue worker
+
+    latencies: dict[str, list[float]] = {}
+    failures: list[str] = []
+
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=app)
+        limits = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+            async def timed(step: str, request) -> httpx.Response:
+                t0 = time.perf_counter()
+                resp = await request
+                latencies.setdefault(step, []).append(time.perf_counter() - t0)
+                return resp
+
+            async def pay(phone: str, i: int):
+                session = await timed("stripe_checkout", run_blocking(
+                    create_checkout_session, 5800, f"Load test booking {i}", {"from": phone}))
+                payload = json.dumps({
+                    "id": f"evt_{uuid.uuid4().hex}",
+                    "object": "event",
+                    "type": "checkout.session.completed",
+                    "data": {"object": {"id": session.id, "object": "checkout.session", "metadata": {"from": phone}}},
+                })
+                resp = await timed("stripe_webhook", client.post("/stripe/webhook", content=payload, headers={
+                    "content-type": "application/json",
+                    "stripe-signature": stripe_signature(payload, settings.STRIPE_WEBHOOK_SECRET),
+                }))
+                if resp.status_code != 200:
+                    failures.append(f"{phone}: stripe webhook {resp.status_code} {resp.text[:120]}")
+
+            async def converse(i: int):
+                phone = f"+1666{i:07d}"
+                async with limits:
+                    reply = ""
+                    for step, text in conversation_script(i, args.passengers, args.pay_with_stripe):
+                        form = {
+                            "MessageSid": "SM" + uuid.uuid4().hex,
+                            "AccountSid": settings.TWILIO_ACCOUNT_SID,
+                            "From": f"whatsapp:{phone}",
+                            "To": settings.TWILIO_WHATSAPP_NUMBER,
+                            "Body": text,
+                            "NumMedia": "0",
+                            "ProfileName": f"Load {i}",
+                            "WaId": phone.lstrip("+"),
+                        }
+                        resp = await timed(step, client.post(
+                            "/whatsapp/webhook", content=urlencode(form),
+                            headers={"content-type": "application/x-www-form-urlencoded"}))
+                        if resp.status_code != 200:
+                            failures.append(f"{phone} {step}: HTTP {resp.status_code} {resp.text[:120]}")
+                            return
+                        reply = resp.text
+                        if args.think_ms:
+                            await asyncio.sleep(args.think_ms / 1000)
+                    if args.pay_with_stripe:
+                        await pay(phone, i)
+                    elif "Booking confirmed" not in reply:
+                        failures.append(f"{phone}: not booked, last reply {reply[:160]!r}")
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(converse(i) for i in range(args.conversations)))
+            return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    elapsed = asyncio.run(run())
+
+    def booking_counts() -> tuple[int, int]:
+        db = SessionLocal()
+        try:
+            total = db.query(Booking).count()
+            issued = db.query(Booking).filter(Booking.payment_status.in_(("issued", "paid"))).count()
+            return total, issued
+        finally:
+            db.close()
+
+    bookings, _ = booking_counts()
+    deadline = time.monotonic() + args.drain
+    while True:
+        _, issued = booking_counts()
+        if issued >= bookings or time.monotonic() >= deadline:
+            break
+        time.sleep(0.5)
+    drained = time.perf_counter() - started
+    on_shutdown()
+
+    messages = sum(len(v) for v in latencies.values())
+    print(f"conversations={args.conversations} concurrency={args.concurrency} passengers={args.passengers} "
+          f"payment={'stripe' if args.pay_with_stripe else 'confirm'} stub_latency={args.stub_latency}s")
+    print(f"requests={messages} elapsed={elapsed:.2f}s throughput={messages / elapsed:.1f} req/s")
+    print(f"{'step':<18}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    slow = []
+    order = [step for step, _ in conversation_script(0, args.passengers, args.pay_with_stripe)]
+    for step in sorted(latencies, key=lambda s: order.index(s) if s in order else len(order)):
+        values = sorted(latencies[step])
+        p95 = percentile(values, 95) * 1000
+        print(f"{step:<18}{len(values):>7}{percentile(values, 50) * 1000:>10.1f}{p95:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}")
+        if args.max_p95_ms is not None and p95 > args.max_p95_ms:
+            slow.append(f"{step} p95 {p95:.1f}ms > {args.max_p95_ms}ms")
+    done = "paid" if args.pay_with_stripe else "issued"
+    print(f"bookings={bookings} bookings/s={bookings / elapsed:.1f} {done}={issued} "
+          f"({drained:.1f}s after the first message)")
+    print(f"stubs: twilio={twilio.state.stats} stripe/sendgrid={providers.state.stats}")
+
+    problems = failures[:]
+    if bookings < args.conversations:
+        problems.append(f"{args.conversations - bookings} conversations did not book")
+    if issued < bookings:
+        problems.append(f"{bookings - issued} bookings not issued within --drain")
+    problems += slow
+    if problems:
+        for p in problems[:20]:
+            print(f"FAIL {p}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
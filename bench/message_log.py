@@ -0,0 +1,105 @@
+"""
+Message log writes: one INSERT + commit per message (what logging on the
+request path would cost) vs the buffered writer, measured as the time a
+caller spends per message and rows/second reaching message_logs. Then a burst
+bigger than the buffer checks that overflow is dropped and counted, not blocked.
+
+    python -m bench.message_log --messages 20000 --threads 8
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--users", type=int, default=1000)
+    args = ap.parse_args()
+
+    setup_env()
+    from app.core.db import SessionLocal, MessageLog, User, init_db
+    from app.services.message_log import MessageLogWriter
+
+    init_db()
+    db = SessionLocal()
+    db.add_all([User(whatsapp_number=f"+1555{i:07d}") for i in range(args.users)])
+    db.commit()
+    db.close()
+
+    def count() -> int:
+        db = SessionLocal()
+        try:
+            return db.query(MessageLog).count()
+        finally:
+            db.close()
+
+    def drive(log_one) -> tuple[float, list[float]]:
+        per_thread = args.messages // args.threads
+        latencies: list[float] = []
+        lock = threading.Lock()
+
+        def worker(n):
+            mine = []
+            for i in range(per_thread):
+                t = time.perf_counter()
+                log_one(f"+1555{(n * per_thread + i) % args.users:07d}", f"message {i} from worker {n}")
+                mine.append(time.perf_counter() - t)
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - t0, latencies
+
+    def direct(phone, body):
+        db = SessionLocal()
+        try:
+            user = db.query(User.id).filter(User.whatsapp_number == phone).first()
+            db.add(MessageLog(user_id=user.id if user else None, direction="in", body=body, meta={"phone": phone}))
+            db.commit()
+        finally:
+            db.close()
+
+    def report(name, elapsed, latencies, rows):
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{name:<9} caller p50={statistics.median(latencies) * 1e6:8.1f}us p99={p99 * 1e6:8.1f}us "
+              f"rows/s={rows / elapsed:9.0f}")
+
+    before = count()
+    elapsed, latencies = drive(direct)
+    report("direct", elapsed, latencies, count() - before)
+
+    writer = MessageLogWriter(batch_size=500, flush_seconds=0.5, max_buffer=100_000)
+    before = count()
+    t0 = time.perf_counter()
+    _, latencies = drive(lambda phone, body: writer.record("in", phone, body))
+    writer.stop()
+    elapsed = time.perf_counter() - t0
+    report("buffered", elapsed, latencies, count() - before)
+    print(f"          {writer.stats}")
+
+    small = MessageLogWriter(batch_size=500, flush_seconds=60, max_buffer=1000)
+    t0 = time.perf_counter()
+    for i in range(5000):
+        small.record("out", "+15550000000", f"burst {i}")
+    burst = time.perf_counter() - t0
+    small.stop()
+    dropped = small.stats["dropped"]
+    print(f"overflow  5000 records into a 1000-row buffer in {burst * 1e3:.1f}ms: "
+          f"written={small.stats['written']} dropped={dropped}")
+    if small.stats["written"] + dropped != 5000 or dropped == 0:
+        raise SystemExit("FAIL: overflow rows were neither written nor counted as dropped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cost of recording a latency: the per-thread-shard Histogram in
+app/core/metrics.py vs a single lock-protected dict (how dispatch used to
+keep step timings), from 1 and --threads threads. Also checks the
+sharded totals add up and times a /metrics render.
+
+    python -m bench.metrics --threads 16 --ops 200000
+"""
+import argparse
+import threading
+import time
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--ops", type=int, default=200_000, help="observations per thread")
+    args = ap.parse_args()
+
+    setup_env()
+    from app.core.metrics import Histogram, render_metrics
+
+    steps = ["source", "destination", "date", "time", "flights", "details", "seats", "confirm"]
+    histogram = Histogram("bench_step_seconds", "bench", ("step",))
+    lock = threading.Lock()
+    locked: dict[str, list[float]] = {}
+
+    def locked_observe(seconds, step):
+        with lock:
+            stats = locked.setdefault(step, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def run(observe, threads: int) -> float:
+        def worker(n):
+            for i in range(args.ops):
+                observe(0.0001 * (i % 50), steps[(n + i) % len(steps)])
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        t0 = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        return time.perf_counter() - t0
+
+    for threads in (1, args.threads):
+        for name, observe in (("locked dict", locked_observe), ("sharded", histogram.observe)):
+            elapsed = run(observe, threads)
+            n = threads * args.ops
+            print(f"{name:<12} threads={threads:<3} {elapsed / n * 1e9:7.0f} ns/observe  {n / elapsed / 1e6:5.2f} M/s")
+
+    expected = (1 + args.threads) * args.ops
+    counted = sum(sum(row[:-1]) for row in histogram._merged().values())  # bucket counts; row[-1] is the sum
+    t0 = time.perf_counter()
+    text = render_metrics()
+    render_ms = (time.perf_counter() - t0) * 1e3
+    print(f"render: {len(text.splitlines())} lines in {render_ms:.2f}ms")
+    if counted != expected:
+        raise SystemExit(f"FAIL: histogram counted {counted} observations, expected {expected}")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Outbound WhatsApp blast against the local Twilio stub (bench/twilio_stub.py).
+
+Queues --messages notices from one sender number while the stub throttles at
+--stub-rate and fails a fraction of requests with 500, then reports delivery
+throughput, retries and dead letters. With the queue's rate matching the
+stub's, throttling should be rare and nothing should be dead-lettered:
+
+    python -m bench.outbound
+    python -m bench.outbound --queue-rate 100   # sender faster than Twilio allows: 429s + backoff
+"""
+import argparse
+import os
+import time
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=500)
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--stub-rate", type=float, default=50.0, help="per-sender messages/second the stub allows")
+    ap.add_argument("--queue-rate", type=float, default=50.0, help="OUTBOUND_RATE_PER_SECOND")
+    ap.add_argument("--latency", type=float, default=0.05, help="stub latency per request (seconds)")
+    ap.add_argument("--error-rate", type=float, default=0.05, help="fraction of stub responses that are 500s")
+    args = ap.parse_args()
+
+    setup_env()
+    os.environ["TWILIO_API_BASE"] = f"http://127.0.0.1:{args.port}"
+    os.environ["OUTBOUND_RATE_PER_SECOND"] = str(args.queue_rate)
+    os.environ["OUTBOUND_BURST"] = str(args.queue_rate)
+    os.environ["OUTBOUND_CONCURRENCY"] = "32"
+    from bench.twilio_stub import start_stub
+    from app.core.db import init_db, SessionLocal, OutboundDeadLetter
+    from app.services.outbound import outbound_stats, stop_outbound
+    from app.services.whatsapp_sender import queue_whatsapp_text
+
+    init_db()
+    stub, server = start_stub(args.port, rate=args.stub_rate, burst=args.stub_rate,
+                              latency=args.latency, error_rate=args.error_rate)
+
+    t0 = time.perf_counter()
+    futures = [queue_whatsapp_text(f"+1555{i:07d}", f"Schedule change #{i}: your flight now departs 10:15")
+               for i in range(args.messages)]
+    delivered = failed = 0
+    for fut in futures:
+        try:
+            fut.result()
+            delivered += 1
+        except Exception:
+            failed += 1
+    elapsed = time.perf_counter() - t0
+    stop_outbound()
+    server.should_exit = True
+
+    db = SessionLocal()
+    try:
+        dead = db.query(OutboundDeadLetter).count()
+    finally:
+        db.close()
+    stats = outbound_stats()
+    print(f"messages={args.messages} stub_rate={args.stub_rate}/s queue_rate={args.queue_rate}/s "
+          f"latency={args.latency}s error_rate={args.error_rate}")
+    print(f"delivered={delivered} failed={failed} elapsed={elapsed:.2f}s throughput={delivered / elapsed:.1f} msg/s")
+    print(f"retries={stats['retried']} stub={stub.state.stats} dead_letters={dead}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Local stand-ins for the Stripe and SendGrid APIs the app calls, for offline
+load tests: Stripe checkout session creation (POST /v1/checkout/sessions) and
+SendGrid mail send (POST /v3/mail/send), with optional added latency.
+Credentials are not checked.
+
+    python -m bench.provider_stubs --port 8096
+    STRIPE_API_BASE=http://127.0.0.1:8096 SENDGRID_API_BASE=http://127.0.0.1:8096 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+def create_stub_app(latency: float = 0.0) -> FastAPI:
+    stub = FastAPI(title="Stripe/SendGrid stub")
+    stub.state.stats = {"checkout_sessions": 0, "emails": 0}
+
+    @stub.post("/v1/checkout/sessions")
+    async def create_checkout_session(request: Request):
+        form = await request.form()
+        if latency:
+            await asyncio.sleep(latency)
+        stub.state.stats["checkout_sessions"] += 1
+        session_id = "cs_test_" + uuid.uuid4().hex
+        metadata = {k[len("metadata["):-1]: v for k, v in form.items() if k.startswith("metadata[")}
+        return JSONResponse({
+            "id": session_id,
+            "object": "checkout.session",
+            "mode": form.get("mode"),
+            "metadata": metadata,
+            "payment_status": "unpaid",
+            "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+        })
+
+    @stub.post("/v3/mail/send")
+    async def send_mail(request: Request):
+        await request.body()
+        if latency:
+            await asyncio.sleep(latency)
+        stub.state.stats["emails"] += 1
+        return Response(status_code=202, headers={"X-Message-Id": uuid.uuid4().hex})
+
+    @stub.get("/stats")
+    async def stats():
+        return stub.state.stats
+
+    return stub
+
+
+def start_stub(port: int = 8096, **options) -> tuple[FastAPI, uvicorn.Server]:
+    """Run the stub on a background thread; returns (app, server). Set server.should_exit to stop it."""
+    stub = create_stub_app(**options)
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="provider-stub", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return stub, server
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8096)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = ap.parse_args()
+    uvicorn.run(create_stub_app(args.latency), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+In-memory stand-in for the S3 object API (path-style PUT/GET/HEAD/DELETE), for
+exercising TICKET_STORAGE=s3 offline. Authentication is not checked.
+
+    python -m bench.s3_stub --port 9000
+    TICKET_STORAGE=s3 S3_BUCKET=tickets S3_ENDPOINT_URL=http://127.0.0.1:9000 \\
+        AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x S3_REGION=us-east-1 uvicorn app.main:app
+"""
+import argparse
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+_NOT_FOUND = ('<?xml version="1.0" encoding="UTF-8"?>'
+              "<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>")
+
+
+def create_stub_app() -> FastAPI:
+    stub = FastAPI(title="S3 stub")
+    stub.state.objects = {}  # (bucket, key) -> (data, etag, content_type, mtime)
+    lock = threading.Lock()
+
+    def _headers(obj) -> dict:
+        data, etag, content_type, mtime = obj
+        return {"ETag": etag, "Last-Modified": formatdate(mtime, usegmt=True), "Content-Type": content_type,
+                "Content-Length": str(len(data))}
+
+    @stub.put("/{bucket}/{key:path}")
+    async def put_object(bucket: str, key: str, request: Request):
+        data = await request.body()
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with lock:
+            stub.state.objects[(bucket, key)] = (data, etag, request.headers.get("content-type", "binary/octet-stream"),
+                                                 time.time())
+        return Response(status_code=200, headers={"ETag": etag})
+
+    @stub.api_route("/{bucket}/{key:path}", methods=["GET", "HEAD"])
+    async def get_object(bucket: str, key: str, request: Request):
+        obj = stub.state.objects.get((bucket, key))
+        if obj is None:
+            if request.method == "HEAD":
+                return Response(status_code=404)
+            return Response(_NOT_FOUND, status_code=404, media_type="application/xml")
+        headers = _headers(obj)
+        if request.method == "HEAD":
+            return Response(status_code=200, headers=headers)
+        return Response(obj[0], status_code=200, headers=headers)
+
+    @stub.delete("/{bucket}/{key:path}")
+    async def delete_object(bucket: str, key: str):
+        with lock:
+            stub.state.objects.pop((bucket, key), None)
+        return Response(status_code=204)
+
+    return stub
+
+
+def start_stub(port: int = 9000) -> tuple[FastAPI, uvicorn.Server]:
+    """Run the stub on a background thread; returns (app, server). Set server.should_exit to stop it."""
+    stub = create_stub_app()
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="s3-stub", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return stub, server
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=9000)
+    args = ap.parse_args()
+    uvicorn.run(create_stub_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
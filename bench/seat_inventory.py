@@ -0,0 +1,98 @@
+"""
+Seat inventory stress check: many threads holding, re-holding, releasing and
+confirming parties on one departure. Fails loudly if any seat is ever sold
+twice, then checks that the seat_assignments unique key rejects a second
+worker selling an already-sold seat.
+
+    python -m bench.seat_inventory --threads 64 --ops 2000
+"""
+import argparse
+import random
+import threading
+import time
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=64)
+    ap.add_argument("--ops", type=int, default=2000, help="operations per thread")
+    args = ap.parse_args()
+
+    from bench._env import setup_env
+    setup_env()
+    import pytz
+    from app.core.db import SessionLocal, User, init_db
+    from app.services.issuance import create_pending_booking
+    from app.services.seat_inventory import CAPACITY, SeatInventory, SeatUnavailable
+
+    inv = SeatInventory(hold_seconds=0.05, loader=lambda key: [])
+    key = "AI100@2030-01-15T09:30:00+05:30"
+    sold: dict[str, str] = {}
+    sold_lock = threading.Lock()
+    errors: list[str] = []
+    counts = {"hold": 0, "conflict": 0, "full": 0, "confirm": 0}
+
+    def worker(n: int):
+        rnd = random.Random(n)
+        holder = f"+1555{n:07d}"
+        for _ in range(args.ops):
+            party = rnd.randint(1, 4)
+            wanted = [f"{rnd.randint(5, 30)}{rnd.choice('ABCDEF')}" for _ in range(rnd.randint(0, party))]
+            try:
+                seats = inv.hold(key, holder, party, wanted)
+            except SeatUnavailable as e:
+                counts["full" if not e.seats else "conflict"] += 1
+                continue
+            counts["hold"] += 1
+            roll = rnd.random()
+            if roll < 0.1:
+                inv.confirm(key, holder, seats)
+                counts["confirm"] += 1
+                with sold_lock:
+                    for s in seats:
+                        if s in sold:
+                            errors.append(f"{s} sold to {sold[s]} and {holder}")
+                        sold[s] = holder
+            elif roll < 0.4:
+                inv.release(holder)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    total_ops = args.threads * args.ops
+    print(f"{total_ops} ops in {elapsed:.2f}s ({total_ops / elapsed:.0f} ops/s) {counts}")
+    print(f"sold {len(sold)}/{CAPACITY} seats, map says {CAPACITY - inv.available(key)} taken")
+    if errors:
+        raise SystemExit("DOUBLE ASSIGNMENT:\n" + "\n".join(errors[:20]))
+    assert len(sold) == CAPACITY - inv.available(key), "seat map disagrees with confirmed sales"
+
+    # Two workers with separate in-memory maps both sell 12A: the database must refuse the second
+    init_db()
+    db = SessionLocal()
+    user = User(whatsapp_number="+15550000001")
+    db.add(user)
+    db.commit()
+    flight = {"id": "AI100", "depart": "2030-01-15T09:30:00+05:30", "price": 5800}
+    session = {
+        "source_iata": "BOM", "dest_iata": "DEL", "travel_dt_iso": "2030-01-15T09:00:00+05:30",
+        "passengers": [{"name": "A", "email": "a@example.com"}], "assigned_seats": ["12A"],
+    }
+    tz = pytz.timezone("Asia/Kolkata")
+    create_pending_booking(db, user.id, user.whatsapp_number, session, flight, tz)
+    try:
+        create_pending_booking(db, user.id, user.whatsapp_number, session, flight, tz)
+    except SeatUnavailable as e:
+        print(f"second worker rejected by seat_assignments: {e}")
+    else:
+        raise SystemExit("DOUBLE ASSIGNMENT: database accepted 12A twice")
+    finally:
+        db.close()
+    print("ok: no seat assigned twice")
+
+
+if __name__ == "__main__":
+    main()
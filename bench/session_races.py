@@ -0,0 +1,102 @@
+"""
+Per-user ordering check: every user sends all their passenger details at once
+(the 'details' step, one passenger per message) while many users do the same.
+Exits non-zero if any session lost a passenger or recorded them out of order.
+
+    python -m bench.session_races --users 50 --passengers 4
+    python -m bench.session_races --unlocked       # without the per-phone locks, to see the lost updates
+    python -m bench.session_races --lease-only     # only the Redis lease, as if each message hit another worker
+
+Sessions go to Redis at --redis-url, or to an in-memory fakeredis with
+--fakeredis (pip install fakeredis); without either they stay in-process,
+where the store shares session dicts between threads and hides most races.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlencode
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--passengers", type=int, default=4, help="messages each user sends at once (1-4)")
+    ap.add_argument("--unlocked", action="store_true", help="disable conversation_turn/session_lock")
+    ap.add_argument("--lease-only", action="store_true", help="disable the in-process conversation_turn lock")
+    ap.add_argument("--redis-url")
+    ap.add_argument("--fakeredis", action="store_true")
+    args = ap.parse_args()
+
+    setup_env()
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    import httpx
+    import app.routers.whatsapp as wa
+    from app.core.db import init_db
+    from app.core.redis import get_session, session_backend, set_session
+    from app.main import app
+
+    init_db()
+    if args.fakeredis:
+        import fakeredis
+        import app.core.redis as sessions
+        import app.core.session_lock as locks
+        sessions._redis.client = locks._lease.client = fakeredis.FakeRedis()
+
+    @asynccontextmanager
+    async def _no_turn(phone):
+        yield
+
+    @contextmanager
+    def _no_lock(phone):
+        yield
+    if args.unlocked:
+        wa.conversation_turn, wa.session_lock = _no_turn, _no_lock
+    elif args.lease_only:
+        wa.conversation_turn = _no_turn
+
+    phones = [f"+1555{i:07d}" for i in range(args.users)]
+    for phone in phones:
+        set_session(phone, {"step": "details", "passengers_total": args.passengers, "passenger_index": 1,
+                            "passengers": []})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            async def send(phone, n):
+                body = urlencode({"From": f"whatsapp:{phone}", "Body": f"Pax {n}, pax{n}@example.com"})
+                r = await client.post("/whatsapp/webhook", content=body,
+                                      headers={"content-type": "application/x-www-form-urlencoded"})
+                r.raise_for_status()
+            t0 = time.perf_counter()
+            # Tasks start in creation order, so each user's messages arrive 1, 2, 3, ...
+            await asyncio.gather(*(send(p, n) for p in phones for n in range(1, args.passengers + 1)))
+            return time.perf_counter() - t0
+
+    elapsed = asyncio.run(run())
+    expected = [f"Pax {n}" for n in range(1, args.passengers + 1)]
+    lost = out_of_order = 0
+    for phone in phones:
+        names = [p["name"] for p in get_session(phone).get("passengers", [])]
+        if sorted(names) != expected:
+            lost += 1
+        elif names != expected and not args.lease_only:  # across workers only arrival order is defined
+            out_of_order += 1
+    total = args.users * args.passengers
+    locks = "off" if args.unlocked else "lease only" if args.lease_only else "on"
+    print(f"sessions={session_backend()} locks={locks} users={args.users} messages={total} "
+          f"elapsed={elapsed:.2f}s throughput={total / elapsed:.1f} msg/s")
+    print(f"sessions with lost passengers={lost} out of order={out_of_order}")
+    if lost or out_of_order:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
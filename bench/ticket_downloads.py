@@ -0,0 +1,68 @@
+"""
+Ticket download throughput through the app (in-process ASGI, no network).
+
+Renders --tickets PDFs, then fetches them concurrently: full GETs with the PDF
+LRU off, full GETs served from the LRU, conditional GETs answered 304, and
+range requests:
+
+    python -m bench.ticket_downloads
+"""
+import argparse
+import asyncio
+import time
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tickets", type=int, default=50)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    args = ap.parse_args()
+
+    setup_env()
+    import httpx
+    import app.services.ticket_store as store
+    from app.main import app
+    from app.services.ticket_pdf import generate_ticket_pdf
+
+    ids = []
+    for i in range(args.tickets):
+        ticket_id, *_ = generate_ticket_pdf({"name": f"Bench {i}", "pnr": "BENCH2", "source": "BOM", "dest": "DEL",
+                                                "flight": {}, "passengers": [{"name": f"Bench {i}", "seat": "12A"}]})
+        ids.append(ticket_id)
+
+    async def run(headers_for):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            sem = asyncio.Semaphore(args.concurrency)
+            sent = 0
+
+            async def one(n):
+                nonlocal sent
+                ticket_id = ids[n % len(ids)]
+                async with sem:
+                    r = await client.get(f"/tickets/{ticket_id}.pdf", headers=headers_for(ticket_id))
+                    sent += len(r.content)
+                    assert r.status_code in (200, 206, 304), r.status_code
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(n) for n in range(args.requests)))
+            return time.perf_counter() - t0, sent
+
+    etags = {t: f'"{store.load_ticket(t).digest}"' for t in ids}
+    cases = [
+        ("full GET, LRU off", 0, lambda t: {}),
+        ("full GET, LRU on", 64 * 1024 * 1024, lambda t: {}),
+        ("If-None-Match (304)", 64 * 1024 * 1024, lambda t: {"If-None-Match": etags[t]}),
+        ("Range 0-1023", 64 * 1024 * 1024, lambda t: {"Range": "bytes=0-1023"}),
+    ]
+    for label, max_bytes, headers_for in cases:
+        store._cache = store.TicketCache(max_bytes)
+        elapsed, sent = asyncio.run(run(headers_for))
+        print(f"{label:22s} {args.requests / elapsed:8.0f} req/s  {sent / elapsed / 1e6:6.1f} MB/s  "
+              f"cache={store.ticket_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
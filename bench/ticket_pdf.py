@@ -0,0 +1,48 @@
+"""
+Ticket PDF micro-benchmark: tickets/second and bytes per PDF.
+
+    python -m bench.ticket_pdf --iterations 200 --passengers 1 4 20
+"""
+import argparse
+import os
+import time
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=200)
+    ap.add_argument("--passengers", type=int, nargs="+", default=[1, 4, 20])
+    args = ap.parse_args()
+
+    setup_env()
+    from app.services.seat_inventory import seat_label
+    from app.services.ticket_pdf import generate_ticket_pdf
+
+    flight = {"flight_no": "AI 100", "airline": "Air India", "duration_min": 125, "price": 5800}
+    print(f"{'passengers':>10} {'tickets/s':>10} {'ms/ticket':>10} {'bytes/pdf':>10}")
+    for n in args.passengers:
+        info = {
+            "name": "Bench User",
+            "phone": "+15550000000",
+            "pnr": "BENCH2",
+            "source": "BOM",
+            "dest": "DEL",
+            "depart_at": "2030-01-15T09:30:00+05:30",
+            "flight": flight,
+            "passengers": [{"name": f"Passenger {i}", "email": f"p{i}@example.com", "seat": seat_label(i)}
+                           for i in range(n)],
+        }
+        generate_ticket_pdf(info, base_url="https://bench.local")  # warm template cache
+        sizes = []
+        t0 = time.perf_counter()
+        for _ in range(args.iterations):
+            _tid, path, *_ = generate_ticket_pdf(info, base_url="https://bench.local")
+            sizes.append(os.path.getsize(path))
+        elapsed = time.perf_counter() - t0
+        print(f"{n:>10} {args.iterations / elapsed:>10.1f} {elapsed / args.iterations * 1000:>10.2f} {sum(sizes) // len(sizes):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Ticket storage layouts: flat directory vs prefix-sharded, and the S3 backend
+against the local stand-in (bench/s3_stub.py, needs boto3).
+
+Writes --files small tickets per layout, then times random reads, a stat of
+missing ids and a listing of the largest directory:
+
+    python -m bench.ticket_storage --files 100000
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+
+from bench._env import setup_env
+
+
+def _run(label: str, storage, ids: list[str], payload: bytes, largest_dir):
+    t0 = time.perf_counter()
+    for ticket_id in ids:
+        storage.put(ticket_id, payload)
+    put_s = time.perf_counter() - t0
+    sample = random.sample(ids, min(2000, len(ids)))
+    t0 = time.perf_counter()
+    for ticket_id in sample:
+        storage.read(ticket_id)
+    read_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(len(sample)):
+        storage.stamp(uuid.uuid4().hex[:10])
+    miss_s = time.perf_counter() - t0
+    line = (f"{label:10s} put={len(ids) / put_s:8.0f}/s read={len(sample) / read_s:8.0f}/s "
+            f"miss={len(sample) / miss_s:8.0f}/s")
+    if largest_dir:
+        path = largest_dir()
+        t0 = time.perf_counter()
+        entries = len(os.listdir(path))
+        line += f" largest_dir={entries} entries listed in {(time.perf_counter() - t0) * 1e3:.2f} ms"
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=20000)
+    ap.add_argument("--s3-port", type=int, default=9000)
+    args = ap.parse_args()
+
+    workdir = setup_env()
+    from app.services.ticket_storage import LocalTicketStorage, S3TicketStorage
+
+    ids = [uuid.uuid4().hex[:10] for _ in range(args.files)]
+    payload = os.urandom(4096)
+
+    flat_root = os.path.join(workdir, "flat")
+    flat = LocalTicketStorage(flat_root, depth=0)
+    _run("flat", flat, ids, payload, lambda: flat_root)
+
+    sharded_root = os.path.join(workdir, "sharded")
+    sharded = LocalTicketStorage(sharded_root, depth=2)
+
+    def largest_shard():
+        leaves = (os.path.dirname(sharded.path(t)) for t in ids)
+        return max(set(leaves), key=lambda d: len(os.listdir(d)))
+    _run("sharded", sharded, ids, payload, largest_shard)
+
+    try:
+        import boto3  # noqa: F401
+    except ImportError:
+        print("s3         skipped (pip install boto3)")
+        return
+    from bench.s3_stub import start_stub
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    _, server = start_stub(args.s3_port)
+    s3 = S3TicketStorage("tickets", "tickets/", 2, f"http://127.0.0.1:{args.s3_port}", "us-east-1")
+    _run("s3 (stub)", s3, ids[:2000], payload, None)
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
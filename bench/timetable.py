@@ -0,0 +1,65 @@
+"""
+Timetable benchmark: schedule load time, array footprint, and searches/second
+against a linear scan over the same rows.
+
+    python -m bench.timetable --routes 5000 --per-day 6 --searches 20000
+"""
+import argparse
+import csv
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--routes", type=int, default=5000)
+    ap.add_argument("--per-day", type=int, default=6)
+    ap.add_argument("--searches", type=int, default=20000)
+    args = ap.parse_args()
+
+    from bench._env import setup_env
+    workdir = setup_env()
+    from app.services.timetable import Timetable, generate_schedule
+
+    path = os.path.join(workdir, "schedule.csv")
+    rows = generate_schedule(path, args.routes, args.per_day)
+    t0 = time.perf_counter()
+    tt = Timetable.load(path)
+    load_s = time.perf_counter() - t0
+    arrays = [tt.flight_no, tt.airline, tt.currency, tt.duration, tt.fare, tt.dep_min, tt.service]
+    footprint = sum(a.itemsize * len(a) for a in arrays)
+    print(f"services={rows} departures/week={len(tt.dep_min)} load={load_s:.2f}s arrays={footprint / 1024:.0f} KiB")
+
+    with open(path, newline="") as f:
+        raw = list(csv.DictReader(f))
+    routes = sorted({(r["origin"], r["dest"]) for r in raw})
+    rnd = random.Random(3)
+    base = datetime(2030, 1, 14)
+    queries = [(*rnd.choice(routes), base + timedelta(days=rnd.randrange(7), hours=rnd.randrange(24)))
+               for _ in range(args.searches)]
+
+    t0 = time.perf_counter()
+    for src, dst, dep in queries:
+        tt.search(src, dst, dep)
+    indexed = time.perf_counter() - t0
+
+    def scan(src, dst, dep):
+        wd, minute = str(dep.isoweekday()), dep.hour * 60 + dep.minute
+        hits = [r for r in raw if r["origin"] == src and r["dest"] == dst and wd in r["days"]]
+        return sorted(hits, key=lambda r: abs(int(r["depart"][:2]) * 60 + int(r["depart"][3:]) - minute))[:3]
+
+    n_scan = max(1, args.searches // 100)
+    t0 = time.perf_counter()
+    for src, dst, dep in queries[:n_scan]:
+        scan(src, dst, dep)
+    scanned = (time.perf_counter() - t0) / n_scan * args.searches
+
+    print(f"{'':<12} {'search/s':>12} {'us/search':>10}")
+    print(f"{'indexed':<12} {args.searches / indexed:>12.0f} {indexed / args.searches * 1e6:>10.1f}")
+    print(f"{'linear scan':<12} {args.searches / scanned:>12.0f} {scanned / args.searches * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
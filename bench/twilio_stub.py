@@ -0,0 +1,89 @@
+"""
+Local stand-in for the Twilio Messages API, for offline outbound load tests.
+
+Accepts POST /2010-04-01/Accounts/{sid}/Messages.json like Twilio does, rate
+limits per From number (429 + Retry-After, as Twilio throttles senders), and
+can inject latency and random 5xx responses:
+
+    python -m bench.twilio_stub --port 8099 --rate 20 --error-rate 0.05
+    TWILIO_API_BASE=http://127.0.0.1:8099 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_stub_app(rate: float = 20.0, burst: float = 20.0, latency: float = 0.0, error_rate: float = 0.0) -> FastAPI:
+    stub = FastAPI(title="Twilio stub")
+    stub.state.buckets = {}  # from -> [tokens, updated]
+    stub.state.stats = {"accepted": 0, "throttled": 0, "errors": 0}
+    stub.state.messages = []
+
+    @stub.post("/2010-04-01/Accounts/{sid}/Messages.json")
+    async def create_message(sid: str, request: Request):
+        form = await request.form()
+        if latency:
+            await asyncio.sleep(latency)
+        sender = form.get("From", "")
+        now = time.monotonic()
+        tokens, updated = stub.state.buckets.get(sender, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            stub.state.buckets[sender] = (tokens, now)
+            stub.state.stats["throttled"] += 1
+            wait = max(1, round((1 - tokens) / rate))
+            return JSONResponse({"code": 20429, "message": "Too Many Requests", "status": 429},
+                                status_code=429, headers={"Retry-After": str(wait)})
+        stub.state.buckets[sender] = (tokens - 1, now)
+        if random.random() < error_rate:
+            stub.state.stats["errors"] += 1
+            return JSONResponse({"code": 20500, "message": "Internal Server Error", "status": 500}, status_code=500)
+        stub.state.stats["accepted"] += 1
+        stub.state.messages.append((form.get("To"), form.get("Body")))
+        return JSONResponse({
+            "sid": "SM" + uuid.uuid4().hex,
+            "account_sid": sid,
+            "from": sender,
+            "to": form.get("To"),
+            "body": form.get("Body"),
+            "status": "queued",
+        }, status_code=201)
+
+    @stub.get("/stats")
+    async def stats():
+        return stub.state.stats
+
+    return stub
+
+
+def start_stub(port: int = 8099, **options) -> tuple[FastAPI, uvicorn.Server]:
+    """Run the stub on a background thread; returns (app, server). Set server.should_exit to stop it."""
+    stub = create_stub_app(**options)
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="twilio-stub", daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return stub, server
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--rate", type=float, default=20.0, help="messages/second allowed per From number")
+    ap.add_argument("--burst", type=float, default=20.0)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of accepted requests answered with 500")
+    args = ap.parse_args()
+    stub = create_stub_app(args.rate, args.burst, args.latency, args.error_rate)
+    uvicorn.run(stub, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
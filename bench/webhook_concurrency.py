@@ -0,0 +1,82 @@
+"""
+Concurrent /whatsapp/webhook throughput with a slow, stubbed Twilio API.
+
+Every conversation is seeded at the 'confirm' step, so each request does the
+full blocking path (DB, PDF render, Twilio send). Compare:
+
+    python -m bench.webhook_concurrency                 # blocking work on the thread pool
+    python -m bench.webhook_concurrency --inline        # old behaviour: blocking work on the event loop
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from bench._env import setup_env
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=64)
+    ap.add_argument("--twilio-latency", type=float, default=0.2, help="seconds per stubbed Twilio call")
+    ap.add_argument("--inline", action="store_true", help="run handlers directly on the event loop")
+    ap.add_argument("--stub-port", type=int, default=8099)
+    args = ap.parse_args()
+
+    setup_env()
+    # Twilio is the local stub (bench/twilio_stub.py) with no rate limit, just latency
+    os.environ["TWILIO_API_BASE"] = f"http://127.0.0.1:{args.stub_port}"
+    os.environ["OUTBOUND_RATE_PER_SECOND"] = os.environ["OUTBOUND_BURST"] = "1000000"
+    os.environ["OUTBOUND_CONCURRENCY"] = str(max(16, args.conversations))
+    import httpx
+    import app.routers.whatsapp as wa
+    from bench.twilio_stub import start_stub
+    from app.core.db import init_db
+    from app.core.redis import set_session
+    from app.main import app
+    from app.services.flight_search import mock_search
+
+    init_db()
+    start_stub(args.stub_port, rate=1e6, burst=1e6, latency=args.twilio_latency)
+    if args.inline:
+        async def _inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        wa.run_blocking = _inline
+
+    depart = (datetime.now() + timedelta(days=5)).replace(hour=9, minute=0, second=0, microsecond=0)
+    flights = mock_search("BOM", "DEL", depart)
+    phones = [f"+1555{i:07d}" for i in range(args.conversations)]
+    for phone in phones:
+        set_session(phone, {
+            "step": "confirm",
+            "source_iata": "BOM",
+            "dest_iata": "DEL",
+            "travel_dt_iso": depart.isoformat(),
+            "presented_flights": flights,
+            "selected_flight_id": flights[0]["id"],
+            "passengers": [{"name": "Bench User", "email": "bench@example.com"}],
+            "passengers_total": 1,
+        })
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(phone):
+                body = urlencode({"From": f"whatsapp:{phone}", "Body": "confirm"})
+                r = await client.post("/whatsapp/webhook", content=body,
+                                      headers={"content-type": "application/x-www-form-urlencoded"})
+                r.raise_for_status()
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(p) for p in phones))
+            return time.perf_counter() - t0
+
+    elapsed = asyncio.run(run())
+    mode = "inline (event loop)" if args.inline else "thread pool"
+    print(f"mode={mode} conversations={args.conversations} twilio_latency={args.twilio_latency}s")
+    print(f"elapsed={elapsed:.2f}s throughput={args.conversations / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
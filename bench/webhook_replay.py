@@ -0,0 +1,128 @@
+"""
+Replay check for webhook deduplication: the same Twilio message (one
+MessageSid) and the same Stripe event (one event id) are delivered many times
+at once, as providers do after a timeout. Exits non-zero unless each produced
+exactly one booking and every replay got the original response back.
+
+    python -m bench.webhook_replay --replays 20
+    python -m bench.webhook_replay --without-ids    # strip the ids to see what replays did before
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from bench._env import setup_env
+
+
+def stripe_signature(payload: str, secret: str) -> str:
+    t = int(time.time())
+    v1 = hmac.new(secret.encode(), f"{t}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={t},v1={v1}"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--replays", type=int, default=20, help="concurrent deliveries of each webhook")
+    ap.add_argument("--without-ids", action="store_true", help="send Twilio replays without a MessageSid")
+    ap.add_argument("--stub-port", type=int, default=8098)
+    args = ap.parse_args()
+
+    setup_env()
+    os.environ["TWILIO_API_BASE"] = f"http://127.0.0.1:{args.stub_port}"
+    os.environ["OUTBOUND_RATE_PER_SECOND"] = os.environ["OUTBOUND_BURST"] = "1000000"
+    import httpx
+    from bench.twilio_stub import start_stub
+    from app.core.db import SessionLocal, Booking, User, init_db
+    from app.core.idempotency import idempotency_stats
+    from app.core.redis import set_session
+    from app.core.settings import settings
+    from app.main import app
+    from app.services.flight_search import mock_search
+
+    init_db()
+    start_stub(args.stub_port, rate=1e6, burst=1e6, latency=0.05)
+
+    depart = (datetime.now() + timedelta(days=5)).replace(hour=9, minute=0, second=0, microsecond=0)
+    flights = mock_search("BOM", "DEL", depart)
+
+    def seed(phone: str):
+        set_session(phone, {
+            "step": "confirm",
+            "source_iata": "BOM",
+            "dest_iata": "DEL",
+            "travel_dt_iso": depart.isoformat(),
+            "presented_flights": flights,
+            "selected_flight_id": flights[0]["id"],
+            "passengers": [{"name": "Replay User", "email": "replay@example.com"}],
+            "passengers_total": 1,
+        })
+
+    def bookings_for(phone: str) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(Booking).join(User, User.id == Booking.user_id).filter(User.whatsapp_number == phone).count()
+        finally:
+            db.close()
+
+    twilio_phone, stripe_phone = "+15550000001", "+15550000002"
+    seed(twilio_phone)
+    seed(stripe_phone)
+    db = SessionLocal()
+    db.add(User(whatsapp_number=stripe_phone, email=None))
+    db.commit()
+    db.close()
+
+    twilio_body = {"From": f"whatsapp:{twilio_phone}", "Body": "confirm"}
+    if not args.without_ids:
+        twilio_body["MessageSid"] = "SMreplay0000000000000000000000001"
+    event = json.dumps({
+        "id": "evt_replay_1",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {"id": "cs_replay_1", "object": "checkout.session", "metadata": {"from": stripe_phone}}},
+    })
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            twilio = await asyncio.gather(*(
+                client.post("/whatsapp/webhook", content=urlencode(twilio_body),
+                            headers={"content-type": "application/x-www-form-urlencoded"})
+                for _ in range(args.replays)
+            ))
+            stripe = await asyncio.gather(*(
+                client.post("/stripe/webhook", content=event,
+                            headers={"content-type": "application/json",
+                                     "stripe-signature": stripe_signature(event, settings.STRIPE_WEBHOOK_SECRET)})
+                for _ in range(args.replays)
+            ))
+            return twilio, stripe
+
+    twilio, stripe = asyncio.run(run())
+    failures = []
+    for name, responses, phone in (("twilio", twilio, twilio_phone), ("stripe", stripe, stripe_phone)):
+        statuses = sorted({r.status_code for r in responses})
+        bodies = {r.content for r in responses}
+        count = bookings_for(phone)
+        print(f"{name}: {len(responses)} deliveries statuses={statuses} distinct_responses={len(bodies)} bookings={count}")
+        if count != 1:
+            failures.append(f"{name}: expected 1 booking, got {count}")
+        if statuses != [200] or len(bodies) != 1:
+            failures.append(f"{name}: replays did not all get the original response")
+    print(f"idempotency: {idempotency_stats()}")
+    if failures:
+        for f in failures:
+            print(f"FAIL {f}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
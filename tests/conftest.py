@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench._env import setup_env  # noqa: E402
+
+# Placeholder credentials and a throwaway SQLite database, before any app.* import
+setup_env()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Sessions, session leases and webhook idempotency on one in-memory fakeredis (pip install fakeredis)."""
+    fakeredis = pytest.importorskip("fakeredis")
+    import app.core.idempotency as idempotency
+    import app.core.redis as sessions
+    import app.core.session_lock as locks
+
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(sessions._redis, "client", client)
+    monkeypatch.setattr(locks._lease, "client", client)
+    monkeypatch.setattr(idempotency._idempotency.redis, "client", client)
+    monkeypatch.setattr(sessions, "_use_redis", True)
+    monkeypatch.setattr(sessions._breaker, "_open", False)
+    monkeypatch.setattr(sessions._breaker, "_failures", 0)
+    return client
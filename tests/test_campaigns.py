@@ -0,0 +1,123 @@
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytz
+
+from app.core.db import init_db, SessionLocal, Booking, Campaign, CampaignRecipient, User
+from app.services import campaigns
+from app.services.bookings import backfill_depart_at_utc
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    messages = []
+
+    def queue(to, body, media_url=None, dead_letter=True):
+        messages.append(to)
+        fut = Future()
+        fut.set_result({"sid": f"SM{len(messages)}"})
+        return fut
+
+    monkeypatch.setattr(campaigns, "queue_whatsapp_text", queue)
+    return messages
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _seed(db, flight_id: str, departures: list[datetime]) -> list[int]:
+    ids = []
+    for i, depart in enumerate(departures):
+        user = User(whatsapp_number=f"+1555{flight_id}{i:03d}")
+        db.add(user)
+        db.flush()
+        booking = Booking(user_id=user.id, flight_id=flight_id, source_iata="BOM", dest_iata="DEL",
+                          depart_at=depart, flight_meta={"passengers": [{"name": f"P{i}"}]})
+        db.add(booking)
+        db.flush()
+        ids.append(booking.id)
+    db.commit()
+    return ids
+
+
+def test_resume_never_resends_a_row_left_queued(db, sent):
+    ids = _seed(db, "AI201", [datetime(2025, 9, 3, 6, 0)] * 3)
+    campaign = campaigns.create_campaign(db, "delay", "AI201", date(2025, 9, 3), "Hi {name}")
+    # A crashed run recorded the first recipient as queued, then died before the result was stored
+    db.add(CampaignRecipient(campaign_id=campaign.id, booking_id=ids[0], phone="+1555AI201000", status="queued"))
+    db.commit()
+
+    done = campaigns.run_campaign(campaign.id)
+
+    assert sent == ["+1555AI201001", "+1555AI201002"]
+    assert (done.sent, done.failed) == (2, 0)
+    statuses = dict(db.query(CampaignRecipient.booking_id, CampaignRecipient.status)
+                    .filter(CampaignRecipient.campaign_id == campaign.id))
+    assert statuses == {ids[0]: "unknown", ids[1]: "sent", ids[2]: "sent"}
+
+    db.query(Campaign).filter(Campaign.id == campaign.id).update({"last_booking_id": 0})
+    db.commit()
+    campaigns.run_campaign(campaign.id)
+    assert len(sent) == 2
+
+
+def test_early_morning_local_departure_is_on_its_local_day(db, sent):
+    # 00:30 and 23:30 IST on 3 Sep are 2 Sep 19:00 and 3 Sep 18:00 UTC; 4 Sep 00:30 IST is not included
+    tz = pytz.timezone("Asia/Kolkata")
+    _seed(db, "AI202", [tz.localize(datetime(2025, 9, 3, 0, 30)), tz.localize(datetime(2025, 9, 3, 23, 30)),
+                        tz.localize(datetime(2025, 9, 4, 0, 30))])
+    campaign = campaigns.create_campaign(db, "delay", "AI202", date(2025, 9, 3), "Hi {name}", timezone="Asia/Kolkata")
+
+    assert campaigns.departure_window(campaign) == (datetime(2025, 9, 2, 18, 30), datetime(2025, 9, 3, 18, 30))
+    assert campaigns.run_campaign(campaign.id).sent == 2
+    assert sent == ["+1555AI202000", "+1555AI202001"]
+
+
+def test_depart_at_is_stored_as_naive_utc(db):
+    (booking_id,) = _seed(db, "AI203", [pytz.timezone("Asia/Kolkata").localize(datetime(2025, 9, 3, 2, 0))])
+    db.expire_all()
+    assert db.get(Booking, booking_id).depart_at == datetime(2025, 9, 2, 20, 30)
+
+
+def test_backfill_converts_local_wall_times_to_utc(db):
+    (booking_id,) = _seed(db, "AI204", [datetime(2025, 9, 3, 2, 0)])
+    # An older row: local wall time in depart_at, the aware ISO time in flight_meta
+    db.bulk_update_mappings(Booking, [{"id": booking_id, "flight_meta": {"depart_at_iso": "2025-09-03T02:00:00+05:30"}}])
+    db.commit()
+
+    assert backfill_depart_at_utc(db) >= 1
+    db.expire_all()
+    assert db.get(Booking, booking_id).depart_at == datetime(2025, 9, 2, 20, 30)
+
+
+def test_unknown_timezone_is_rejected(db):
+    with pytest.raises(campaigns.CampaignError):
+        campaigns.create_campaign(db, "delay", "AI205", date(2025, 9, 3), "Hi {name}", timezone="Mars/Olympus")
+
+
+def test_only_one_of_two_claims_wins(db):
+    campaign = campaigns.create_campaign(db, "delay", "AI206", date(2025, 9, 3), "Hi {name}")
+    assert campaigns.claim_campaign(campaign.id)
+    assert not campaigns.claim_campaign(campaign.id)
+    with pytest.raises(campaigns.CampaignError):
+        campaigns.run_campaign(campaign.id)
+
+
+def test_stale_running_campaign_can_be_resumed(db, sent):
+    _seed(db, "AI207", [datetime(2025, 9, 3, 6, 0)])
+    campaign = campaigns.create_campaign(db, "delay", "AI207", date(2025, 9, 3), "Hi {name}")
+    # Its runner died mid-send and stopped renewing the claim
+    db.query(Campaign).filter(Campaign.id == campaign.id).update(
+        {"status": "running", "claimed_at": datetime.utcnow() - campaigns._LEASE - timedelta(seconds=1)})
+    db.commit()
+
+    done = campaigns.run_campaign(campaign.id)
+    assert (done.status, done.sent) == ("done", 1)
@@ -0,0 +1,46 @@
+import pytest
+
+from app.services.iata import suggest_airports, to_iata
+
+
+@pytest.mark.parametrize("query, iata", [
+    ("Mumbai", "BOM"),
+    ("bom", "BOM"),
+    ("Bombay", "BOM"),
+    ("delhi", "DEL"),
+    ("New Delhi", "DEL"),
+    ("Bangalore", "BLR"),
+    ("Goa", "GOI"),
+    ("दिल्ली", "DEL"),
+    # Filler words around the name
+    ("Delhi airport", "DEL"),
+    ("Goa airport", "GOI"),
+    ("Bangalore airport", "BLR"),
+    ("Hyderabad airport", "HYD"),
+    ("Mumbai city", "BOM"),
+    ("delhi ncr", "DEL"),
+    ("Goa India", "GOI"),
+    ("Goa, India", "GOI"),
+    # A prefix only one airport has
+    ("Mumb", "BOM"),
+    ("Bangal", "BLR"),
+    # A misspelling with one clear candidate
+    ("Mumbay", "BOM"),
+    ("Dehli", "DEL"),
+    ("Hydrabad", "HYD"),
+    ("Banglore", "BLR"),
+    ("Dehli airport", "DEL"),
+])
+def test_resolves_unambiguous_names(query, iata):
+    assert to_iata(query) == iata
+
+
+@pytest.mark.parametrize("query", ["Na", "Ba", "ch", "in", "Ban", "airport", "Calcuta", "Xyzzy", ""])
+def test_ambiguous_or_unknown_input_is_not_guessed(query):
+    # "Calcuta" is about as close to Calicut (CCJ) as to Calcutta (CCU)
+    assert to_iata(query) is None
+
+
+def test_unresolved_input_still_gets_suggestions():
+    assert [s.airport.iata for s in suggest_airports("Calcuta", 3)][:2] == ["CCU", "CCJ"]
+    assert "BLR" in [s.airport.iata for s in suggest_airports("Ban", 3)]
@@ -0,0 +1,55 @@
+import threading
+
+from app.core.db import init_db, SessionLocal, User
+from app.services import identity
+from app.services.identity import resolve_identity
+
+
+def test_concurrent_first_messages_share_one_user():
+    init_db()
+    phone = "+15550600001"
+    start = threading.Barrier(8)
+    found, errors = [], []
+
+    def first_message():
+        db = SessionLocal()
+        try:
+            start.wait()
+            found.append(resolve_identity(phone, lambda: db).user_id)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=first_message) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert len(set(found)) == 1
+
+
+def test_losing_insert_reselects_the_existing_user(monkeypatch):
+    init_db()
+    phone = "+15550600002"
+    db = SessionLocal()
+    try:
+        db.add(User(whatsapp_number=phone))
+        db.commit()
+        existing = db.query(User.id).filter(User.whatsapp_number == phone).scalar()
+        # The SELECT ran before the other message's INSERT committed
+        real_query = db.query
+        calls = []
+
+        def query(*args):
+            q = real_query(*args)
+            if not calls:
+                calls.append(1)
+                return q.filter(False)
+            return q
+        monkeypatch.setattr(db, "query", query)
+        identity.invalidate_identity(phone)
+        assert resolve_identity(phone, lambda: db).user_id == existing
+    finally:
+        db.close()
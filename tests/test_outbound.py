@@ -0,0 +1,134 @@
+import asyncio
+import time
+from concurrent.futures import Future
+
+import httpx
+import pytest
+
+from app.core.db import init_db, SessionLocal, OutboundDeadLetter
+from app.services import outbound, whatsapp_sender
+from app.services.outbound import OutboundError, OutboundSender, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(outbound, "_backoff", lambda attempt: 0.0)
+
+
+def _sender(handler, **kwargs) -> OutboundSender:
+    opts = dict(rate=1000.0, burst=1000.0, concurrency=4, max_attempts=3, queue_size=100, timeout=5.0)
+    opts.update(kwargs)
+    return OutboundSender("http://twilio.test", "ACtest", "token", transport=httpx.MockTransport(handler), **opts)
+
+
+def _dead_letters(to: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(OutboundDeadLetter).filter(OutboundDeadLetter.to_number == to).count()
+    finally:
+        db.close()
+
+
+def test_2xx_counts_as_sent_whatever_the_body():
+    bodies = iter([httpx.Response(201, json={"sid": "SM1"}), httpx.Response(201, text="<ok/>"),
+                   httpx.Response(200, json=["unexpected"])])
+    sender = _sender(lambda request: next(bodies), concurrency=1)
+    try:
+        results = [sender.enqueue(f"whatsapp:+1555040000{i}", "hi").result(5) for i in range(3)]
+    finally:
+        sender.stop()
+    assert results == [{"sid": "SM1"}, {}, {}]
+    assert sender.stats["sent"] == 3
+
+
+def test_5xx_and_429_are_retried():
+    statuses = iter([500, 429, 201])
+    sender = _sender(lambda request: httpx.Response(next(statuses), headers={"Retry-After": "0"}, json={"sid": "SM2"}))
+    try:
+        assert sender.enqueue("whatsapp:+15550400010", "hi").result(5) == {"sid": "SM2"}
+    finally:
+        sender.stop()
+    assert sender.stats["retried"] == 2
+
+
+def test_rejected_message_is_dead_lettered_once():
+    init_db()
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"message": "invalid To"})
+
+    sender = _sender(handler)
+    try:
+        with pytest.raises(OutboundError) as e:
+            sender.enqueue("whatsapp:+15550400020", "hi").result(5)
+        with pytest.raises(OutboundError):
+            sender.enqueue("whatsapp:+15550400021", "hi", dead_letter=False).result(5)
+    finally:
+        sender.stop()
+    assert e.value.status == 400
+    assert len(calls) == 2  # a 4xx is not retried
+    assert _dead_letters("whatsapp:+15550400020") == 1
+    assert _dead_letters("whatsapp:+15550400021") == 0
+
+
+def test_exhausted_retries_are_dead_lettered():
+    init_db()
+    sender = _sender(lambda request: httpx.Response(503), max_attempts=2)
+    try:
+        with pytest.raises(OutboundError):
+            sender.enqueue("whatsapp:+15550400030", "hi").result(5)
+    finally:
+        sender.stop()
+    assert sender.stats["dead_lettered"] == 1
+    assert _dead_letters("whatsapp:+15550400030") == 1
+
+
+def test_token_bucket_paces_to_its_rate():
+    bucket = TokenBucket(rate=20.0, burst=2)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    started = time.monotonic()
+    asyncio.run(take(6))
+    # 2 from the burst, then 4 at 20/s
+    assert time.monotonic() - started >= 0.18
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 10), (-1, 10), (10, 0)])
+def test_token_bucket_rejects_zero_rate(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucket(rate, burst)
+
+
+def test_send_whatsapp_text_gives_up_after_the_timeout(monkeypatch):
+    stuck = Future()
+    monkeypatch.setattr(whatsapp_sender, "queue_message", lambda *args, **kwargs: stuck)
+    monkeypatch.setattr(whatsapp_sender.settings, "OUTBOUND_TIMEOUT", 0.05)
+    monkeypatch.setattr(whatsapp_sender, "_WAIT_MARGIN_SECONDS", 0.05)
+    with pytest.raises(OutboundError):
+        whatsapp_sender.send_whatsapp_text("+15550400040", "hi")
+    assert stuck.cancelled()  # the sender will not attempt it any more
+
+
+def test_withdrawn_message_is_not_sent():
+    init_db()
+    sent = []
+
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        sent.append(request)
+        return httpx.Response(201, json={"sid": "SM3"})
+
+    sender = _sender(handler, concurrency=1)
+    try:
+        first = sender.enqueue("whatsapp:+15550400050", "hi")
+        second = sender.enqueue("whatsapp:+15550400051", "hi", dead_letter=False)
+        assert second.cancel()  # its caller timed out while it was still queued
+        assert first.result(5) == {"sid": "SM3"}
+    finally:
+        sender.stop()
+    assert len(sent) == 1
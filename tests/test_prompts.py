@@ -0,0 +1,16 @@
+import pytest
+
+from app.conversation.prompts import flight_choice_errors, flight_list
+
+
+def _flights(n: int) -> list[dict]:
+    return [{"flight_no": f"AI {100 + i}", "depart": "2030-01-15T09:30:00", "arrive": "2030-01-15T11:35:00",
+             "duration_min": 125, "price": 5800 + i} for i in range(n)]
+
+
+@pytest.mark.parametrize("n, choices", [(1, "1"), (2, "1 or 2"), (3, "1, 2, or 3"), (5, "1, 2, 3, 4, or 5")])
+def test_flight_errors_match_list_footer(n, choices):
+    assert flight_list(_flights(n)).endswith(f"Reply with {choices} to select a flight.")
+    not_a_number, out_of_range = flight_choice_errors(n)
+    assert f"reply with {choices} to pick" in not_a_number
+    assert out_of_range.endswith(f"Reply with {choices}.")
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from app.services.seat_inventory import (
+    CAPACITY, SeatInventory, SeatUnavailable, _auto_assign, _bits, seat_index, seat_label,
+)
+
+
+def _mask(*seats: str) -> int:
+    mask = 0
+    for s in seats:
+        mask |= 1 << seat_index(s)
+    return mask
+
+
+def _labels(mask: int) -> list[str]:
+    return [seat_label(i) for i in _bits(mask)]
+
+
+def _inventory(confirmed=()) -> SeatInventory:
+    return SeatInventory(hold_seconds=60, loader=lambda key: list(confirmed))
+
+
+def test_auto_assign_front_row_same_side():
+    assert _labels(_auto_assign(0, 3)) == ["5A", "5B", "5C"]
+
+
+def test_auto_assign_skips_taken_seats():
+    assert _labels(_auto_assign(_mask("5A"), 2)) == ["5B", "5C"]
+
+
+def test_auto_assign_crosses_aisle_only_when_needed():
+    assert _labels(_auto_assign(0, 4)) == ["5A", "5B", "5C", "5D"]
+    # 5B-5D would be a block too, but it crosses the aisle
+    assert _labels(_auto_assign(_mask("5A"), 3)) == ["5D", "5E", "5F"]
+
+
+def test_auto_assign_sits_next_to_party_member():
+    seat = _labels(_auto_assign(_mask("7D"), 1, near=_mask("7D")))
+    assert seat in (["7C"], ["7E"])
+
+
+def test_auto_assign_falls_back_to_scattered_seats():
+    # Every other seat taken: no two adjacent seats are left anywhere
+    taken = 0
+    for i in range(0, CAPACITY, 2):
+        taken |= 1 << i
+    picked = _auto_assign(taken, 2)
+    assert not picked & taken
+    assert _labels(picked) == ["5B", "5D"]
+
+
+def test_auto_assign_raises_when_full():
+    with pytest.raises(SeatUnavailable) as e:
+        _auto_assign((1 << CAPACITY) - 2, 2)
+    assert e.value.seats == []
+
+
+def test_hold_never_hands_out_confirmed_seats():
+    inventory = _inventory(confirmed=["5A", "5B", "5C"])
+    assert inventory.hold("AI100@x", "+1", 3) == ["5D", "5E", "5F"]
+
+
+def test_requested_seat_held_by_someone_else_conflicts():
+    inventory = _inventory()
+    assert inventory.hold("AI100@x", "+1", 1, ["12A"]) == ["12A"]
+    with pytest.raises(SeatUnavailable) as e:
+        inventory.hold("AI100@x", "+2", 2, ["12A", "12B"])
+    assert e.value.seats == ["12A"]
+
+
+def test_concurrent_requests_for_one_seat_only_one_wins():
+    inventory = _inventory()
+    start = threading.Barrier(20)
+    won, lost = [], []
+
+    def attempt(n):
+        start.wait()
+        try:
+            won.append(inventory.hold("AI100@x", f"+{n}", 1, ["12A"]))
+        except SeatUnavailable:
+            lost.append(n)
+
+    threads = [threading.Thread(target=attempt, args=(n,)) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert won == [["12A"]]
+    assert len(lost) == 19
+
+
+def test_concurrent_auto_holds_never_overlap():
+    inventory = _inventory()
+    start = threading.Barrier(40)
+    held: dict[int, list[str]] = {}
+
+    def attempt(n):
+        start.wait()
+        held[n] = inventory.hold("AI100@x", f"+{n}", 3)
+
+    threads = [threading.Thread(target=attempt, args=(n,)) for n in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seats = [s for group in held.values() for s in group]
+    assert len(seats) == 120
+    assert len(set(seats)) == 120
+    assert inventory.available("AI100@x") == CAPACITY - 120
+
+
+def test_released_hold_frees_its_seats():
+    inventory = _inventory()
+    inventory.hold("AI100@x", "+1", 1, ["12A"])
+    inventory.release("+1")
+    assert inventory.hold("AI100@x", "+2", 1, ["12A"]) == ["12A"]
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import app.core.redis as sessions
+from app.core.local_store import LocalSessionStore
+from app.core.redis import clear_session, get_session, session_backend, session_key, set_session
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """A fakeredis server behind the session store; set .connected = False to make every call fail."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(sessions._redis, "client", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(sessions, "_use_redis", True)
+    monkeypatch.setattr(sessions._breaker, "_open", False)
+    monkeypatch.setattr(sessions._breaker, "_failures", 0)
+    monkeypatch.setattr(sessions._breaker, "threshold", 2)
+    monkeypatch.setattr(sessions._breaker, "interval", 0.01)
+    yield server
+    server.connected = True
+    _wait_closed()
+
+
+def _wait_closed(timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while sessions._breaker.is_open and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_opens_after_threshold_and_serves_from_the_local_store(server):
+    set_session("+15550300001", {"step": "source"})
+    server.connected = False
+
+    # First failure: still routed to Redis, answered from the local store
+    assert get_session("+15550300001") == {}
+    assert session_backend() == "redis"
+    set_session("+15550300001", {"step": "dest", "source_iata": "BOM"})
+    assert session_backend() == "local"
+    assert get_session("+15550300001") == {"step": "dest", "source_iata": "BOM"}
+
+
+def test_stays_open_while_the_health_check_fails(server):
+    server.connected = False
+    set_session("+15550300002", {"step": "source"})
+    set_session("+15550300002", {"step": "dest"})
+    assert session_backend() == "local"
+    time.sleep(0.1)  # several probe intervals
+    assert session_backend() == "local"
+    assert get_session("+15550300002") == {"step": "dest"}
+
+
+def test_closes_and_replays_outage_writes_once_redis_is_back(server):
+    client = sessions._redis.client
+    set_session("+15550300003", {"step": "source"})
+    set_session("+15550300004", {"step": "source"})
+    server.connected = False
+    set_session("+15550300003", {"step": "dates", "source_iata": "BOM", "dest_iata": "DEL"})
+    clear_session("+15550300004")
+    assert session_backend() == "local"
+
+    server.connected = True
+    _wait_closed()
+
+    assert session_backend() == "redis"
+    assert get_session("+15550300003") == {"step": "dates", "source_iata": "BOM", "dest_iata": "DEL"}
+    assert not client.exists(session_key("+15550300004"))
+    assert sessions._local.pop_dirty() == {}
+
+
+def test_failed_replay_keeps_the_dirty_sessions():
+    local = LocalSessionStore(ttl=60, sweep_seconds=3600)
+    local.set("+15550300005", {"step": "dest"}, dirty=True)
+    dirty = local.pop_dirty()
+    assert local.pop_dirty() == {}
+    local.restore_dirty(dirty)
+    assert local.pop_dirty() == {"+15550300005": {"step": "dest"}}
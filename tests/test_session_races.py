@@ -0,0 +1,38 @@
+import asyncio
+from urllib.parse import urlencode
+
+import httpx
+
+from app.core.db import init_db
+from app.core.redis import get_session, session_backend, set_session
+from app.main import app
+
+_USERS = 8
+_PASSENGERS = 4
+
+
+def test_same_phone_messages_keep_every_passenger_in_order(fake_redis):
+    init_db()
+    phones = [f"+1555020{i:04d}" for i in range(_USERS)]
+    for phone in phones:
+        set_session(phone, {"step": "details", "passengers_total": _PASSENGERS, "passenger_index": 1,
+                            "passengers": []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+            async def send(phone, n):
+                body = urlencode({"From": f"whatsapp:{phone}", "Body": f"Pax {n}, pax{n}@example.com"})
+                r = await client.post("/whatsapp/webhook", content=body,
+                                      headers={"content-type": "application/x-www-form-urlencoded"})
+                r.raise_for_status()
+            # Tasks start in creation order, so each user's messages arrive 1, 2, 3, ...
+            await asyncio.gather(*(send(p, n) for p in phones for n in range(1, _PASSENGERS + 1)))
+
+    asyncio.run(run())
+
+    assert session_backend() == "redis"
+    expected = [f"Pax {n}" for n in range(1, _PASSENGERS + 1)]
+    for phone in phones:
+        assert [p["name"] for p in get_session(phone)["passengers"]] == expected
+    # Each session went through the Redis hash (delta writes), not the local fallback
+    assert all(fake_redis.exists(f"wa:s:{phone}") for phone in phones)
@@ -0,0 +1,15 @@
+import pytest
+
+from app.services.ticket_pdf import assign_ticket_refs
+
+
+def test_keeps_inventory_seats_and_given_refs():
+    info = assign_ticket_refs({"pnr": "abc234", "passengers": [{"name": "A", "seat": "12a"}, {"name": "B", "seat": "12B"}]})
+    assert info["pnr"] == "abc234"
+    assert [p["seat"] for p in info["passengers"]] == ["12A", "12B"]
+
+
+def test_refuses_passengers_without_a_seat():
+    # Seats must come from the seat inventory; a random pick could double-book
+    with pytest.raises(ValueError):
+        assign_ticket_refs({"pnr": "ABC234", "passengers": [{"name": "A", "seat": "12A"}, {"name": "B"}]})
@@ -0,0 +1,44 @@
+import os
+
+from app.services.ticket_storage import LocalTicketStorage, reshard
+
+
+def _flat(root, n: int) -> list[str]:
+    ids = [f"{i:02x}{'ab' * 4}" for i in range(n)]
+    for ticket_id in ids:
+        with open(os.path.join(root, f"{ticket_id}.pdf"), "wb") as f:
+            f.write(b"%PDF-" + ticket_id.encode())
+    return ids
+
+
+def test_reshard_in_place_counts_each_file_once(tmp_path):
+    root = str(tmp_path)
+    ids = _flat(root, 40)
+    target = LocalTicketStorage(root, depth=2)
+
+    assert reshard(root, target) == (40, 0)
+    assert all(os.path.exists(target.path(t)) for t in ids)
+    assert not [n for n in os.listdir(root) if n.endswith(".pdf")]
+    # Everything is in place now
+    assert reshard(root, target) == (0, 40)
+
+
+def test_dry_run_moves_nothing(tmp_path):
+    root = str(tmp_path)
+    _flat(root, 5)
+    assert reshard(root, LocalTicketStorage(root, depth=1), dry_run=True) == (5, 0)
+    assert len([n for n in os.listdir(root) if n.endswith(".pdf")]) == 5
+
+
+
+def test_half_migrated_tree_counts_each_file_once(tmp_path):
+    # Flat files move into shard directories the walk has not reached yet
+    root = str(tmp_path)
+    target = LocalTicketStorage(root, depth=2)
+    sharded = [f"{i:02x}ef0000" for i in range(20)]
+    for ticket_id in sharded:
+        target.put(ticket_id, b"%PDF-")
+    flat = _flat(root, 20)
+
+    assert reshard(root, target) == (20, 20)
+    assert all(os.path.exists(target.path(t)) for t in flat)
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from app.services.timetable import BUNDLED_TIMETABLE, Timetable
+
+
+def _timetable(*departs: str, days: str = "1234567") -> Timetable:
+    return Timetable.from_rows([
+        {"airline": "IndiGo", "flight_no": f"6E {100 + i}", "origin": "BOM", "dest": "DEL", "depart": d,
+         "duration_min": "125", "fare": "5400", "days": days}
+        for i, d in enumerate(departs)
+    ])
+
+
+def _departs(results: list[dict]) -> list[str]:
+    return [r["depart"][11:16] for r in results]
+
+
+def test_returns_the_nearest_departures_nearest_first():
+    tt = _timetable("06:00", "09:30", "10:45", "11:15", "18:00")
+    # Monday 2030-01-14, asked for 10:30
+    assert _departs(tt.search("BOM", "DEL", datetime(2030, 1, 14, 10, 30))) == ["10:45", "11:15", "09:30"]
+
+
+def test_includes_earlier_flights_late_in_the_day():
+    tt = _timetable("06:00", "09:30", "10:45")
+    assert _departs(tt.search("bom", "del", datetime(2030, 1, 14, 22, 0))) == ["10:45", "09:30", "06:00"]
+
+
+def test_a_tie_goes_to_the_later_departure():
+    tt = _timetable("09:00", "11:00")
+    assert _departs(tt.search("BOM", "DEL", datetime(2030, 1, 14, 10, 0), limit=1)) == ["11:00"]
+
+
+def test_only_services_operating_that_weekday():
+    tt = _timetable("09:00", days="67")
+    assert tt.search("BOM", "DEL", datetime(2030, 1, 14, 9, 0)) == []  # a Monday
+    assert _departs(tt.search("BOM", "DEL", datetime(2030, 1, 19, 9, 0))) == ["09:00"]  # a Saturday
+
+
+def test_bundled_schedule_covers_the_main_routes():
+    tt = Timetable.load(BUNDLED_TIMETABLE)
+    results = tt.search("BOM", "DEL", datetime(2030, 1, 14, 9, 0))
+    assert len(results) == 3
+    assert {"id", "airline", "flight_no", "depart", "arrive", "duration_min", "price", "currency"} <= set(results[0])
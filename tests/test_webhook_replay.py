@@ -0,0 +1,94 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import httpx
+
+from app.core.db import init_db, SessionLocal, Booking, IssueJob, User
+from app.core.redis import set_session
+from app.core.settings import settings
+from app.main import app
+from app.routers import stripe_webhook
+from app.services.flight_search import mock_search
+from bench.webhook_replay import stripe_signature
+
+_REPLAYS = 10
+
+
+def _seed_session(phone: str):
+    depart = (datetime.now() + timedelta(days=5)).replace(hour=9, minute=0, second=0, microsecond=0)
+    flights = mock_search("BOM", "DEL", depart)
+    set_session(phone, {
+        "step": "confirm",
+        "source_iata": "BOM",
+        "dest_iata": "DEL",
+        "travel_dt_iso": depart.isoformat(),
+        "presented_flights": flights,
+        "selected_flight_id": flights[0]["id"],
+        "passengers": [{"name": "Replay User", "email": "replay@example.com"}],
+        "passengers_total": 1,
+    })
+
+
+def _deliver(path: str, content: str, headers: dict) -> list[httpx.Response]:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+            return await asyncio.gather(*(client.post(path, content=content, headers=headers) for _ in range(_REPLAYS)))
+    return asyncio.run(run())
+
+
+def _bookings(db, phone: str):
+    return db.query(Booking).join(User, User.id == Booking.user_id).filter(User.whatsapp_number == phone).all()
+
+
+def test_concurrent_twilio_replays_book_and_issue_once(fake_redis):
+    init_db()
+    phone = "+15550100001"
+    _seed_session(phone)
+    body = urlencode({"From": f"whatsapp:{phone}", "Body": "confirm", "MessageSid": "SMreplaytest0001"})
+
+    responses = _deliver("/whatsapp/webhook", body, {"content-type": "application/x-www-form-urlencoded"})
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
+    assert b"Booking confirmed" in responses[0].content
+    db = SessionLocal()
+    try:
+        bookings = _bookings(db, phone)
+        assert len(bookings) == 1
+        assert db.query(IssueJob).filter(IssueJob.booking_id == bookings[0].id).count() == 1
+    finally:
+        db.close()
+
+
+def test_concurrent_stripe_replays_book_and_confirm_once(fake_redis, monkeypatch):
+    init_db()
+    phone = "+15550100002"
+    _seed_session(phone)
+    db = SessionLocal()
+    db.add(User(whatsapp_number=phone, email="replay@example.com"))
+    db.commit()
+    db.close()
+    emails = []
+    monkeypatch.setattr(stripe_webhook, "send_confirmation", lambda to, subject, html: emails.append(to))
+    event = json.dumps({
+        "id": "evt_replay_test_1",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {"id": "cs_replay_test_1", "object": "checkout.session", "metadata": {"from": phone}}},
+    })
+
+    responses = _deliver("/stripe/webhook", event, {
+        "content-type": "application/json",
+        "stripe-signature": stripe_signature(event, settings.STRIPE_WEBHOOK_SECRET),
+    })
+
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
+    assert emails == ["replay@example.com"]
+    db = SessionLocal()
+    try:
+        assert len(_bookings(db, phone)) == 1
+    finally:
+        db.close()